@@ -1,21 +1,126 @@
-from flask import Flask, jsonify, request
+from flask import (
+    Flask,
+    Response,
+    g,
+    has_request_context,
+    jsonify,
+    request,
+    stream_with_context,
+)
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from limits.storage import RedisStorage
+import click
+import bz2
+import functools
+import gzip
+import io
 import os
+import queue
+import sqlite3
 import requests
 from bs4 import BeautifulSoup
+from lxml import etree
 import re
 import redis
 import json
+from json.encoder import encode_basestring_ascii
 import hashlib
+import heapq
+import inspect
+import mmap
+import struct
+import threading
 import time
+import sys
+import unicodedata
+import uuid
+from datetime import datetime, timezone
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from array import array
+from collections import OrderedDict
+from math import ceil, inf, log, log2
+from urllib.parse import unquote
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+# --- JSON backend: orjson when installed, the standard library otherwise ---
+def resolve_json_backend(requested):
+    """Return the JSON backend to use, falling back to json without orjson"""
+    if requested == "orjson" and orjson is None:
+        print("Warning: JSON_BACKEND=orjson but orjson is not installed; using json")
+        return "json"
+    return requested
+
+
+JSON_BACKEND = resolve_json_backend(
+    os.environ.get("JSON_BACKEND", "orjson" if orjson else "json")
+)
+
+
+def json_dumps(data):
+    """Serialize data to compact, key-sorted JSON bytes"""
+    if JSON_BACKEND == "orjson":
+        try:
+            return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+
+
+def json_loads(payload):
+    """Deserialize JSON from bytes or str"""
+    if JSON_BACKEND == "orjson":
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by json_dumps/json_loads"""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return json_dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return json_loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_dumps(obj), mimetype=self.mimetype)
+
+
+def json_response(payload, status=200, etag=None):
+    """Build a response from already-serialized JSON bytes"""
+    response = Response(payload, status=status, mimetype="application/json")
+    if etag:
+        response.set_etag(etag)
+    return response
+
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # Initialize Redis connection for caching
 redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
+# Cache payloads are kept as raw JSON bytes so hits can be served without decoding
+redis_cache = redis.Redis(host="localhost", port=6379, db=0)
 
 
 # User agent logging middleware
@@ -98,6 +203,122 @@ def is_redis_available():
         return False
 
 
+# Units a worker reserves from Redis per limiter round trip, and how long it
+# may hand them out locally. Reserved units count as used for other workers,
+# so a client can be limited up to one block per worker early.
+RATE_LIMIT_LEASE_SIZE = int(os.environ.get("RATE_LIMIT_LEASE_SIZE", 5))
+RATE_LIMIT_LEASE_SECONDS = float(os.environ.get("RATE_LIMIT_LEASE_SECONDS", 5))
+# Batch endpoints are charged one unit per this many items
+RATE_LIMIT_BATCH_UNIT = int(os.environ.get("RATE_LIMIT_BATCH_UNIT", 10))
+# Units charged for a search that had to go to Wikipedia (a hit costs 1)
+RATE_LIMIT_MISS_COST = int(os.environ.get("RATE_LIMIT_MISS_COST", 5))
+
+
+class LeasedRedisStorage(RedisStorage):
+    """Redis limiter storage that reserves counter increments in blocks
+
+    Selected with a "redis+lease://" storage URI. Hits are served from the
+    local block while it lasts, so most requests make no limiter round trip.
+    """
+
+    STORAGE_SCHEME = ["redis+lease"]
+
+    def __init__(self, uri, **options):
+        super().__init__(uri.replace("redis+lease://", "redis://", 1), **options)
+        self._leases = {}  # key -> [expiry, units left, counter in Redis]
+        self._leases_lock = threading.Lock()
+
+    def incr(self, key, expiry, *args, amount=1, **kwargs):
+        now = time.monotonic()
+        with self._leases_lock:
+            lease = self._leases.get(key)
+            if lease and lease[0] > now and lease[1] >= amount:
+                lease[1] -= amount
+                return lease[2] - lease[1]
+
+        block = max(amount, RATE_LIMIT_LEASE_SIZE)
+        count = super().incr(key, expiry, *args, amount=block, **kwargs)
+        # Never hand out units past the end of the window they were taken in:
+        # the counter's TTL is what is left of that window
+        window_left = self.get_expiry(key) - time.time()
+        with self._leases_lock:
+            if len(self._leases) > 10000:
+                self._leases = {k: v for k, v in self._leases.items() if v[0] > now}
+            lease_expiry = now + min(RATE_LIMIT_LEASE_SECONDS, window_left)
+            self._leases[key] = [lease_expiry, block - amount, count]
+        # Units reserved but not handed out yet are not used
+        return count - (block - amount)
+
+    def get(self, key):
+        with self._leases_lock:
+            lease = self._leases.get(key)
+            if lease and lease[0] > time.monotonic():
+                return lease[2] - lease[1]
+        return super().get(key)
+
+    def clear(self, key):
+        with self._leases_lock:
+            self._leases.pop(key, None)
+        return super().clear(key)
+
+    def reset(self):
+        with self._leases_lock:
+            self._leases.clear()
+        return super().reset()
+
+
+def batch_items(value):
+    """Item count of a batch field; anything but a list counts as one item"""
+    if value is None:
+        return 0
+    return len(value) if isinstance(value, list) else 1
+
+
+def batch_cost(field):
+    """Limiter cost of a batch request: one unit per RATE_LIMIT_BATCH_UNIT items"""
+
+    def cost():
+        if request.mimetype == NDJSON_MIMETYPE:
+            # Only the first unit; the stream is charged the rest as it is read
+            return 1
+        data = request.get_json(silent=True) or {}
+        items = batch_items(data.get(field)) if isinstance(data, dict) else 0
+        return max(1, ceil(items / RATE_LIMIT_BATCH_UNIT))
+
+    return cost
+
+
+def charge_request_limits(cost=1):
+    """Charge the current request's limits again, e.g. while a body streams in
+
+    Returns:
+        bool: False once any of the limits is used up
+    """
+    for request_limit in limiter.current_limits:
+        if not limiter.limiter.hit(
+            request_limit.limit, *request_limit.request_args, cost=cost
+        ):
+            return False
+    return True
+
+
+def bulk_cost():
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return 1
+    items = batch_items(data.get("queries")) + batch_items(data.get("page_titles"))
+    return max(1, ceil(items / RATE_LIMIT_BATCH_UNIT))
+
+
+def search_cost():
+    """Limiter cost of a search, known once it has been served"""
+    return RATE_LIMIT_MISS_COST if g.get("wikipedia_requests") else 1
+
+
+def deduct_always(response):
+    return True
+
+
 USE_REDIS_LIMITER = is_redis_available() and not os.environ.get("DISABLE_RATE_LIMITER")
 
 if USE_REDIS_LIMITER:
@@ -105,7 +326,7 @@ if USE_REDIS_LIMITER:
         app=app,
         key_func=get_remote_address,
         default_limits=["150 per minute"],
-        storage_uri="redis://localhost:6379",
+        storage_uri="redis+lease://localhost:6379",
     )
 else:
     limiter = Limiter(
@@ -116,66 +337,669 @@ else:
     )
 
 
+# HTTP caching for the GET variants of the search endpoints
+CACHE_CONTROL_MAX_AGE = int(os.environ.get("CACHE_CONTROL_MAX_AGE", 300))
+CACHE_CONTROL_STALE_WHILE_REVALIDATE = int(
+    os.environ.get("CACHE_CONTROL_STALE_WHILE_REVALIDATE", 3600)
+)
+
+
+def cached_response(cached_entry):
+    """Build a response from a cached (etag, payload, status) entry
+
+    GET requests get Cache-Control headers and a 304 when If-None-Match matches.
+    Errors are never stored by HTTP caches.
+    """
+    etag, payload, status = cached_entry
+    if request.method != "GET":
+        return json_response(payload, status, etag)
+
+    if not 200 <= status < 300:
+        response = json_response(payload, status, etag)
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+    else:
+        response = json_response(payload, status, etag)
+    response.headers["Cache-Control"] = (
+        f"public, max-age={CACHE_CONTROL_MAX_AGE}, "
+        f"stale-while-revalidate={CACHE_CONTROL_STALE_WHILE_REVALIDATE}"
+    )
+    return response
+
+
+def get_request_field(name):
+    """Read a string field from the query string (GET) or JSON body (POST)"""
+    if request.method == "GET":
+        return request.args.get(name, "").strip()
+    data = request.get_json()
+    return data.get(name, "").strip()
+
+
+# Punctuation typed in several forms, folded to one (NFKC leaves these alone)
+PUNCTUATION_FOLDS = str.maketrans(
+    {
+        "\u2018": "'",
+        "\u2019": "'",
+        "\u201b": "'",
+        "\u201c": '"',
+        "\u201d": '"',
+        "\u2010": "-",
+        "\u2011": "-",
+        "\u2012": "-",
+        "\u2013": "-",
+        "\u2014": "-",
+        "\u2212": "-",
+        "_": " ",
+    }
+)
+
+
+def canonicalize_query(text):
+    """Canonical form of a search query or page title, used for cache keys
+
+    Applies Unicode NFKC, folds case and punctuation variants, turns
+    underscores into spaces and collapses whitespace, so " World_War  II" and
+    "world war ii" share a key.
+    """
+    text = unicodedata.normalize("NFKC", text).translate(PUNCTUATION_FOLDS)
+    return " ".join(text.casefold().split())
+
+
+# Namespaces whose entries are derived from parsing; their keys carry the parser
+# version and the namespace generation (see "Cache generations" below)
+VERSIONED_NAMESPACES = ("search", "page", "article")
+
+
 def get_cache_key(query, cache_type="search"):
     """Generate a cache key for the given query and cache type"""
-    return f"alexandria:{cache_type}:{hashlib.md5(query.lower().encode()).hexdigest()}"
+    digest = hashlib.md5(canonicalize_query(query).encode()).hexdigest()
+    if cache_type in VERSIONED_NAMESPACES:
+        generation = get_generation(cache_type)
+        return f"alexandria:{cache_type}:{PARSER_VERSION}:{generation}:{digest}"
+    return f"alexandria:{cache_type}:{digest}"
 
 
-def get_cached_result(cache_key):
-    """Get cached result from Redis"""
+# Cache entries are stored as a fixed-width ETag and the three-digit HTTP status
+# followed by the JSON payload, so a hit can be answered with its validator and
+# status from a single GET and no decoding.
+CACHE_ETAG_LENGTH = 16
+CACHE_HEADER_LENGTH = CACHE_ETAG_LENGTH + 3
+
+
+def make_etag(payload):
+    """Content hash used as the ETag for a JSON payload"""
+    return hashlib.blake2b(payload, digest_size=CACHE_ETAG_LENGTH // 2).hexdigest()
+
+
+def pack_cache_entry(payload, status=200):
+    """Prefix a JSON payload with its ETag and status; returns (etag, entry)"""
+    etag = make_etag(payload)
+    return etag, etag.encode() + str(status).encode() + payload
+
+
+def unpack_cache_entry(entry):
+    """Split a stored entry into (etag, payload, status)"""
+    if entry[:1] in (b"{", b"["):
+        # Entry written before ETags were stored alongside the payload
+        return make_etag(entry), entry, 200
+    etag = entry[:CACHE_ETAG_LENGTH].decode()
+    status = entry[CACHE_ETAG_LENGTH:CACHE_HEADER_LENGTH]
+    if not status.isdigit():
+        # Entry written before statuses were stored
+        return etag, entry[CACHE_ETAG_LENGTH:], 200
+    return etag, entry[CACHE_HEADER_LENGTH:], int(status)
+
+
+def get_cached_entry(cache_key):
+    """Get the cached (etag, payload, status) entry for a key
+
+    The shared citation store is checked first; only its misses go to Redis.
+    """
+    entry = get_shared_entry(cache_key)
+    if not entry:
+        try:
+            entry = redis_cache.get(cache_key)
+        except Exception as e:
+            print(f"Error getting cached result: {e}")
+    record_lookup(cache_key, bool(entry))
+    return unpack_cache_entry(entry) if entry else None
+
+
+def get_cached_entries(cache_keys):
+    """Get cached (etag, payload, status) entries for many keys
+
+    Keys found in the shared citation store are answered from it and the rest
+    are fetched with a single MGET.
+    """
+    entries = [get_shared_entry(cache_key) for cache_key in cache_keys]
+    missing = [i for i, entry in enumerate(entries) if not entry]
+    if missing:
+        try:
+            fetched = redis_cache.mget([cache_keys[i] for i in missing])
+            for i, entry in zip(missing, fetched):
+                entries[i] = entry
+        except Exception as e:
+            print(f"Error getting cached results: {e}")
+    for cache_key, entry in zip(cache_keys, entries):
+        record_lookup(cache_key, bool(entry))
+    return [unpack_cache_entry(entry) if entry else None for entry in entries]
+
+
+def alias_cached_entry(alias_key, cache_key, cached_entry):
+    """Copy a cached entry to an alias key for the rest of its lifetime"""
+    etag, payload, status = cached_entry
     try:
-        cached_data = redis_client.get(cache_key)
-        if cached_data:
-            return json.loads(cached_data)
+        ttl = redis_cache.ttl(cache_key)
+        if ttl > 0:
+            redis_cache.setex(alias_key, ttl, pack_cache_entry(payload, status)[1])
     except Exception as e:
-        print(f"Error getting cached result: {e}")
+        print(f"Error aliasing cached result: {e}")
+
+
+def get_cached_result(cache_key):
+    """Get cached result from Redis"""
+    cached_entry = get_cached_entry(cache_key)
+    if cached_entry:
+        return json_loads(cached_entry[1])
     return None
 
 
-def set_cached_result(cache_key, data, ttl=3600):
-    """Set cached result in Redis with TTL (default 1 hour)"""
+# --- Cache TTL policies ---
+# Base TTLs (seconds) per cache namespace and result type. Successful and
+# disambiguation results are then scaled by the age of the page's last edit and
+# by the key's hit rate (hits per miss), and clamped to the namespace's min/max.
+# Override any value with CACHE_TTL_POLICIES='{"page": {"success": 7200}}'.
+CACHE_TTL_POLICIES = {
+    "search": {
+        "success": 3600,
+        "disambiguation": 6 * 3600,
+        "suggestions": 1800,
+        "error": 600,
+        "failure": 60,
+        "partial": 60,
+        "min": 60,
+        "max": 24 * 3600,
+    },
+    "page": {
+        "success": 3600,
+        "disambiguation": 6 * 3600,
+        "error": 600,
+        "failure": 60,
+        "partial": 60,
+        "min": 60,
+        "max": 7 * 24 * 3600,
+    },
+}
+
+
+def load_ttl_policies(overrides):
+    """Merge per-namespace TTL overrides (a JSON object) into the defaults"""
+    for namespace, policy in json.loads(overrides).items():
+        CACHE_TTL_POLICIES.setdefault(namespace, dict(CACHE_TTL_POLICIES["search"]))
+        CACHE_TTL_POLICIES[namespace].update(policy)
+
+
+load_ttl_policies(os.environ.get("CACHE_TTL_POLICIES", "{}"))
+
+# A page last edited this many days ago keeps the base TTL; older pages get up
+# to 8x longer, pages edited in the last day or two down to a quarter
+CACHE_TTL_REVISION_AGE_DAYS = float(os.environ.get("CACHE_TTL_REVISION_AGE_DAYS", 7))
+
+# Effective TTLs handed out by this worker: (namespace, type) -> [count, total]
+ttl_stats = {}
+_ttl_stats_lock = threading.Lock()
+
+
+def result_type(data, status):
+    """Classify a result for its TTL policy"""
+    if isinstance(data, dict) and data.get("partial"):
+        # Cut short by the request deadline, so worth retrying soon
+        return "partial"
+    if status >= 500:
+        return "failure"
+    if status >= 400:
+        return "error"
+    return data.get("status", "success") if isinstance(data, dict) else "success"
+
+
+def revision_age_days(timestamp):
+    """Days since an ISO 8601 timestamp, or None if it cannot be read"""
     try:
-        redis_client.setex(cache_key, ttl, json.dumps(data))
+        edited = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return None
+    return max(0.0, (datetime.now(timezone.utc) - edited).total_seconds() / 86400)
+
+
+def cache_ttl(cache_key, data, status=200):
+    """Effective TTL for a result under its namespace's policy"""
+    namespace = cache_key.split(":")[1]
+    policy = CACHE_TTL_POLICIES.get(namespace, CACHE_TTL_POLICIES["search"])
+    kind = result_type(data, status)
+    ttl = policy.get(kind, policy["success"])
+
+    if kind in ("success", "disambiguation"):
+        age = revision_age_days(data.get("last_edited"))
+        if age is not None:
+            ttl *= min(max(age / CACHE_TTL_REVISION_AGE_DAYS, 0.25), 8)
+        hits = cache_lookups["hit"].estimate(cache_key)
+        misses = cache_lookups["miss"].estimate(cache_key)
+        # A key read many times per refetch saves the most by staying cached
+        ttl *= 1 + log2(max(1, hits / max(1, misses))) / 4
+
+    ttl = int(min(max(ttl, policy["min"]), policy["max"]))
+    with _ttl_stats_lock:
+        stats = ttl_stats.setdefault((namespace, kind), [0, 0])
+        stats[0] += 1
+        stats[1] += ttl
+    return ttl
+
+
+def set_cached_result(cache_key, data, ttl=None, status=200, aliases=()):
+    """Set cached result in Redis
+
+    Without an explicit ttl the entry gets the effective TTL of its policy (see
+    cache_ttl). The same entry is also stored under any alias keys. Returns the
+    (etag, payload, status) entry so callers can reuse it for the response.
+    """
+    if ttl is None:
+        ttl = cache_ttl(cache_key, data, status)
+    etag, entry = pack_cache_entry(json_dumps(data), status)
+    # Tag the entry with its page so invalidate_page can find it
+    page_title = data.get("page_title") if isinstance(data, dict) else None
+    try:
+        if aliases or page_title:
+            pipe = redis_cache.pipeline()
+            for key in (cache_key, *aliases):
+                pipe.setex(key, ttl, entry)
+            if page_title:
+                tag_key = get_cache_key(page_title, "tag")
+                pipe.sadd(tag_key, cache_key, *aliases)
+                # Outlive every entry it may list
+                pipe.expire(tag_key, max(p["max"] for p in CACHE_TTL_POLICIES.values()))
+            pipe.execute()
+        else:
+            redis_cache.setex(cache_key, ttl, entry)
     except Exception as e:
         print(f"Error setting cached result: {e}")
+    return etag, entry[CACHE_HEADER_LENGTH:], status
+
+
+WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
+
+# Custom headers with proper user agent for Wikipedia API
+WIKIPEDIA_HEADERS = {
+    "User-Agent": (
+        "Alexandria-Bib/1.0 "
+        "(https://github.com/your-repo/alexandria-bib; your-email@example.com) "
+        "Python/3.12"
+    )
+}
+
+
+class RequestPacer:
+    """Space out request starts so they are at least `interval` seconds apart
+
+    priority is the outbound governor class of the requests paced by it.
+    """
+
+    def __init__(self, interval, priority=None):
+        self.interval = interval
+        self.priority = priority
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+# --- Request deadlines ---
+# Endpoints get a time budget (seconds) that every stage checks: outbound
+# requests get it as their timeout, extraction and batch parsing stop when it
+# runs out. What was done by then is answered with "partial": true. Clients can
+# ask for a different budget with the X-Request-Deadline header, up to
+# REQUEST_DEADLINE_MAX. Results cut short by the budget never reach the entries
+# full-budget requests read: partial results are cached under their own key
+# (with the short "partial" TTL), read only by requests with a shortened
+# budget, and failures are not cached or remembered as empty at all.
+REQUEST_DEADLINES = {
+    "search_books": 10.0,
+    "search_specific_page": 10.0,
+    "parse_batch": 10.0,
+    "search_bulk": 120.0,
+}
+REQUEST_DEADLINES.update(json.loads(os.environ.get("REQUEST_DEADLINES", "{}")))
+REQUEST_DEADLINE_MAX = float(os.environ.get("REQUEST_DEADLINE_MAX", 120))
+REQUEST_DEADLINE_HEADER = "X-Request-Deadline"
+# Timeout of a single Wikipedia request when the deadline leaves more time
+WIKIPEDIA_TIMEOUT = float(os.environ.get("WIKIPEDIA_TIMEOUT", 10))
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out"""
+
+
+# Per-thread absolute deadline (time.monotonic), None when unbounded
+_deadline = threading.local()
+
+
+def set_deadline(at, shortened=False):
+    _deadline.at = at
+    _deadline.shortened = shortened
+
+
+def get_deadline():
+    return getattr(_deadline, "at", None)
+
+
+def deadline_shortened():
+    """Whether the client asked for less than the endpoint's own budget"""
+    return getattr(_deadline, "shortened", False)
+
+
+def time_left():
+    """Seconds until the thread's deadline, inf without one"""
+    at = get_deadline()
+    return inf if at is None else at - time.monotonic()
+
+
+def deadline_cut_short(status):
+    """Whether a failed result may be down to the time budget, not the topic"""
+    return status >= 400 and (time_left() <= 0 or deadline_shortened())
+
+
+def partial_cache_key(cache_key):
+    """Key of the partial results cached for requests with a shortened budget"""
+    return f"{cache_key}:partial"
+
+
+def cache_built_result(cache_key, result, status, aliases=()):
+    """Cache a freshly built result where the thread's budget allows it
+
+    Returns the (etag, payload, status) entry, like set_cached_result.
+    """
+    if result.get("partial"):
+        return set_cached_result(partial_cache_key(cache_key), result, status=status)
+    if deadline_cut_short(status):
+        payload = json_dumps(result)
+        return make_etag(payload), payload, status
+    return set_cached_result(cache_key, result, status=status, aliases=aliases)
+
+
+@app.before_request
+def start_request_deadline():
+    """Start the time budget of endpoints that have one"""
+    budget = REQUEST_DEADLINES.get(request.endpoint)
+    if budget is None:
+        set_deadline(None)
+        return
+    requested = request.headers.get(REQUEST_DEADLINE_HEADER)
+    if requested:
+        try:
+            requested = min(max(float(requested), 0.0), REQUEST_DEADLINE_MAX)
+        except ValueError:
+            requested = budget
+        set_deadline(time.monotonic() + requested, requested < budget)
+        return
+    set_deadline(time.monotonic() + budget)
+
+
+@app.teardown_request
+def end_request_deadline(exc):
+    set_deadline(None)
+
+
+# --- Outbound rate governor ---
+# Wikipedia requests of all workers draw from one token bucket in Redis that
+# refills at WIKIPEDIA_RATE per second. Workers lease a few tokens per round
+# trip and spend them locally until the lease expires. Lower priority classes
+# must leave a share of the bucket, so prefetch and background work cannot
+# delay interactive requests. A 429 (or a very slow response) scales the shared
+# rate down, a 429 also empties the bucket for its Retry-After, and the rate
+# then recovers linearly. Without Redis, requests are let through.
+WIKIPEDIA_RATE = float(os.environ.get("WIKIPEDIA_RATE", 20))  # per second, 0 = off
+WIKIPEDIA_BURST = float(os.environ.get("WIKIPEDIA_BURST", 40))
+WIKIPEDIA_LEASE_SIZE = int(os.environ.get("WIKIPEDIA_LEASE_SIZE", 4))
+WIKIPEDIA_LEASE_SECONDS = float(os.environ.get("WIKIPEDIA_LEASE_SECONDS", 1.0))
+# Responses slower than this count as a sign of upstream distress
+WIKIPEDIA_SLOW_RESPONSE = float(os.environ.get("WIKIPEDIA_SLOW_RESPONSE", 5.0))
+# Seconds for the rate to recover from its minimum to WIKIPEDIA_RATE
+WIKIPEDIA_RATE_RECOVERY = float(os.environ.get("WIKIPEDIA_RATE_RECOVERY", 60))
+WIKIPEDIA_MIN_RATE_FACTOR = 0.1
+OUTBOUND_BUCKET_KEY = "outbound:wikipedia"
+
+OUTBOUND_INTERACTIVE = 0
+OUTBOUND_PREFETCH = 1
+OUTBOUND_BACKGROUND = 2
+
+# Share of the burst each class must leave in the bucket
+OUTBOUND_RESERVE = {
+    OUTBOUND_INTERACTIVE: 0.0,
+    OUTBOUND_PREFETCH: 0.25,
+    OUTBOUND_BACKGROUND: 0.5,
+}
+# Seconds each class may wait for a token before giving up
+OUTBOUND_MAX_WAIT = {
+    OUTBOUND_INTERACTIVE: 2.0,
+    OUTBOUND_PREFETCH: 5.0,
+    OUTBOUND_BACKGROUND: 30.0,
+}
+
+# KEYS: bucket. ARGV: rate, burst, tokens wanted, reserve, recovery per second.
+# Returns tokens granted and, if none, milliseconds until there may be one.
+OUTBOUND_TAKE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local wanted, reserve = tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'factor')
+local tokens = tonumber(state[1]) or burst
+local elapsed = math.max(0, now - (tonumber(state[2]) or now))
+local factor = math.min(1, (tonumber(state[3]) or 1) + tonumber(ARGV[5]) * elapsed)
+tokens = math.min(burst, tokens + elapsed * rate * factor)
+local granted = math.max(0, math.min(wanted, math.floor(tokens - reserve)))
+tokens = tokens - granted
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now),
+    'factor', tostring(factor))
+redis.call('EXPIRE', KEYS[1], 3600)
+local wait = 0
+if granted == 0 then
+    wait = math.ceil((reserve + 1 - tokens) / (rate * factor) * 1000)
+end
+return {granted, wait}
+"""
+
+# KEYS: bucket. ARGV: rate multiplier, minimum factor, pause seconds, rate.
+OUTBOUND_BACKOFF_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'factor')
+local factor = math.max(tonumber(ARGV[2]),
+    (tonumber(state[1]) or 1) * tonumber(ARGV[1]))
+redis.call('HSET', KEYS[1], 'factor', tostring(factor))
+local pause = tonumber(ARGV[3])
+if pause > 0 then
+    -- Tokens owed for the pause, so nothing is granted until it is over
+    redis.call('HSET', KEYS[1], 'tokens', tostring(-pause * tonumber(ARGV[4]) * factor),
+        'ts', tostring(now))
+end
+redis.call('EXPIRE', KEYS[1], 3600)
+return 1
+"""
+
+
+class OutboundThrottled(Exception):
+    """No outbound token could be had within the priority's wait limit"""
+
+
+class OutboundGovernor:
+    """Client side of the shared outbound token bucket"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._leases = {}  # priority -> (tokens left, expiry)
+        # Registered once; each call runs EVALSHA, loading the script on a miss
+        self._take = redis_client.register_script(OUTBOUND_TAKE_SCRIPT)
+        self._backoff = redis_client.register_script(OUTBOUND_BACKOFF_SCRIPT)
+        self.stats = dict.fromkeys(
+            ("leased", "local", "waited", "throttled", "backoffs", "rate_limited"), 0
+        )
+
+    def acquire(self, priority=OUTBOUND_INTERACTIVE):
+        """Wait for a token; raises OutboundThrottled past the class's limit"""
+        if not WIKIPEDIA_RATE:
+            return
+        deadline = time.monotonic() + min(OUTBOUND_MAX_WAIT[priority], time_left())
+        while True:
+            with self._lock:
+                left, expires = self._leases.get(priority, (0, 0))
+                if left and time.monotonic() < expires:
+                    self._leases[priority] = (left - 1, expires)
+                    self.stats["local"] += 1
+                    return
+            try:
+                granted, wait_ms = self._take(
+                    keys=[OUTBOUND_BUCKET_KEY],
+                    args=[
+                        WIKIPEDIA_RATE,
+                        WIKIPEDIA_BURST,
+                        WIKIPEDIA_LEASE_SIZE,
+                        OUTBOUND_RESERVE[priority] * WIKIPEDIA_BURST,
+                        (1 - WIKIPEDIA_MIN_RATE_FACTOR) / WIKIPEDIA_RATE_RECOVERY,
+                    ],
+                )
+            except Exception as e:
+                print(f"Error taking outbound token: {e}")
+                return
+            if granted:
+                with self._lock:
+                    self._leases[priority] = (
+                        int(granted) - 1,
+                        time.monotonic() + WIKIPEDIA_LEASE_SECONDS,
+                    )
+                    self.stats["leased"] += 1
+                return
+            wait = int(wait_ms) / 1000
+            if time.monotonic() + wait > deadline:
+                with self._lock:
+                    self.stats["throttled"] += 1
+                raise OutboundThrottled("Outbound request rate exceeded")
+            with self._lock:
+                self.stats["waited"] += 1
+            time.sleep(wait)
+
+    def feedback(self, response, latency):
+        """Back off the shared rate after a 429 or a very slow response"""
+        if not WIKIPEDIA_RATE:
+            return
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After", "")
+            pause = int(retry_after) if retry_after.isdigit() else 1
+            self.backoff(0.5, pause)
+            with self._lock:
+                self.stats["rate_limited"] += 1
+        elif latency > WIKIPEDIA_SLOW_RESPONSE:
+            self.backoff(0.8, 0)
+
+    def backoff(self, multiplier, pause):
+        with self._lock:
+            # Leased tokens would let this worker run through a pause
+            self._leases.clear()
+            self.stats["backoffs"] += 1
+        try:
+            self._backoff(
+                keys=[OUTBOUND_BUCKET_KEY],
+                args=[multiplier, WIKIPEDIA_MIN_RATE_FACTOR, pause, WIKIPEDIA_RATE],
+            )
+        except Exception as e:
+            print(f"Error backing off outbound rate: {e}")
+
+
+outbound_governor = OutboundGovernor()
+
+# Per-thread outbound settings (e.g. the pacer used by bulk workers)
+_outbound = threading.local()
+
+
+def wikipedia_get(url, **kwargs):
+    """GET a Wikipedia URL with our headers, honouring the thread's pacer
+
+    Requests go through the outbound governor in the pacer's priority class,
+    interactive when there is no pacer, and time out by the thread's deadline.
+    """
+    pacer = getattr(_outbound, "pacer", None)
+    if pacer:
+        pacer.wait()
+    priority = pacer.priority if pacer and pacer.priority else OUTBOUND_INTERACTIVE
+    outbound_governor.acquire(priority)
+    remaining = time_left()
+    if remaining <= 0:
+        raise DeadlineExceeded("No time left for a Wikipedia request")
+    kwargs.setdefault("timeout", min(WIKIPEDIA_TIMEOUT, remaining))
+    if has_request_context():
+        # Makes the request a cache miss for the limiter's cost
+        g.wikipedia_requests = g.get("wikipedia_requests", 0) + 1
+    started = time.monotonic()
+    response = requests.get(url, headers=WIKIPEDIA_HEADERS, **kwargs)
+    outbound_governor.feedback(response, time.monotonic() - started)
+    return response
 
 
 def search_wikipedia(query):
-    """Search Wikipedia for a topic and return the best matching page"""
-    search_url = "https://en.wikipedia.org/w/api.php"
+    """Search Wikipedia for a topic and return the matching pages
+
+    Each page has its "title" and a "disambiguation" flag read from the page
+    properties in the same call, plus "revid" and "timestamp" of its latest
+    revision when known. Returns an empty list when nothing matches and None
+    when the search failed.
+    """
     params = {
         "action": "query",
         "format": "json",
-        "list": "search",
-        "srsearch": query,
-        "srlimit": 10,  # Increased to get more results for disambiguation
-    }
-
-    # Custom headers with proper user agent for Wikipedia API
-    headers = {
-        "User-Agent": (
-            "Alexandria-Bib/1.0 "
-            "(https://github.com/your-repo/alexandria-bib; your-email@example.com) "
-            "Python/3.12"
-        )
+        "formatversion": 2,
+        "generator": "search",
+        "gsrsearch": query,
+        "gsrlimit": 10,  # Increased to get more results for disambiguation
+        "prop": "pageprops|revisions",
+        "ppprop": "disambiguation",
+        "rvprop": "ids|timestamp",
     }
 
     try:
-        response = requests.get(search_url, params=params, headers=headers)
+        response = wikipedia_get(WIKIPEDIA_API_URL, params=params)
         response.raise_for_status()
         data = response.json()
-
-        if data["query"]["search"]:
-            return data["query"]["search"]
-        return None
+        # No "query" at all when nothing matches
+        pages = data.get("query", {}).get("pages", [])
     except Exception as e:
         print(f"Error searching Wikipedia: {e}")
         return None
 
+    results = []
+    for page in sorted(pages, key=lambda page: page.get("index", 0)):
+        result = {
+            "title": page["title"],
+            "disambiguation": "disambiguation" in page.get("pageprops", {}),
+        }
+        revisions = page.get("revisions")
+        if revisions:
+            result["revid"] = revisions[0].get("revid")
+            result["timestamp"] = revisions[0].get("timestamp")
+        results.append(result)
+    return results
+
 
 def search_wikipedia_with_suggestions(query):
     """Search Wikipedia and also get search suggestions for typos"""
-    search_url = "https://en.wikipedia.org/w/api.php"
     params = {
         "action": "opensearch",
         "format": "json",
@@ -184,17 +1008,8 @@ def search_wikipedia_with_suggestions(query):
         "namespace": 0,
     }
 
-    # Custom headers with proper user agent for Wikipedia API
-    headers = {
-        "User-Agent": (
-            "Alexandria-Bib/1.0 "
-            "(https://github.com/your-repo/alexandria-bib; your-email@example.com) "
-            "Python/3.12"
-        )
-    }
-
     try:
-        response = requests.get(search_url, params=params, headers=headers)
+        response = wikipedia_get(WIKIPEDIA_API_URL, params=params)
         response.raise_for_status()
         data = response.json()
 
@@ -207,28 +1022,312 @@ def search_wikipedia_with_suggestions(query):
         return []
 
 
+# --- Local title index for "did you mean" suggestions ---
+# Built offline with `flask --app app build-title-index <titles file>`. The index
+# is a sorted list of normalized titles opened with mmap, so every worker
+# process shares the same pages. Lookups walk the sorted keys like a trie.
+TITLE_INDEX_PATH = os.environ.get("TITLE_INDEX_PATH")
+TITLE_INDEX_MAGIC = b"ALXTIDX1"
+
+_title_index = None
+_title_index_lock = threading.Lock()
+
+
+def title_index_key(title):
+    """Normalized form of a title used for ordering and matching"""
+    return " ".join(title.replace("_", " ").lower().split())
+
+
+def build_title_index(titles, output_path):
+    """Write a title index file from an iterable of titles
+
+    Layout: magic, title count, count + 1 offsets (all little-endian uint64),
+    then one "key\\ttitle\\n" record per title sorted by key.
+
+    Returns:
+        int: Number of titles written
+    """
+    entries = {}
+    for title in titles:
+        title = title.strip().replace("_", " ")
+        key = title_index_key(title).encode()
+        if key and key not in entries:
+            entries[key] = title.encode()
+
+    offsets = array("Q")
+    position = 0
+    records = []
+    for key in sorted(entries):
+        record = key + b"\t" + entries[key] + b"\n"
+        offsets.append(position)
+        records.append(record)
+        position += len(record)
+    offsets.append(position)
+    if sys.byteorder == "big":
+        offsets.byteswap()
+
+    with open(output_path, "wb") as f:
+        f.write(TITLE_INDEX_MAGIC)
+        f.write(struct.pack("<Q", len(records)))
+        f.write(offsets.tobytes())
+        for record in records:
+            f.write(record)
+    return len(records)
+
+
+class TitleIndex:
+    """Memory-mapped sorted title index with prefix completion and typo search"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:8] != TITLE_INDEX_MAGIC:
+            raise ValueError(f"Not a title index: {path}")
+        (self._count,) = struct.unpack_from("<Q", self._mm, 8)
+        offsets_end = 16 + 8 * (self._count + 1)
+        if sys.byteorder == "little":
+            self._offsets = memoryview(self._mm)[16:offsets_end].cast("Q")
+        else:
+            # The file is little-endian; swap a private copy instead of mapping
+            self._offsets = array("Q", self._mm[16:offsets_end])
+            self._offsets.byteswap()
+        self._data = offsets_end
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        if isinstance(self._offsets, memoryview):
+            self._offsets.release()
+        self._mm.close()
+
+    def _key(self, i):
+        start = self._data + self._offsets[i]
+        return self._mm[start : self._mm.find(b"\t", start)]
+
+    def _title(self, i):
+        start = self._data + self._offsets[i]
+        end = self._data + self._offsets[i + 1] - 1
+        return self._mm[self._mm.find(b"\t", start) + 1 : end].decode()
+
+    def _bisect(self, key, lo=0, hi=None):
+        """Index of the first key >= key within [lo, hi)"""
+        hi = self._count if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def complete(self, prefix, limit=10):
+        """Titles whose normalized form starts with prefix"""
+        prefix = title_index_key(prefix).encode()
+        titles = []
+        i = self._bisect(prefix)
+        while i < self._count and len(titles) < limit:
+            if not self._key(i).startswith(prefix):
+                break
+            titles.append(self._title(i))
+            i += 1
+        return titles
+
+    def correct(self, query, max_distance=None, limit=10):
+        """Titles within a small edit distance of query, closest first
+
+        Walks the sorted keys as an implicit trie (each node is a key range
+        sharing a prefix) while tracking one edit-distance row per node, so only
+        branches that can still end within max_distance are visited. Like most
+        spellers it trusts the first character, which keeps the walk small.
+        """
+        target = title_index_key(query).encode()
+        if not target or not self._count:
+            return []
+        if max_distance is None:
+            # Most typos are a single edit; only widen the search when needed
+            matches = self.correct(query, 1, limit)
+            if matches or len(target) < 8:
+                return matches
+            return self.correct(query, 2, limit)
+
+        first = target[:1]
+        lo = self._bisect(first)
+        hi = self._bisect(bytes([first[0] + 1])) if first != b"\xff" else self._count
+        if lo >= hi:
+            return []
+        root_row = [min(col, max_distance + 1) for col in range(len(target) + 1)]
+        first_row = self._next_row(
+            root_row, None, target, first[0], None, 1, max_distance
+        )
+        matches = []
+        stack = [(first, lo, hi, first_row, root_row)]
+        while stack:
+            prefix, lo, hi, row, previous_row = stack.pop()
+            depth = len(prefix)
+            if self._key_length(lo) == depth:
+                if row[-1] <= max_distance:
+                    matches.append((row[-1], prefix, lo))
+                lo += 1
+            i = lo
+            while i < hi:
+                byte = self._key_byte(i, depth)
+                j = self._skip_byte(i, hi, depth, byte)
+                next_row = self._next_row(
+                    row, previous_row, target, byte, prefix[-1], depth + 1, max_distance
+                )
+                if min(next_row) <= max_distance:
+                    stack.append((prefix + bytes([byte]), i, j, next_row, row))
+                i = j
+
+        matches.sort()
+        return [self._title(i) for _, _, i in matches[:limit]]
+
+    @staticmethod
+    def _next_row(row, previous_row, target, byte, previous_byte, depth, max_distance):
+        """Edit-distance row after appending byte to make a prefix of length depth
+
+        Uses optimal string alignment distance, so swapping two adjacent
+        characters counts as one edit. Only the band of cells within
+        max_distance of the diagonal can stay under the limit, so the rest are
+        left capped at max_distance + 1.
+        """
+        cap = max_distance + 1
+        next_row = [cap] * (len(target) + 1)
+        if depth <= max_distance:
+            next_row[0] = depth
+        for col in range(
+            max(1, depth - max_distance), min(len(target), depth + max_distance) + 1
+        ):
+            cost = min(
+                next_row[col - 1] + 1,
+                row[col] + 1,
+                row[col - 1] + (target[col - 1] != byte),
+                cap,
+            )
+            if (
+                col > 1
+                and previous_byte is not None
+                and target[col - 1] == previous_byte
+                and target[col - 2] == byte
+            ):
+                cost = min(cost, previous_row[col - 2] + 1)
+            next_row[col] = cost
+        return next_row
+
+    def _key_length(self, i):
+        start = self._data + self._offsets[i]
+        return self._mm.find(b"\t", start) - start
+
+    def _key_byte(self, i, depth):
+        return self._mm[self._data + self._offsets[i] + depth]
+
+    def _skip_byte(self, lo, hi, depth, byte):
+        """First index in [lo, hi) whose byte at depth is greater than byte
+
+        All keys in the range share their first depth bytes and are longer.
+        """
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_byte(mid, depth) <= byte:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def suggest(self, query, limit=5):
+        """Typo corrections first, then prefix completions"""
+        suggestions = []
+        for title in self.correct(query, limit=limit) + self.complete(query, limit):
+            if title not in suggestions:
+                suggestions.append(title)
+        return suggestions[:limit]
+
+
+def get_title_index():
+    """Open the configured title index once per process"""
+    global _title_index
+    if _title_index is None and TITLE_INDEX_PATH:
+        with _title_index_lock:
+            if _title_index is None:
+                try:
+                    _title_index = TitleIndex(TITLE_INDEX_PATH)
+                except Exception as e:
+                    print(f"Error opening title index: {e}")
+    return _title_index
+
+
+def suggest_titles(query, limit=5):
+    """ "Did you mean" titles from the local index ([] when there is none)"""
+    title_index = get_title_index()
+    if title_index is None:
+        return []
+    return title_index.suggest(query, limit)
+
+
+@app.cli.command("build-title-index")
+@click.argument("titles_path")
+@click.option("--output", default="titles.idx", help="Index file to write")
+def build_title_index_command(titles_path, output):
+    """Build the title index from a file with one title per line"""
+    opener = gzip.open if titles_path.endswith(".gz") else open
+    with opener(titles_path, "rt", encoding="utf-8", errors="replace") as f:
+        titles = (line for line in f if line.strip() != "page_title")
+        count = build_title_index(titles, output)
+    print(f"[TITLE INDEX] Wrote {count} titles to {output}")
+
+
+# Paragraph phrases marking a disambiguation page
+DISAMBIGUATION_INDICATORS = [
+    "this disambiguation page lists",
+    "this page lists articles associated with the title",
+    "this is a disambiguation page",
+    "this page refers to",
+    "this page lists people with the same name",
+    "this page lists places with the same name",
+    "this page lists topics with the same name",
+    "this page lists articles with the same name",
+    "topics referred to by the same term",
+]
+
+
+# Raw-text prefilter over the lowercased HTML that every marker below matches:
+# the box class names, icon and category themselves, and the phrases even when
+# inline tags split their words. Hatnote links to "... (disambiguation)" pages,
+# which many ordinary articles carry, match none of these, so an article only
+# gets a tree built when its text uses one of the phrases.
+_BETWEEN_WORDS = r"(?:\s|<[^>]*>)+"
+DISAMBIGUATION_PREFILTER = (
+    r"(?:ambox|dmbox)-disambig|disambiguation icon|category:disambiguation"
+    rf"|this{_BETWEEN_WORDS}(?:page{_BETWEEN_WORDS}(?:lists|refers)"
+    rf"|is{_BETWEEN_WORDS}a{_BETWEEN_WORDS}disambiguation)"
+    rf"|same{_BETWEEN_WORDS}term"
+)
+DISAMBIGUATION_PREFILTER_RE = re.compile(DISAMBIGUATION_PREFILTER)
+DISAMBIGUATION_PREFILTER_BYTES_RE = re.compile(DISAMBIGUATION_PREFILTER.encode())
+
+
+def may_be_disambiguation_page(html_content):
+    """Cheap check on raw HTML (str or bytes); False rules a page out"""
+    if isinstance(html_content, bytes):
+        pattern = DISAMBIGUATION_PREFILTER_BYTES_RE
+    else:
+        pattern = DISAMBIGUATION_PREFILTER_RE
+    return pattern.search(html_content.lower()) is not None
+
+
 def is_disambiguation_page(html_content):
     """Check if the HTML content is a disambiguation page"""
-    soup = BeautifulSoup(html_content, "html.parser")
+    if not may_be_disambiguation_page(html_content):
+        return False
 
-    # Check for disambiguation indicators in the page content
-    disambiguation_indicators = [
-        "this disambiguation page lists",
-        "this page lists articles associated with the title",
-        "this is a disambiguation page",
-        "this page refers to",
-        "this page lists people with the same name",
-        "this page lists places with the same name",
-        "this page lists topics with the same name",
-        "this page lists articles with the same name",
-        "topics referred to by the same term",
-    ]
+    soup = BeautifulSoup(html_content, "html.parser")
 
     # Check all paragraphs for disambiguation indicators
     paragraphs = soup.find_all("p")
     for para in paragraphs:
         para_text = para.get_text().lower()
-        for indicator in disambiguation_indicators:
+        for indicator in DISAMBIGUATION_INDICATORS:
             if indicator in para_text:
                 return True
 
@@ -316,17 +1415,8 @@ def get_wikipedia_content(page_title):
     """Get the HTML content of a Wikipedia page"""
     url = f"https://en.wikipedia.org/wiki/{page_title.replace(' ', '_')}"
 
-    # Custom headers with proper user agent for Wikipedia API
-    headers = {
-        "User-Agent": (
-            "Alexandria-Bib/1.0 "
-            "(https://github.com/your-repo/alexandria-bib; your-email@example.com) "
-            "Python/3.12"
-        )
-    }
-
     try:
-        response = requests.get(url, headers=headers)
+        response = wikipedia_get(url)
         response.raise_for_status()
         return response.text
     except Exception as e:
@@ -334,6 +1424,219 @@ def get_wikipedia_content(page_title):
         return None
 
 
+def extract_last_edited(html_content):
+    """Last edit time from a rendered article's JSON-LD metadata, if present"""
+    match = re.search(r'"dateModified":"([^"]+)"', html_content)
+    return match.group(1) if match else None
+
+
+# Where citation HTML comes from: "html" downloads the full rendered article,
+# "parse" asks the MediaWiki parse API for just the reference-type sections.
+WIKIPEDIA_CONTENT_SOURCE = os.environ.get("WIKIPEDIA_CONTENT_SOURCE", "html")
+
+# Section headings (lowercase substrings) worth fetching through the parse API
+REFERENCE_SECTION_TITLES = [
+    "references",
+    "bibliography",
+    "sources",
+    "further reading",
+    "notes",
+    "citations",
+]
+
+# The MediaWiki API accepts at most 50 titles per query
+WIKIPEDIA_TITLES_PER_QUERY = 50
+
+
+def parse_wikipedia_page(params):
+    """Call action=parse with the given params and return the parse object"""
+    params = dict(params, action="parse", format="json", formatversion=2)
+    response = wikipedia_get(WIKIPEDIA_API_URL, params=params)
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data:
+        raise ValueError(data["error"].get("info", "parse API error"))
+    return data["parse"]
+
+
+def get_wikipedia_reference_sections(page_title, revid=None):
+    """Fetch only the reference-type sections of a page through the parse API
+
+    Args:
+        page_title (str): Title of the Wikipedia page
+        revid (int): Revision to fetch; the latest revision when omitted
+
+    Returns:
+        dict: html of the matching sections, revid, and the page's
+        disambiguation flag, or None if the page could not be fetched
+    """
+    page = {"oldid": revid} if revid else {"page": page_title, "redirects": 1}
+    try:
+        overview = parse_wikipedia_page(dict(page, prop="sections|properties|revid"))
+        revid = overview.get("revid", revid)
+        disambiguation = "disambiguation" in (overview.get("properties") or {})
+
+        wanted = []
+        for section in overview.get("sections", []):
+            heading = BeautifulSoup(section["line"], "html.parser").get_text()
+            if not section["index"].isdigit():
+                continue  # Section transcluded from a template
+            if not any(t in heading.lower() for t in REFERENCE_SECTION_TITLES):
+                continue
+            # Parsing a section includes its subsections, so skip nested matches
+            if any(section["number"].startswith(w["number"] + ".") for w in wanted):
+                continue
+            wanted.append(section)
+
+        html_parts = []
+        if not disambiguation:
+            for section in wanted:
+                parsed = parse_wikipedia_page(
+                    {
+                        "oldid": revid,
+                        "prop": "text",
+                        "section": section["index"],
+                        "disablelimitreport": 1,
+                        "disableeditsection": 1,
+                    }
+                )
+                html_parts.append(parsed["text"])
+
+        return {
+            "html": "\n".join(html_parts),
+            "revid": revid,
+            "disambiguation": disambiguation,
+        }
+    except Exception as e:
+        print(f"Error fetching Wikipedia sections: {e}")
+        return None
+
+
+def get_revision_ids(page_titles):
+    """Look up the latest revision id of many pages, 50 titles per query
+
+    Returns:
+        dict: Maps each requested title to its revision id (missing pages are
+        left out)
+    """
+    revids = {}
+    for i in range(0, len(page_titles), WIKIPEDIA_TITLES_PER_QUERY):
+        chunk = page_titles[i : i + WIKIPEDIA_TITLES_PER_QUERY]
+        params = {
+            "action": "query",
+            "format": "json",
+            "formatversion": 2,
+            "prop": "info",
+            "redirects": 1,
+            "titles": "|".join(chunk),
+        }
+        try:
+            response = wikipedia_get(WIKIPEDIA_API_URL, params=params)
+            response.raise_for_status()
+            data = response.json()["query"]
+        except Exception as e:
+            print(f"Error looking up revision ids: {e}")
+            continue
+
+        # Follow title normalization and redirects back to the requested titles
+        renamed = {}
+        for mapping in data.get("normalized", []) + data.get("redirects", []):
+            renamed[mapping["from"]] = mapping["to"]
+        latest = {
+            page["title"]: page["lastrevid"]
+            for page in data.get("pages", [])
+            if "lastrevid" in page
+        }
+        for title in chunk:
+            resolved = title
+            while resolved in renamed:
+                resolved = renamed[resolved]
+            if resolved in latest:
+                revids[title] = latest[resolved]
+    return revids
+
+
+# Aliases map to their target title for a long time, but the latest revision id
+# of a title is only trusted briefly, since it names the article cache entry
+REDIRECT_CACHE_TTL = int(os.environ.get("REDIRECT_CACHE_TTL", 24 * 3600))
+REVISION_CACHE_TTL = int(os.environ.get("REVISION_CACHE_TTL", 300))
+
+
+def resolve_title(title):
+    """Canonical title and latest revision id of the page a title leads to
+
+    Follows title normalization and redirects with one API call; the redirect
+    map and revision ids are cached in Redis.
+
+    Returns:
+        tuple: (canonical title, revid or None), or None if there is no such
+        page or it could not be looked up
+    """
+    redirect_key = get_cache_key(title, "redirect")
+    revision_key = get_cache_key(title, "revision")
+    try:
+        target, revid = redis_client.mget([redirect_key, revision_key])
+        if target == "":
+            return None
+        if target is not None and revid is not None:
+            return target, int(revid)
+    except Exception as e:
+        print(f"Error getting cached title: {e}")
+
+    params = {
+        "action": "query",
+        "format": "json",
+        "formatversion": 2,
+        "prop": "info",
+        "redirects": 1,
+        "titles": title,
+    }
+    try:
+        response = wikipedia_get(WIKIPEDIA_API_URL, params=params)
+        response.raise_for_status()
+        pages = response.json()["query"].get("pages", [])
+    except Exception as e:
+        print(f"Error resolving title: {e}")
+        return None
+
+    target, revid = "", None
+    if pages and not pages[0].get("missing") and not pages[0].get("invalid"):
+        target, revid = pages[0]["title"], pages[0].get("lastrevid")
+    try:
+        pipe = redis_client.pipeline()
+        pipe.setex(redirect_key, REDIRECT_CACHE_TTL, target)
+        if revid:
+            pipe.setex(revision_key, REVISION_CACHE_TTL, revid)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error caching title: {e}")
+    return (target, revid) if target else None
+
+
+def resolve_redirect(title):
+    """Title of the page a title or alias leads to, or None if there is none"""
+    resolved = resolve_title(title)
+    return resolved[0] if resolved else None
+
+
+def get_citation_source(page_title, revid=None):
+    """Fetch the HTML to extract citations from, per WIKIPEDIA_CONTENT_SOURCE
+
+    Returns:
+        tuple: (html, disambiguation) where html is None if the page could not
+        be fetched, and disambiguation is None when the caller has to inspect
+        the HTML to decide
+    """
+    if WIKIPEDIA_CONTENT_SOURCE == "parse":
+        page = get_wikipedia_reference_sections(page_title, revid)
+        if page and page["disambiguation"]:
+            # Disambiguation options need the full article body
+            return get_wikipedia_content(page_title), True
+        if page:
+            return page["html"], False
+    return get_wikipedia_content(page_title), None
+
+
 def extract_bibliography_sections(html_content):
     """Extract bibliography, sources, further reading, or references sections"""
     soup = BeautifulSoup(html_content, "html.parser")
@@ -385,109 +1688,208 @@ def extract_bibliography_sections(html_content):
     return sections
 
 
-def extract_book_citations(html_content):
-    """Extract book citations that contain ISBN numbers"""
-    soup = BeautifulSoup(html_content, "html.parser")
-    citations = []
-
-    # Updated citation selectors to include more sections
-    citation_selectors = [
-        "ol li",
-        "ul li",
-        ".reflist li",
-        ".references li",
-        "#References li",
-        "#Bibliography li",
-        "#Sources li",
-        "#Further_Reading li",
-        "#Notes li",
-        "#Citations li",
-        "#Primary_Sources li",
-        "#Secondary_Sources li",
-        "h2:-soup-contains('References') + ol li",
-        "h2:-soup-contains('Bibliography') + ol li",
-        "h2:-soup-contains('Sources') + ol li",
-        "h2:-soup-contains('Further Reading') + ol li",
-        "h2:-soup-contains('Notes') + ol li",
-        "h2:-soup-contains('Citations') + ol li",
-        "h2:-soup-contains('Primary Sources') + ol li",
-        "h2:-soup-contains('Secondary Sources') + ol li",
-        "h3:-soup-contains('References') + ol li",
-        "h3:-soup-contains('Bibliography') + ol li",
-        "h3:-soup-contains('Sources') + ol li",
-        "h3:-soup-contains('Further Reading') + ol li",
-        "h3:-soup-contains('Notes') + ol li",
-        "h3:-soup-contains('Citations') + ol li",
-        "h3:-soup-contains('Primary Sources') + ol li",
-        "h3:-soup-contains('Secondary Sources') + ol li",
-    ]
+# --- Streaming citation extraction ---
+# Pages are parsed with lxml's push parser as they download, without building a
+# tree: only the text of the list items and paragraphs currently open is kept.
+# Reading stops at the first h2 after the reference sections.
+EXTRACT_CHUNK_SIZE = 16 * 1024
 
-    for selector in citation_selectors:
-        elements = soup.select(selector)
-        for element in elements:
-            text = element.get_text()
-            isbn_pattern = r"ISBN[-\s]?\d+[-\s]?\d+[-\s]?\d+[-\s]?\d+[-\s]?\d+"
-            isbn_found = re.search(isbn_pattern, text, re.IGNORECASE)
-            if isbn_found:
-                c = clean_raw_citation(text)
-                if c and len(c) > 10:
-                    citations.append(c)
-
-    # Also look for citations in specific sections by finding headers and their content
-    section_headers = [
-        "References",
-        "Bibliography",
-        "Sources",
-        "Further Reading",
-        "Notes",
-        "Citations",
-        "Primary Sources",
-        "Secondary Sources",
-    ]
+ISBN_PATTERN = re.compile(
+    r"ISBN[-\s]?\d+[-\s]?\d+[-\s]?\d+[-\s]?\d+[-\s]?\d+", re.IGNORECASE
+)
 
-    # Find all h2 and h3 headers
-    headers = soup.find_all(["h2", "h3"])
 
-    for header in headers:
-        header_text = header.get_text().strip()
+class CitationListTarget:
+    """lxml parser target collecting ISBN-bearing list items as they close
 
-        # Check if this header matches any of our target sections
-        if any(target.lower() in header_text.lower() for target in section_headers):
-            # Get the next sibling elements until we hit another header
-            current = header.find_next_sibling()
-
-            while current and current.name not in ["h1", "h2", "h3", "h4", "h5", "h6"]:
-                if current.name in ["ol", "ul"]:
-                    # Extract list items from this list
-                    list_items = current.find_all("li")
-                    for item in list_items:
-                        text = item.get_text()
-                        isbn_pattern = (
-                            r"ISBN[-\s]?\d+[-\s]?\d+[-\s]?\d+[-\s]?\d+[-\s]?\d+"
-                        )
-                        if re.search(isbn_pattern, text, re.IGNORECASE):
-                            c = clean_raw_citation(text)
-                            if c and len(c) > 10:
-                                citations.append(c)
-                current = current.find_next_sibling()
+    items holds (in_ordered_list, text) pairs in document order, done is set
+    once reading further cannot add anything, and last_edited is picked up
+    along the way. With detect_disambiguation (for pages found by title or
+    search), reading stops at the first disambiguation box, icon or category
+    link and sets disambiguation; page text is never taken as a sign.
+    """
+
+    def __init__(self, detect_disambiguation=False):
+        self.items = []
+        self.done = False
+        # Set when reading was cut short by the deadline
+        self.partial = False
+        self.disambiguation = False
+        self.last_edited = None
+        self._detect_disambiguation = detect_disambiguation
+        self._lists = []
+        self._open_items = []
+        self._heading = None
+        self._skip = 0
+        self._metadata = None
+        self._in_references = False
+
+    def start(self, tag, attrib):
+        if self.done:
+            return
+        if tag in ("ol", "ul"):
+            self._lists.append(tag)
+        elif tag == "li":
+            # A list item outside any list is not collected
+            in_ordered_list = "ol" in self._lists if self._lists else None
+            self._open_items.append((in_ordered_list, []))
+        elif tag == "h2":
+            self._heading = []
+        elif tag in ("script", "style"):
+            self._skip += 1
+            if attrib.get("type") == "application/ld+json":
+                self._metadata = []
+        elif self._detect_disambiguation:
+            classes = attrib.get("class", "").split()
+            if (
+                (tag == "table" and "ambox-disambig" in classes)
+                or (tag == "div" and "dmbox-disambig" in classes)
+                or (tag == "img" and attrib.get("alt") == "Disambiguation icon")
+                or (tag == "a" and "Category:Disambiguation" in attrib.get("href", ""))
+            ):
+                self._set_disambiguation()
+
+    def end(self, tag):
+        if self.done:
+            return
+        if tag in ("ol", "ul"):
+            if self._lists:
+                self._lists.pop()
+        elif tag == "li":
+            if self._open_items:
+                in_ordered_list, parts = self._open_items.pop()
+                text = "".join(parts)
+                if in_ordered_list is not None and ISBN_PATTERN.search(text):
+                    self.items.append((in_ordered_list, text))
+        elif tag == "h2":
+            if self._heading is not None:
+                heading = "".join(self._heading).strip().lower()
+                self._heading = None
+                if any(title in heading for title in REFERENCE_SECTION_TITLES):
+                    self._in_references = True
+                elif self._in_references:
+                    self.done = True
+        elif tag in ("script", "style"):
+            self._skip = max(0, self._skip - 1)
+            if self._metadata is not None:
+                match = re.search(r'"dateModified":"([^"]+)"', "".join(self._metadata))
+                self.last_edited = match.group(1) if match else None
+                self._metadata = None
+
+    def data(self, data):
+        if self.done:
+            return
+        if self._metadata is not None:
+            self._metadata.append(data)
+        if self._skip:
+            return
+        for _, parts in self._open_items:
+            parts.append(data)
+        if self._heading is not None:
+            self._heading.append(data)
+
+    def close(self):
+        return self.items
+
+    def _set_disambiguation(self):
+        # Citations are not wanted from disambiguation pages
+        self.disambiguation = True
+        self.done = True
+
+
+def iter_list_items(chunks, target=None):
+    """Feed HTML chunks (bytes or str) to the parser, yielding list items early
+
+    Yields (in_ordered_list, text) for each ISBN-bearing list item as soon as
+    it closes, and stops pulling chunks once the target is done or the thread's
+    deadline has passed (marking the target partial).
+    """
+    target = target or CitationListTarget()
+    parser = etree.HTMLParser(target=target, encoding="utf-8")
+    for chunk in chunks:
+        if time_left() <= 0:
+            target.partial = True
+            break
+        parser.feed(chunk.encode() if isinstance(chunk, str) else chunk)
+        yield from target.items
+        target.items.clear()
+        if target.done:
+            break
+    parser.close()
+    yield from target.items
+    target.items.clear()
+
+
+def citations_from_list_items(items):
+    """Clean, deduplicate and filter raw list items into book citations
+
+    Items in ordered lists come first, then the rest, each in document order.
+    """
+    ordered, unordered = [], []
+    for in_ordered_list, text in items:
+        (ordered if in_ordered_list else unordered).append(text)
 
     # Remove duplicates while preserving order
     unique_citations = []
     seen = set()
-    for citation in citations:
-        if citation not in seen:
+    for text in ordered + unordered:
+        citation = clean_raw_citation(text)
+        if citation and len(citation) > 10 and citation not in seen:
             unique_citations.append(citation)
             seen.add(citation)
 
     # Filter to only include citations with dates in parentheses
-    filtered_citations = []
     date_pattern = r"\([^)]*(?:\d{4}|\d{1,2}\s+[A-Za-z]+(?:\s+\d{4})?)[^)]*\)"
+    return [
+        citation
+        for citation in unique_citations
+        if re.search(date_pattern, citation, re.IGNORECASE)
+    ]
+
 
-    for citation in unique_citations:
-        if re.search(date_pattern, citation, re.IGNORECASE):
-            filtered_citations.append(citation)
+def html_chunks(html_content):
+    """Slice a whole page so extraction can stop between slices"""
+    for start in range(0, len(html_content), EXTRACT_CHUNK_SIZE):
+        yield html_content[start : start + EXTRACT_CHUNK_SIZE]
+
+
+def extract_book_citations(html_content, target=None):
+    """Extract book citations that contain ISBN numbers"""
+    return citations_from_list_items(iter_list_items(html_chunks(html_content), target))
+
+
+def stream_page_citations(page_title):
+    """Download a rendered article, extracting citations while it arrives
+
+    Returns:
+        dict: {"citations", "disambiguation", "last_edited", "partial"}, or
+        None if the page could not be fetched. Citations are None for
+        disambiguation pages.
+    """
+    url = f"https://en.wikipedia.org/wiki/{page_title.replace(' ', '_')}"
+    target = CitationListTarget(detect_disambiguation=True)
+    try:
+        response = wikipedia_get(url, stream=True)
+        try:
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=EXTRACT_CHUNK_SIZE)
+            items = list(iter_list_items(chunks, target))
+        finally:
+            # Drops the rest of the download when extraction stopped early
+            response.close()
+    except Exception as e:
+        print(f"Error fetching Wikipedia page: {e}")
+        return None
 
-    return filtered_citations
+    citations = None
+    if not target.disambiguation:
+        citations = citations_from_list_items(items)
+    return {
+        "citations": citations,
+        "disambiguation": target.disambiguation,
+        "last_edited": target.last_edited,
+        "partial": target.partial,
+    }
 
 
 def clean_citation(citation):
@@ -516,12 +1918,14 @@ def clean_citation(citation):
         citation = citation[: isbn_match.end()].strip()
 
     # Step 2: Remove page numbers
-    # Pattern to match various page number formats
+    # Pattern to match various page number formats. Patterns led by
+    # whitespace only start at the beginning of a whitespace run, so long runs
+    # are not rescanned from every position.
     page_patterns = [
-        r"\s+pp\.\s+\d+[–—−-]\d+\.?",  # pp. 139–141
-        r"\s+p\.\s+\d+\.?",  # p. 251
-        r"\s+pages?\s+\d+[–—−-]\d+\.?",  # pages 139-141
-        r"\s+page\s+\d+\.?",  # page 251
+        r"(?<!\s)\s+pp\.\s+\d+[–—−-]\d+\.?",  # pp. 139–141
+        r"(?<!\s)\s+p\.\s+\d+\.?",  # p. 251
+        r"(?<!\s)\s+pages?\s+\d+[–—−-]\d+\.?",  # pages 139-141
+        r"(?<!\s)\s+page\s+\d+\.?",  # page 251
     ]
 
     for pattern in page_patterns:
@@ -529,11 +1933,11 @@ def clean_citation(citation):
 
     # Step 3: Remove (PDF) from book titles
     # Pattern to match (PDF) with optional spaces around it
-    pdf_pattern = r"\s*\(PDF\)\s*"
+    pdf_pattern = r"(?:(?<!\s)\s+)?\(PDF\)\s*"
     citation = re.sub(pdf_pattern, "", citation, flags=re.IGNORECASE)
 
     # Clean up any extra whitespace and fix spaces before periods
-    citation = re.sub(r"\s+\.", ".", citation)  # Remove space(s) before period
+    citation = re.sub(r"(?<!\s)\s+\.", ".", citation)  # Remove space(s) before period
     citation = re.sub(r"\s+", " ", citation).strip()
     citation = re.sub(r"\.\s*$", "", citation)  # Remove trailing period
 
@@ -553,45 +1957,327 @@ def clean_raw_citation(text):
     return c
 
 
-def type_1_parser(citation):
-    """
-    Parse Type I citations that contain parenthetical dates.
-    Extracts author names, year/date, title, and ISBN from the citation.
+# --- Parsed citation records ---
+# Parsers fill fixed-shape records instead of fresh dicts so that large batches
+# and the parse cache only pay for one slot per field.
 
-    Args:
-        citation (str): A citation string that contains parenthetical dates
 
-    Returns:
-        dict: Parsed citation data with authors, year, title, isbn, and
-        remaining_text fields
-    """
+class CitationRecord:
+    """Base class for parsed citation records with dict-style field access"""
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.values() == other.values()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def values(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def copy(self):
+        return type(self)(**self.to_dict())
+
+    def to_json(self):
+        """Serialize straight to a JSON object string (sorted keys, ASCII only)"""
+        parts = []
+        for name in sorted(self.__slots__):
+            value = getattr(self, name)
+            if value is None:
+                encoded = "null"
+            elif isinstance(value, str):
+                encoded = encode_basestring_ascii(value)
+            else:
+                encoded = json.dumps(value)
+            parts.append(f'"{name}":{encoded}')
+        return "{" + ",".join(parts) + "}"
+
+
+class BookCitation(CitationRecord):
+    """Parsed Type I / Type II citation"""
+
+    __slots__ = ("authors", "year", "title", "isbn", "remaining_text")
+
+
+class ChapterCitation(CitationRecord):
+    """Parsed Type III / Type IV citation"""
+
+    __slots__ = (
+        "chapter_authors",
+        "book_authors",
+        "year",
+        "chapter_title",
+        "book_title",
+        "isbn",
+        "remaining_text",
+    )
+
+
+class EditedCitation(CitationRecord):
+    """Parsed Type V citation"""
+
+    __slots__ = ("authors", "year", "editor", "title", "isbn", "remaining_text")
+
+
+def records_to_json(records):
+    """Serialize a list of citation records to a JSON array string"""
+    return json_dumps([record.to_dict() for record in records]).decode()
+
+
+# --- Linear-time matching ---
+# Parsers run on arbitrary client text (/api/parse/batch), so no pattern may
+# backtrack super-linearly. Python 3.9 has no atomic groups, so patterns led by
+# whitespace only start at the beginning of a whitespace run ((?<!\s) guard),
+# and searches where every candidate start hinges on the same parenthesis are
+# done once per parenthesis instead of once per start position.
+DATE_IN_PARENS_RE = re.compile(r"\d{4}|\d\s+[A-Za-z]")
+YEAR_IN_PARENS_RE = re.compile(r"\d{4}")
+BY_CLAUSE_RE = re.compile(r"by\s+([^\(]+?)\s*\(", re.IGNORECASE)
+EDS_PAREN_RE = re.compile(r"\(eds?\.\)[,\.]", re.IGNORECASE)
+IN_EDITORS_RE = re.compile(r"in\s+([^\(]+\(eds?\.\))[,\.]", re.IGNORECASE)
+ED_PAREN_RE = re.compile(r"\(ed\.\)", re.IGNORECASE)
+EDITOR_RE = re.compile(r"([^\(]+)\(ed\.\)", re.IGNORECASE)
+BRACKET_END_RE = re.compile(r"[\]\n]")
+# Publisher-like text right after a period ends a Type I title
+PUBLISHER_AFTER_PERIOD_RE = re.compile(
+    r"\s*(?:"
+    # Location: Publisher pattern (e.g., "New York: Random House",
+    # "Bethesda, MD: American Fisheries Society")
+    r"[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*(?:,\s*[A-Z]{2})?\s*:\s*[A-Z]"
+    # Publisher ending with common words
+    r"|[A-Z][a-zA-Z\s&]+(?:Press|Publishing|University|Books|"
+    r"Publishers|Inc|Ltd|Co|Corp|Society|Bank|Affairs)"
+    # Working paper or report patterns
+    r"|[A-Z][a-zA-Z\s]+(?:Working Paper|Report|Study|Series)"
+    # Simple publisher names (like "Dover", "Twenty-First Century")
+    r"|[A-Z][a-zA-Z\s\-]+(?:Books|Press|Publishing|Publisher|"
+    r"University|College|Institute|Society|Company|Corporation|"
+    r"Inc|Ltd|Co|Corp)"
+    # Specific known publishers (fallback)
+    r"|(?:press|publishing|publisher|university|blackwell|"
+    r"princeton|cambridge|oxford|harvard|yale|penguin|random house|"
+    r"simon & schuster|wiley|springer|elsevier|macmillan|routledge|"
+    r"academic press|london & new york|london|new york|washington|"
+    r"regnery|world bank|fisheries society|publicaffairs|dover|"
+    r"twenty-first century books|motilal banarsidass|archana verma|"
+    r"foreign languages press|st\. martin's press|w\. w\. norton|"
+    r"univ\. press of kentucky))",
+    re.IGNORECASE,
+)
+# An initial or capitalized surname after a period is part of the title
+INITIAL_OR_SURNAME_RE = re.compile(r"\s+[A-Z](?:\.|\b)|\s+[A-Z][a-z]+")
+NEXT_CHAR_RE = re.compile(r"\s*(\S)")
+
+
+def find_parenthetical(text, pattern):
+    """
+    Find the first "(...)" group (without ")" inside) that contains pattern.
+
+    Every "(" between two ")" shares one closing parenthesis, so only the first
+    of them is checked instead of scanning on from each one.
+
+    Returns:
+        tuple: (start, end) of the group, or None
+    """
+    pos = 0
+    while True:
+        close = text.find(")", pos)
+        if close == -1:
+            return None
+        start = text.find("(", pos, close)
+        if start != -1 and pattern.search(text, start + 1, close):
+            return start, close + 1
+        pos = close + 1
+
+
+def find_by_clause(text):
+    """
+    Find a "by Author (...)" clause.
+
+    Only the "by"s before a "(" that is closed further on are tried.
+
+    Returns:
+        re.Match: Match of BY_CLAUSE_RE (author in group 1), or None
+    """
+    last_close = text.rfind(")")
+    pos = 0
+    while True:
+        paren = text.find("(", pos)
+        if paren == -1 or paren + 2 > last_close:
+            return None
+        if text[paren + 1] != ")":
+            match = BY_CLAUSE_RE.search(text, pos, paren + 1)
+            if match:
+                return match
+        pos = paren + 1
+
+
+def find_in_editors(text):
+    """
+    Find an "in Editors (eds.)," clause.
+
+    Only the text between each "(eds.)" and the "(" before it is searched.
+
+    Returns:
+        re.Match: Match of IN_EDITORS_RE, or None
+    """
+    for eds in EDS_PAREN_RE.finditer(text):
+        start = text.rfind("(", 0, eds.start()) + 1
+        match = IN_EDITORS_RE.search(text, start, eds.end())
+        if match:
+            return match
+    return None
+
+
+def find_editor(text):
+    """
+    Find an "Editor (ed.)" clause: the text between "(ed.)" and the "(" before
+    it.
+
+    Returns:
+        re.Match: Match of EDITOR_RE (editor in group 1), or None
+    """
+    for ed in ED_PAREN_RE.finditer(text):
+        start = text.rfind("(", 0, ed.start()) + 1
+        if start < ed.start():
+            return EDITOR_RE.match(text, start)
+    return None
+
+
+def strip_bracketed(text):
+    """
+    Remove "[...]" groups and the whitespace before them in one pass. Like the
+    regex it replaces, a group does not span lines.
+    """
+    kept = []
+    pos = search = 0
+    while True:
+        start = text.find("[", search)
+        if start == -1:
+            break
+        end = BRACKET_END_RE.search(text, start + 1)
+        if end is None:
+            break
+        search = end.end()
+        if end.group() == "]":
+            kept.append(text[pos:start].rstrip())
+            pos = search
+    kept.append(text[pos:])
+    return "".join(kept)
+
+
+def outside_parens(text, positions):
+    """Keep the ascending positions that are not inside an unclosed "(" """
+    kept = []
+    opened = closed = last = 0
+    for pos in positions:
+        opened += text.count("(", last, pos)
+        closed += text.count(")", last, pos)
+        last = pos
+        if opened <= closed:
+            kept.append(pos)
+    return kept
+
+
+# --- Parse budget ---
+# Linear patterns bound the work per character, these bound the characters:
+# longer citations and parses that run out of their time budget get a cheap
+# parse that only picks out the year and ISBN.
+PARSE_MAX_CITATION_LENGTH = int(
+    os.environ.get("PARSE_MAX_CITATION_LENGTH", 2000)
+)  # 0 = no limit
+PARSE_CITATION_BUDGET = float(
+    os.environ.get("PARSE_CITATION_BUDGET", 0.05)
+)  # seconds, 0 = off
+
+parse_stats = {"fallback_length": 0, "fallback_budget": 0}
+parse_stats_lock = threading.Lock()
+
+
+class ParseBudgetExceeded(Exception):
+    """A citation took longer to parse than PARSE_CITATION_BUDGET"""
+
+
+# Per-thread absolute parse deadline (time.monotonic), None when unbounded
+_parse_deadline = threading.local()
+
+
+def check_parse_budget():
+    """Raise ParseBudgetExceeded once the current parse is over its budget"""
+    at = getattr(_parse_deadline, "at", None)
+    if at is not None and time.monotonic() > at:
+        raise ParseBudgetExceeded()
+
+
+def fallback_record(record_class, citation):
+    """Cheap parse: only the year and ISBN, the text stays in remaining_text"""
+    year_match = re.search(r"\b(19|20)\d{2}\b", citation)
+    isbn_match = re.search(r"ISBN\s+([0-9\-X]+)", citation, re.IGNORECASE)
+    return record_class(
+        year=year_match.group(0) if year_match else None,
+        isbn=isbn_match.group(1) if isbn_match else None,
+        remaining_text=citation,
+    )
+
+
+def type_1_parser(citation):
+    """
+    Parse Type I citations that contain parenthetical dates.
+    Extracts author names, year/date, title, and ISBN from the citation.
+
+    Args:
+        citation (str): A citation string that contains parenthetical dates
+
+    Returns:
+        dict: Parsed citation data with authors, year, title, isbn, and
+        remaining_text fields
+    """
+    return type_1_record(citation).to_dict()
+
+
+def type_1_record(citation):
+    """
+    Parse a Type I citation into a BookCitation record.
+
+    Args:
+        citation (str): A citation string that contains parenthetical dates
+
+    Returns:
+        BookCitation: Parsed citation record
+    """
     if not citation:
-        return {
-            "authors": None,
-            "year": None,
-            "title": None,
-            "isbn": None,
-            "remaining_text": "",
-        }
+        return BookCitation(remaining_text="")
 
     # Initialize result
-    result = {
-        "authors": None,
-        "year": None,
-        "title": None,
-        "isbn": None,
-        "remaining_text": citation,
-    }
+    result = BookCitation(remaining_text=citation)
 
     # Extract year/date from parentheses
-    # Pattern to match (2003) or (January 5, 1980) or (March 6, 1987)
-    date_pattern = r"\([^)]*(?:\d{4}|\d{1,2}\s+[A-Za-z]+(?:\s+\d{4})?)[^)]*\)"
-    date_match = re.search(date_pattern, citation, re.IGNORECASE)
+    # Matches (2003) or (January 5, 1980) or (March 6, 1987)
+    date_span = find_parenthetical(citation, DATE_IN_PARENS_RE)
 
-    if date_match:
-        date_text = date_match.group(0)
-        date_start = date_match.start()
-        date_end = date_match.end()
+    if date_span:
+        date_start, date_end = date_span
+        date_text = citation[date_start:date_end]
 
         # Extract authors from everything before the parentheses
         authors = citation[:date_start].strip()
@@ -688,89 +2374,40 @@ def type_1_parser(citation):
             r"ISBN",
             r" p\.",
             r" pp\.",
-            r"\s+retrieved",
-            r"\s+archived",
+            r"(?<!\s)\s+retrieved",
+            r"(?<!\s)\s+archived",
         ]
         stops = []
 
         # Check for periods, but be smarter about periods in names and
-        # publisher detection
-        period_matches = list(re.finditer(r"\.", text_after_date))
-        for match in period_matches:
-            pos = match.start()
-            # Count parentheses before this position
-            open_parens = text_after_date[:pos].count("(")
-            close_parens = text_after_date[:pos].count(")")
-            # If we're inside parentheses, skip this stop
-            if open_parens > close_parens:
-                continue
-
+        # publisher detection. Periods inside parentheses are skipped.
+        periods = [match.start() for match in re.finditer(r"\.", text_after_date)]
+        for pos in outside_parens(text_after_date, periods):
+            check_parse_budget()
             # Check if this period is followed by publisher-like content
-            text_after_period = text_after_date[pos + 1 :]
-            if text_after_period:
-                import re as _re
-
-                # Look for publisher patterns (more robust than hardcoded keywords)
-                publisher_patterns = [
-                    # Location: Publisher pattern (e.g., "New York: Random House",
-                    # "Bethesda, MD: American Fisheries Society")
-                    r"^\s*[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*(?:,\s*[A-Z]{2})?\s*:\s*[A-Z]",
-                    # Publisher ending with common words
-                    r"^\s*[A-Z][a-zA-Z\s&]+(?:Press|Publishing|University|Books|"
-                    r"Publishers|Inc|Ltd|Co|Corp|Society|Bank|Affairs)",
-                    # Working paper or report patterns
-                    r"^\s*[A-Z][a-zA-Z\s]+(?:Working Paper|Report|Study|Series)",
-                    # Simple publisher names (like "Dover", "Twenty-First Century")
-                    r"^\s*[A-Z][a-zA-Z\s\-]+(?:Books|Press|Publishing|Publisher|"
-                    r"University|College|Institute|Society|Company|Corporation|"
-                    r"Inc|Ltd|Co|Corp)",
-                    # Specific known publishers (fallback)
-                    r"^\s*(?:press|publishing|publisher|university|blackwell|"
-                    r"princeton|cambridge|oxford|harvard|yale|penguin|random house|"
-                    r"simon & schuster|wiley|springer|elsevier|macmillan|routledge|"
-                    r"academic press|london & new york|london|new york|washington|"
-                    r"regnery|world bank|fisheries society|publicaffairs|dover|"
-                    r"twenty-first century books|motilal banarsidass|archana verma|"
-                    r"foreign languages press|st\. martin's press|w\. w\. norton|"
-                    r"univ\. press of kentucky)",
-                ]
-
-                is_publisher = False
-                for pattern in publisher_patterns:
-                    if _re.search(pattern, text_after_period, _re.IGNORECASE):
-                        stops.append(pos)
-                        is_publisher = True
-                        break
-
-                if not is_publisher:
-                    # Check for initials or capitalized surname (likely part of title)
-                    initial_or_surname = _re.match(
-                        r"^\s+[A-Z](\.|\b)|^\s+[A-Z][a-z]+", text_after_period
-                    )
-                    if initial_or_surname:
-                        continue  # skip this period, it's part of an initial or surname
-                    # Otherwise, if it's a new sentence (capital letter), treat as stop
-                    if (
-                        text_after_period.strip()
-                        and text_after_period.strip()[0].isupper()
-                    ):
-                        stops.append(pos)
+            if pos + 1 == len(text_after_date):
+                continue
+            if PUBLISHER_AFTER_PERIOD_RE.match(text_after_date, pos + 1):
+                stops.append(pos)
+                continue
+            # Check for initials or capitalized surname (likely part of title)
+            if INITIAL_OR_SURNAME_RE.match(text_after_date, pos + 1):
+                continue  # skip this period, it's part of an initial or surname
+            # Otherwise, if it's a new sentence (capital letter), treat as stop
+            next_char = NEXT_CHAR_RE.match(text_after_date, pos + 1)
+            if next_char and next_char.group(1).isupper():
+                stops.append(pos)
 
         # Also check for other stop patterns
         for pat in stop_patterns:
             if pat == r"\.":  # Skip periods as we already handled them above
                 continue
-            matches = list(re.finditer(pat, text_after_date, re.IGNORECASE))
-            for match in matches:
-                # Check if this stop is inside parentheses (part of title)
-                pos = match.start()
-                # Count parentheses before this position
-                open_parens = text_after_date[:pos].count("(")
-                close_parens = text_after_date[:pos].count(")")
-                # If we're inside parentheses, skip this stop
-                if open_parens > close_parens:
-                    continue
-                stops.append(pos)
+            matches = [
+                match.start()
+                for match in re.finditer(pat, text_after_date, re.IGNORECASE)
+            ]
+            # Stops inside parentheses are part of the title
+            stops.extend(outside_parens(text_after_date, matches))
         if comma_stop is not None:
             stops.append(comma_stop)
         if stops:
@@ -779,11 +2416,11 @@ def type_1_parser(citation):
         else:
             title = text_after_date.strip()
         # Remove (PDF) from title
-        title = re.sub(r"\s*\(PDF\)\s*", "", title, flags=re.IGNORECASE)
+        title = re.sub(r"(?:(?<!\s)\s+)?\(PDF\)\s*", "", title, flags=re.IGNORECASE)
         # Remove bracketed content from title
-        title = re.sub(r"\s*\[.*?\]", "", title).strip()
+        title = strip_bracketed(title).strip()
         # Remove trailing period
-        title = re.sub(r"\.+$", "", title).strip()
+        title = re.sub(r"(?<!\.)\.+$", "", title).strip()
         result["title"] = title
         # Remove the title from the remaining text
         if stops:
@@ -825,36 +2462,30 @@ def type_3_parser(citation):
         dict: Parsed citation data with chapter_authors, book_authors, year,
         chapter_title, book_title, isbn, and remaining_text fields
     """
-    if not citation:
-        return {
-            "chapter_authors": None,
-            "book_authors": None,
-            "year": None,
-            "chapter_title": None,
-            "book_title": None,
-            "isbn": None,
-            "remaining_text": citation,
-        }
+    return type_3_record(citation).to_dict()
 
+
+def type_3_record(citation):
+    """
+    Parse a Type III citation into a ChapterCitation record.
+
+    Args:
+        citation (str): A citation string that contains quoted chapter titles
+
+    Returns:
+        ChapterCitation: Parsed citation record
+    """
     # Initialize result
-    result = {
-        "chapter_authors": None,
-        "book_authors": None,
-        "year": None,
-        "chapter_title": None,
-        "book_title": None,
-        "isbn": None,
-        "remaining_text": citation,
-    }
+    result = ChapterCitation(remaining_text=citation)
+    if not citation:
+        return result
 
     # Extract year/date from parentheses
-    date_pattern = r"\([^)]*(?:\d{4}|\d{1,2}\s+[A-Za-z]+(?:\s+\d{4})?)[^)]*\)"
-    date_match = re.search(date_pattern, citation, re.IGNORECASE)
+    date_span = find_parenthetical(citation, DATE_IN_PARENS_RE)
 
-    if date_match:
-        date_text = date_match.group(0)
-        date_start = date_match.start()
-        date_end = date_match.end()
+    if date_span:
+        date_start, date_end = date_span
+        date_text = citation[date_start:date_end]
 
         # Extract chapter authors from everything before the parentheses
         chapter_authors = citation[:date_start].strip()
@@ -888,8 +2519,7 @@ def type_3_parser(citation):
             # Clean up text_after_quote for leading commas/whitespace/periods
             text_after_quote = text_after_quote.lstrip(", . ").strip()
             # Look for "in" followed by book authors and "(eds.)"
-            in_pattern = r"in\s+([^\(]+\(eds?\.\))[,\.]"
-            in_match = re.search(in_pattern, text_after_quote, re.IGNORECASE)
+            in_match = find_in_editors(text_after_quote)
 
             if in_match:
                 book_authors = in_match.group(1).strip()
@@ -1031,23 +2661,23 @@ def type_2_parser(citation):
         dict: Parsed citation data with authors, year, title, isbn, and
         remaining_text fields
     """
-    if not citation:
-        return {
-            "authors": None,
-            "year": None,
-            "title": None,
-            "isbn": None,
-            "remaining_text": citation,
-        }
+    return type_2_record(citation).to_dict()
+
 
+def type_2_record(citation):
+    """
+    Parse a Type II citation into a BookCitation record.
+
+    Args:
+        citation (str): A citation string that contains standalone years
+
+    Returns:
+        BookCitation: Parsed citation record
+    """
     # Initialize result
-    result = {
-        "authors": None,
-        "year": None,
-        "title": None,
-        "isbn": None,
-        "remaining_text": citation,
-    }
+    result = BookCitation(remaining_text=citation)
+    if not citation:
+        return result
 
     # Extract ISBN first
     isbn_pattern = r"ISBN\s+([0-9\-X]+)"
@@ -1064,7 +2694,7 @@ def type_2_parser(citation):
     year_match = re.search(year_pattern, citation)
 
     # Always define author_year_match
-    author_year_pattern = r"^([^\(]+)\s*\(\d{4}\)\."
+    author_year_pattern = r"^([^\(]+)\(\d{4}\)\."
     author_year_match = re.match(author_year_pattern, citation)
 
     if year_match:
@@ -1109,15 +2739,14 @@ def type_2_parser(citation):
                 break
 
         # Check if this is a "Title (year) by Author" format
-        by_pattern = r"by\s+([^\(]+?)\s*\([^\)]+\)"
-        by_match = re.search(by_pattern, citation, re.IGNORECASE)
+        by_match = find_by_clause(citation)
         if by_match:
             author_part = by_match.group(1).strip()
-            author = re.sub(r"\s*\([^\)]*\)\s*$", "", author_part).strip()
+            author = re.sub(r"(?<!\s)\s*\([^\)]*\)\s*$", "", author_part).strip()
             citation_without_author = citation[: by_match.start()].strip()
             title = citation_without_author[:year_start].strip()
             title = re.sub(r",\s*$", "", title).strip()
-            title = re.sub(r"\s*\(\s*$", "", title).strip()
+            title = re.sub(r"(?<!\s)\s*\(\s*$", "", title).strip()
             result["authors"] = author
             result["title"] = title
             result["remaining_text"] = citation[year_end : by_match.start()].strip()
@@ -1214,34 +2843,30 @@ def type_5_parser(citation):
         dict: Parsed citation data with authors, year, editor, title, isbn, and
         remaining_text fields
     """
-    if not citation:
-        return {
-            "authors": None,
-            "year": None,
-            "editor": None,
-            "title": None,
-            "isbn": None,
-            "remaining_text": citation,
-        }
+    return type_5_record(citation).to_dict()
+
+
+def type_5_record(citation):
+    """
+    Parse a Type V citation into an EditedCitation record.
 
+    Args:
+        citation (str): A citation string that contains editor information
+
+    Returns:
+        EditedCitation: Parsed citation record
+    """
     # Initialize result
-    result = {
-        "authors": None,
-        "year": None,
-        "editor": None,
-        "title": None,
-        "isbn": None,
-        "remaining_text": citation,
-    }
+    result = EditedCitation(remaining_text=citation)
+    if not citation:
+        return result
 
     # Extract year/date from parentheses
-    date_pattern = r"\([^)]*(?:\d{4}|\d{1,2}\s+[A-Za-z]+(?:\s+\d{4})?)[^)]*\)"
-    date_match = re.search(date_pattern, citation, re.IGNORECASE)
+    date_span = find_parenthetical(citation, DATE_IN_PARENS_RE)
 
-    if date_match:
-        date_text = date_match.group(0)
-        date_start = date_match.start()
-        date_end = date_match.end()
+    if date_span:
+        date_start, date_end = date_span
+        date_text = citation[date_start:date_end]
 
         # Extract authors from everything before the parentheses
         authors = citation[:date_start].strip()
@@ -1258,8 +2883,7 @@ def type_5_parser(citation):
             text_after_date = text_after_date[1:].strip()
 
         # Look for editor pattern: Name (ed.)
-        editor_pattern = r"([^\(]+)\s*\(ed\.\)"
-        editor_match = re.search(editor_pattern, text_after_date, re.IGNORECASE)
+        editor_match = find_editor(text_after_date)
 
         if editor_match:
             editor = editor_match.group(1).strip()
@@ -1308,16 +2932,13 @@ def type_5_parser(citation):
             stops = []
 
             for pattern in stop_patterns:
-                matches = list(re.finditer(pattern, text_after_editor, re.IGNORECASE))
-                for match in matches:
-                    pos = match.start()
-                    # Count parentheses before this position
-                    open_parens = text_after_editor[:pos].count("(")
-                    close_parens = text_after_editor[:pos].count(")")
-                    # If we're inside parentheses, skip this stop
-                    if open_parens > close_parens:
-                        continue
-                    stops.append(pos)
+                check_parse_budget()
+                matches = [
+                    match.start()
+                    for match in re.finditer(pattern, text_after_editor, re.IGNORECASE)
+                ]
+                # Stops inside parentheses are part of the title
+                stops.extend(outside_parens(text_after_editor, matches))
 
             if stops:
                 stop_index = min(stops)
@@ -1363,27 +2984,24 @@ def type_4_parser(citation):
         dict: Parsed citation data with chapter_authors, book_authors, year,
         chapter_title, book_title, isbn, and remaining_text fields
     """
-    if not citation:
-        return {
-            "chapter_authors": None,
-            "book_authors": None,
-            "year": None,
-            "chapter_title": None,
-            "book_title": None,
-            "isbn": None,
-            "remaining_text": citation,
-        }
+    return type_4_record(citation).to_dict()
+
+
+def type_4_record(citation):
+    """
+    Parse a Type IV citation into a ChapterCitation record.
+
+    Args:
+        citation (str): A citation string that contains quoted chapter titles
+        without parenthetical dates
 
+    Returns:
+        ChapterCitation: Parsed citation record
+    """
     # Initialize result
-    result = {
-        "chapter_authors": None,
-        "book_authors": None,
-        "year": None,
-        "chapter_title": None,
-        "book_title": None,
-        "isbn": None,
-        "remaining_text": citation,
-    }
+    result = ChapterCitation(remaining_text=citation)
+    if not citation:
+        return result
 
     # First, try to find quoted chapter title
     quote_pattern = r'[\'"]([^\'"]+)[\'"]'
@@ -1411,8 +3029,7 @@ def type_4_parser(citation):
         text_after_quote = text_after_quote.lstrip(", ").strip()
 
         # Look for "in" followed by book authors and "(eds.)"
-        in_pattern = r"in\s+([^\(]+\(eds?\.\))[,\.]"
-        in_match = re.search(in_pattern, text_after_quote, re.IGNORECASE)
+        in_match = find_in_editors(text_after_quote)
 
         if in_match:
             book_authors = in_match.group(1).strip()
@@ -1483,7 +3100,7 @@ def determine_parser_type(citation):
     if "(ed." in citation or "(eds." in citation:
         return "type5"
     # Check for parenthetical dates (Type 1) - look for year in parentheses
-    if re.search(r"\([^)]*\d{4}[^)]*\)", citation):
+    if find_parenthetical(citation, YEAR_IN_PARENS_RE):
         return "type1"
     # Check for standalone years (Type 2)
     if re.search(r"\b(19|20)\d{2}\b", citation) and "(" not in citation:
@@ -1492,29 +3109,367 @@ def determine_parser_type(citation):
     return "type1"
 
 
+PARSE_CACHE_SIZE = int(os.environ.get("PARSE_CACHE_SIZE", 4096))
+
+
+PARSERS = {
+    "type1": (type_1_record, BookCitation),
+    "type2": (type_2_record, BookCitation),
+    "type3": (type_3_record, ChapterCitation),
+    "type4": (type_4_record, ChapterCitation),
+    "type5": (type_5_record, EditedCitation),
+}
+
+
+def parse_or_raise(parser_type, citation):
+    """
+    Parse a citation with the given parser, falling back to a cheap parse when
+    the citation is too long. The result only depends on the citation.
+
+    Args:
+        parser_type (str): Key of PARSERS
+        citation (str): Citation text
+
+    Returns:
+        CitationRecord: Parsed citation record
+
+    Raises:
+        ParseBudgetExceeded: The parse ran out of its time budget
+    """
+    parser, record_class = PARSERS[parser_type]
+    if PARSE_MAX_CITATION_LENGTH and len(citation) > PARSE_MAX_CITATION_LENGTH:
+        with parse_stats_lock:
+            parse_stats["fallback_length"] += 1
+        return fallback_record(record_class, citation)
+    if PARSE_CITATION_BUDGET:
+        _parse_deadline.at = time.monotonic() + PARSE_CITATION_BUDGET
+    try:
+        return parser(citation)
+    finally:
+        _parse_deadline.at = None
+
+
+def budget_fallback(parser_type, citation):
+    """Cheap parse of a citation whose parse ran out of its time budget"""
+    with parse_stats_lock:
+        parse_stats["fallback_budget"] += 1
+    return fallback_record(PARSERS[parser_type][1], citation)
+
+
+def parse_within_budget(parser_type, citation):
+    """
+    Parse a citation with the given parser, falling back to a cheap parse when
+    the citation is too long or the parse runs out of its time budget.
+
+    Args:
+        parser_type (str): Key of PARSERS
+        citation (str): Citation text
+
+    Returns:
+        CitationRecord: Parsed citation record
+    """
+    try:
+        return parse_or_raise(parser_type, citation)
+    except ParseBudgetExceeded:
+        return budget_fallback(parser_type, citation)
+
+
+# Budget fallbacks depend on load, so they are raised through the cache (which
+# keeps no exceptions) rather than remembered
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_citation_cached(citation):
+    """Record of a citation; raises ParseBudgetExceeded instead of falling back"""
+    return parse_or_raise(determine_parser_type(citation), citation)
+
+
+def parse_citation(citation):
+    """Parse a citation with the matching parser and return its record
+
+    The record is the caller's own copy, so changing it leaves the cache alone.
+    """
+    if not isinstance(citation, str):
+        raise TypeError(f"Citation must be a string, not {type(citation).__name__}")
+    try:
+        return parse_citation_cached(citation).copy()
+    except ParseBudgetExceeded:
+        return budget_fallback(determine_parser_type(citation), citation)
+
+
+# --- Cache generations and invalidation ---
+# Entries are never swept. Keys of parse-derived namespaces embed the parser
+# version and a generation counter per namespace, article keys also embed a
+# generation per page, so bumping a counter (or changing the parser) makes the
+# old entries unreachable in O(1) and they age out by TTL. Response entries are
+# also tagged with their page title, so one page's entries can be dropped
+# without a key scan.
+PARSER_FUNCTIONS = (
+    DISAMBIGUATION_INDICATORS,
+    DISAMBIGUATION_PREFILTER_RE,
+    may_be_disambiguation_page,
+    is_disambiguation_page,
+    extract_disambiguation_options,
+    extract_bibliography_sections,
+    ISBN_PATTERN,
+    CitationListTarget,
+    iter_list_items,
+    citations_from_list_items,
+    html_chunks,
+    extract_book_citations,
+    clean_citation,
+    clean_raw_citation,
+    CitationRecord,
+    BookCitation,
+    ChapterCitation,
+    EditedCitation,
+    type_1_record,
+    type_2_record,
+    type_3_record,
+    type_4_record,
+    type_5_record,
+    determine_parser_type,
+    find_parenthetical,
+    find_by_clause,
+    find_in_editors,
+    find_editor,
+    strip_bracketed,
+    outside_parens,
+    DATE_IN_PARENS_RE,
+    YEAR_IN_PARENS_RE,
+    BY_CLAUSE_RE,
+    EDS_PAREN_RE,
+    IN_EDITORS_RE,
+    ED_PAREN_RE,
+    EDITOR_RE,
+    BRACKET_END_RE,
+    PUBLISHER_AFTER_PERIOD_RE,
+    INITIAL_OR_SURNAME_RE,
+    NEXT_CHAR_RE,
+    fallback_record,
+    parse_or_raise,
+    parse_within_budget,
+)
+
+
+def compute_parser_version():
+    """Short hash of the extraction and parsing code (patterns and phrases)"""
+    digest = hashlib.blake2b(digest_size=4)
+    for obj in PARSER_FUNCTIONS:
+        if isinstance(obj, re.Pattern):
+            digest.update(obj.pattern.encode())
+        elif isinstance(obj, list):
+            digest.update(json.dumps(obj).encode())
+        else:
+            digest.update(inspect.getsource(obj).encode())
+    return digest.hexdigest()
+
+
+PARSER_VERSION = os.environ.get("PARSER_VERSION") or compute_parser_version()
+
+# Workers re-read namespace generations at most this often (seconds)
+GENERATION_CACHE_SECONDS = float(os.environ.get("GENERATION_CACHE_SECONDS", 1))
+
+_generations = {}
+
+
+def get_generation(namespace):
+    """Current generation of a namespace, cached locally for a moment"""
+    now = time.monotonic()
+    cached = _generations.get(namespace)
+    if cached and now - cached[1] < GENERATION_CACHE_SECONDS:
+        return cached[0]
+    try:
+        generation = int(redis_client.get(f"alexandria:gen:{namespace}") or 0)
+    except Exception as e:
+        print(f"Error getting cache generation: {e}")
+        generation = cached[0] if cached else 0
+    _generations[namespace] = (generation, now)
+    return generation
+
+
+def bump_generation(namespace):
+    """Move a namespace to a new generation; returns the new generation"""
+    generation = redis_client.incr(f"alexandria:gen:{namespace}")
+    _generations[namespace] = (generation, time.monotonic())
+    return generation
+
+
+def get_title_generation(title):
+    """Generation of one page's article entries"""
+    try:
+        return int(redis_client.get(get_cache_key(title, "gen:title")) or 0)
+    except Exception as e:
+        print(f"Error getting page generation: {e}")
+    return 0
+
+
+def invalidate_page(page_title):
+    """Drop every cached result derived from a page
+
+    Bumps the page's article generation (for the title and the title it
+    redirects to), deletes the tagged search and page responses and stops the
+    shared store from serving the page.
+
+    Returns:
+        int: Number of response entries deleted
+    """
+    titles = {page_title}
+    target = resolve_redirect(page_title)
+    if target:
+        titles.add(target)
+    deleted = 0
+    for title in titles:
+        redis_client.incr(get_cache_key(title, "gen:title"))
+        tag_key = get_cache_key(title, "tag")
+        keys = redis_cache.smembers(tag_key)
+        if keys:
+            deleted += redis_cache.delete(*keys)
+        redis_cache.delete(tag_key)
+    redis_client.sadd(
+        SHARED_STORE_INVALIDATED_KEY, *(get_cache_key(t, "page") for t in titles)
+    )
+    bump_generation("shared")
+    return deleted
+
+
+_parse_generation = 0
+
+
+def sync_parse_generation():
+    """Drop this worker's parse cache after the parse namespace was bumped"""
+    global _parse_generation
+    generation = get_generation("parse")
+    if generation != _parse_generation:
+        parse_citation_cached.cache_clear()
+        _parse_generation = generation
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+# Longest NDJSON input line (bytes) accepted by the streaming batch parser
+PARSE_STREAM_MAX_LINE = int(os.environ.get("PARSE_STREAM_MAX_LINE", 64 * 1024))
+
+
+def parsed_citation_json(citation):
+    """JSON of one parsed citation, straight from the shared store if there"""
+    parsed = get_shared_entry(shared_parse_key(citation))
+    return parsed.decode() if parsed else parse_citation(citation).to_json()
+
+
+def iter_stream_lines(stream, max_line):
+    """
+    Read lines from a byte stream one at a time.
+
+    Yields:
+        bytes: Each line without its newline, or None for a line longer than
+        max_line (whose rest is skipped without being kept)
+    """
+    while True:
+        line = stream.readline(max_line + 1)
+        if not line:
+            return
+        if len(line) > max_line and not line.endswith(b"\n"):
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(max_line + 1)
+            yield None
+            continue
+        yield line.rstrip(b"\r\n")
+
+
+def stream_parse_batch():
+    """
+    Parse an NDJSON body of citations (one JSON string per line), writing one
+    NDJSON result line per citation as soon as it is parsed.
+
+    Neither the input nor the results are held in memory. Blank lines are
+    skipped; a line that is not a citation gets an error line in its place.
+    A stream may run for as long as the client keeps sending, since each
+    citation has its own parse budget; only a deadline the client asked for
+    with X-Request-Deadline applies, after which a last {"partial":true} line
+    ends the stream. The rate limit is charged one unit per
+    RATE_LIMIT_BATCH_UNIT lines as they are read; once it is used up the
+    stream ends with a rate limit error line.
+    """
+    # The raw request stream reads a line one byte at a time
+    stream = io.BufferedReader(request.stream)
+    if not request.headers.get(REQUEST_DEADLINE_HEADER):
+        set_deadline(None)
+
+    def generate():
+        lines = 0
+        for number, line in enumerate(
+            iter_stream_lines(stream, PARSE_STREAM_MAX_LINE), 1
+        ):
+            if line is not None and not line.strip():
+                continue
+            if time_left() <= 0:
+                yield '{"partial":true}\n'
+                return
+            # batch_cost charged the first unit up front
+            lines += 1
+            if lines > 1 and (lines - 1) % RATE_LIMIT_BATCH_UNIT == 0:
+                if not charge_request_limits():
+                    error = {
+                        "error": "Rate limit exceeded",
+                        "line": number,
+                        "partial": True,
+                        "status": "error",
+                    }
+                    yield json.dumps(error, sort_keys=True) + "\n"
+                    return
+            try:
+                citation = json.loads(line) if line is not None else None
+            except ValueError:
+                citation = None
+            if not isinstance(citation, str):
+                error = {
+                    "error": "Each line must be a JSON string",
+                    "line": number,
+                    "status": "error",
+                }
+                yield json.dumps(error, sort_keys=True) + "\n"
+                continue
+            yield parsed_citation_json(citation) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
 @app.route("/api/parse/batch", methods=["POST"])
-@limiter.limit("150 per minute")
+@limiter.limit("150 per minute", cost=batch_cost("citations"))
 def parse_batch():
-    """Parse multiple citations in a single request"""
+    """Parse multiple citations in a single request
+
+    An application/x-ndjson body is parsed as a stream, see stream_parse_batch.
+    """
+    sync_parse_generation()
+    if request.mimetype == NDJSON_MIMETYPE:
+        return stream_parse_batch()
     data = request.get_json()
     citations = data.get("citations", [])
+    if not isinstance(citations, list):
+        return (
+            jsonify({"error": "Citations must be a list", "status": "error"}),
+            400,
+        )
+    # Citations precomputed in the shared store are copied out as JSON as-is
     results = []
-    for citation in citations:
-        parser_type = determine_parser_type(citation)
-        if parser_type == "type1":
-            parsed = type_1_parser(citation)
-        elif parser_type == "type2":
-            parsed = type_2_parser(citation)
-        elif parser_type == "type3":
-            parsed = type_3_parser(citation)
-        elif parser_type == "type4":
-            parsed = type_4_parser(citation)
-        elif parser_type == "type5":
-            parsed = type_5_parser(citation)
-        else:
-            parsed = type_1_parser(citation)
-        results.append(parsed)
-    return jsonify({"results": results})
+    partial = ""
+    for index, citation in enumerate(citations):
+        if time_left() <= 0:
+            # Results cover a prefix of the batch
+            partial = ',"partial":true'
+            break
+        if not isinstance(citation, str):
+            error = {
+                "error": "Each citation must be a string",
+                "index": index,
+                "status": "error",
+            }
+            results.append(json.dumps(error, sort_keys=True))
+            continue
+        results.append(parsed_citation_json(citation))
+    return Response(
+        '{"results":[' + ",".join(results) + "]" + partial + "}",
+        mimetype="application/json",
+    )
 
 
 @app.route("/")
@@ -1538,6 +3493,8 @@ def clear_cache():
     try:
         # Get all keys with the alexandria prefix
         keys = redis_client.keys("alexandria:*")
+        if negative_cache is not None:
+            negative_cache.clear()
         if keys:
             redis_client.delete(*keys)
             return jsonify(
@@ -1550,6 +3507,40 @@ def clear_cache():
         return jsonify({"error": "Failed to clear cache", "status": "error"}), 500
 
 
+@app.route("/api/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    """Invalidate the cached results of one page or a whole namespace
+
+    Accepts {"page_title": "..."} and/or {"namespace": "search"|"page"|"parse"}
+    (or "article" for the per-revision article entries).
+    """
+    data = request.get_json() or {}
+    page_title = (data.get("page_title") or "").strip()
+    namespace = (data.get("namespace") or "").strip()
+    if not page_title and not namespace:
+        return (
+            jsonify(
+                {"error": "page_title or namespace is required", "status": "error"}
+            ),
+            400,
+        )
+    if namespace and namespace not in VERSIONED_NAMESPACES + ("parse",):
+        return jsonify({"error": "Unknown namespace", "status": "error"}), 400
+
+    try:
+        result = {"status": "success"}
+        if page_title:
+            result["page_title"] = page_title
+            result["deleted"] = invalidate_page(page_title)
+        if namespace:
+            result["namespace"] = namespace
+            result["generation"] = bump_generation(namespace)
+        return jsonify(result)
+    except Exception as e:
+        print(f"Error invalidating cache: {e}")
+        return jsonify({"error": "Failed to invalidate cache", "status": "error"}), 500
+
+
 @app.route("/api/cache/stats", methods=["GET"])
 def cache_stats():
     """Get cache statistics"""
@@ -1559,11 +3550,35 @@ def cache_stats():
         search_keys = redis_client.keys("alexandria:search:*")
         page_keys = redis_client.keys("alexandria:page:*")
 
+        # Base and average effective TTL per namespace and result type, as
+        # handed out by this worker
+        ttl = {}
+        with _ttl_stats_lock:
+            for namespace, policy in CACHE_TTL_POLICIES.items():
+                ttl[namespace] = {}
+                for kind, base in policy.items():
+                    if kind in ("min", "max"):
+                        continue
+                    count, total = ttl_stats.get((namespace, kind), (0, 0))
+                    ttl[namespace][kind] = {
+                        "base": base,
+                        "effective_average": round(total / count) if count else None,
+                        "entries": count,
+                    }
+
         return jsonify(
             {
                 "total_cached_items": len(keys),
                 "search_cached_items": len(search_keys),
                 "page_cached_items": len(page_keys),
+                "parser_version": PARSER_VERSION,
+                "generations": {
+                    namespace: get_generation(namespace)
+                    for namespace in VERSIONED_NAMESPACES + ("parse",)
+                },
+                "ttl": ttl,
+                "prefetch": dict(prefetch_stats, waiting=_prefetch_queue.qsize()),
+                "parse_fallbacks": dict(parse_stats),
                 "status": "success",
             }
         )
@@ -1624,28 +3639,718 @@ def user_agent_info():
     return jsonify(ua_info)
 
 
-@app.route("/api/search", methods=["POST"])
-@limiter.limit("150 per minute")
-def search_books():
-    """Search for books based on a topic using Wikipedia"""
+# --- Offline dump ingestion and the local citation store ---
+# `flask --app app ingest-dump <path>` runs the extraction and parsing pipeline
+# over a saved dump and writes the results to a SQLite file. When
+# LOCAL_STORE_PATH points at that file, page searches read it before going to
+# Wikipedia.
+LOCAL_STORE_PATH = os.environ.get("LOCAL_STORE_PATH")
+
+INGEST_COMMIT_EVERY = 500
+
+_local_store = threading.local()
+
+
+def local_store_key(page_title):
+    """Key used for a page title in the local citation store"""
+    return canonicalize_query(page_title)
+
+
+def open_local_store(path, readonly=True):
+    """Open the local citation store, creating the schema when writable"""
+    if readonly:
+        return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS pages ("
+        "title_key TEXT PRIMARY KEY, "
+        "title TEXT NOT NULL, "
+        "citations TEXT NOT NULL, "
+        "parsed TEXT NOT NULL, "
+        "ingested_at INTEGER NOT NULL, "
+        "parser_version TEXT NOT NULL)"
+    )
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(pages)")]
+    if "parser_version" not in columns:
+        # Store written before entries were tagged; its rows count as stale
+        connection.execute(
+            "ALTER TABLE pages ADD COLUMN parser_version TEXT NOT NULL DEFAULT ''"
+        )
+    return connection
+
+
+def get_local_page(page_title):
+    """Look a page up in the local citation store
+
+    Returns:
+        dict: Page result in the /api/search/page format, or None when the page
+        is not in the store (or no store is configured)
+    """
+    if not LOCAL_STORE_PATH:
+        return None
     try:
-        data = request.get_json()
-        query = data.get("query", "").strip()
-        if not query:
-            return jsonify({"error": "Query is required", "status": "error"}), 400
+        if getattr(_local_store, "path", None) != LOCAL_STORE_PATH:
+            _local_store.connection = open_local_store(LOCAL_STORE_PATH)
+            _local_store.path = LOCAL_STORE_PATH
+        connection = _local_store.connection
+        row = connection.execute(
+            "SELECT title, citations FROM pages "
+            "WHERE title_key = ? AND parser_version = ?",
+            (local_store_key(page_title), PARSER_VERSION),
+        ).fetchone()
+    except Exception as e:
+        print(f"Error reading local citation store: {e}")
+        return None
+    if not row:
+        return None
+    citations = json_loads(row[1])
+    return {
+        "page_title": row[0],
+        "citations": citations,
+        "count": len(citations),
+        "status": "success",
+    }
 
-        cache_key = get_cache_key(query)
-        cached_result = get_cached_result(cache_key)
 
-        if cached_result:
-            print(f"Serving cached result for query: {query}")
-            return jsonify(cached_result)
+def iter_dump_pages(path):
+    """Yield (title, html) pairs from a dump, one page at a time
+
+    Supported inputs:
+        - a directory of saved pages (*.html / *.htm, title taken from the name)
+        - a single saved page (*.html / *.htm)
+        - an HTML dump in NDJSON form (*.ndjson / *.jsonl, optionally .gz/.bz2)
+          with "name" and "article_body.html" fields per line
+
+    MediaWiki XML exports hold wikitext, which the extractor cannot read, and
+    are refused; pages only available that way are fetched rendered through
+    the API when searched for.
+    """
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.endswith((".html", ".htm")):
+                    yield from iter_dump_pages(os.path.join(root, name))
+        return
+
+    name = os.path.basename(path)
+    if name.endswith((".html", ".htm")):
+        title = unquote(os.path.splitext(name)[0]).replace("_", " ")
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield title, f.read()
+        return
+
+    opener = open
+    if name.endswith(".gz"):
+        opener, name = gzip.open, name[:-3]
+    elif name.endswith(".bz2"):
+        opener, name = bz2.open, name[:-4]
+
+    if name.endswith((".ndjson", ".jsonl")):
+        with opener(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                article = json_loads(line)
+                html = (article.get("article_body") or {}).get("html")
+                if article.get("name") and html:
+                    yield article["name"], html
+    elif name.endswith(".xml"):
+        raise ValueError(
+            f"MediaWiki XML exports carry wikitext, not rendered pages: {path}. "
+            "Use an HTML dump or saved pages; other pages are fetched through "
+            "the API."
+        )
+    else:
+        raise ValueError(f"Unsupported dump format: {path}")
+
+
+def process_dump_page(page):
+    """Extract and parse the citations of one dump page (runs in a worker)"""
+    title, html = page
+    citations = extract_book_citations(html)
+    parsed = []
+    for citation in citations:
+        try:
+            parsed.append(parse_citation_cached(citation).to_dict())
+        except ParseBudgetExceeded:
+            # Left to be parsed live rather than storing a cheap parse
+            parsed.append(None)
+    return title, citations, parsed
+
+
+def ingest_dump(path, store_path, workers=None):
+    """Run the extraction pipeline over a dump on all cores into the store
+
+    At most a few pages per worker are in flight at once, so memory stays
+    constant however large the dump is.
+
+    Returns:
+        int: Number of pages written to the store
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 4
+    connection = open_local_store(store_path, readonly=False)
+    written = 0
+
+    def store(results):
+        nonlocal written
+        for future in results:
+            title, citations, parsed = future.result()
+            connection.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    local_store_key(title),
+                    title,
+                    json_dumps(citations).decode(),
+                    json_dumps(parsed).decode(),
+                    int(time.time()),
+                    PARSER_VERSION,
+                ),
+            )
+            written += 1
+            if written % INGEST_COMMIT_EVERY == 0:
+                connection.commit()
+                print(f"[INGEST] {written} pages")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = set()
+            for page in iter_dump_pages(path):
+                in_flight.add(pool.submit(process_dump_page, page))
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    store(done)
+            store(in_flight)
+        connection.commit()
+    finally:
+        connection.close()
+    return written
+
+
+@app.cli.command("ingest-dump")
+@click.argument("path")
+@click.option("--store", "store_path", default=None, help="SQLite output file")
+@click.option("--workers", type=int, default=None, help="Worker processes")
+def ingest_dump_command(path, store_path, workers):
+    """Precompute bibliographies from a local Wikipedia dump"""
+    store_path = store_path or LOCAL_STORE_PATH or "alexandria_store.db"
+    try:
+        written = ingest_dump(path, store_path, workers)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    print(f"[INGEST] Wrote {written} pages to {store_path}")
+
+
+# --- Shared memory-mapped citation store ---
+# `flask --app app build-shared-store` compiles the local citation store into a
+# read-only hash table of ready-to-serve cache entries (page results and parsed
+# citations). Every worker maps the same file, so the OS keeps a single copy in
+# the page cache and a hit never leaves the process. get_cached_entry consults
+# it before Redis.
+SHARED_STORE_PATH = os.environ.get("SHARED_STORE_PATH")
+SHARED_STORE_MAGIC = b"ALXSMAP1"
+# How often (seconds) workers check whether the file was replaced by a rebuild
+SHARED_STORE_RELOAD_INTERVAL = float(os.environ.get("SHARED_STORE_RELOAD_INTERVAL", 30))
+
+# Header: magic, table offset, slot count. Slot: key digest, value offset, length.
+SHARED_STORE_HEADER = struct.Struct("<8sQQ")
+SHARED_STORE_SLOT = struct.Struct("<16sQI")
+
+# Page keys invalidate_page removed from the store; workers re-read the set
+# when the "shared" generation moves
+SHARED_STORE_INVALIDATED_KEY = "alexandria:shared:invalidated"
+
+_shared_store = None
+_shared_store_checked = (None, 0.0)
+_shared_store_lock = threading.Lock()
+_shared_invalidated = (0, frozenset())
+
+
+def shared_store_digest(key):
+    """Hash a cache key to its 16-byte shared store digest"""
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+def shared_parse_key(citation):
+    """Shared store key for the parsed form of a citation"""
+    digest = hashlib.md5(citation.encode()).hexdigest()
+    return f"alexandria:parsed:{PARSER_VERSION}:{get_generation('parse')}:{digest}"
+
+
+def build_shared_store(items, output_path):
+    """Write (key, value bytes) pairs to a shared store file
+
+    Values are appended as they arrive and the open-addressing table (load
+    factor at most 0.5) is written after them. Later duplicates of a key are
+    skipped. The file is built next to output_path and renamed into place, so
+    running workers keep reading the old map until they reopen.
+
+    Returns:
+        int: Number of entries written
+    """
+    tmp_path = f"{output_path}.tmp"
+    locations = {}
+    with open(tmp_path, "wb") as f:
+        f.write(SHARED_STORE_HEADER.pack(SHARED_STORE_MAGIC, 0, 0))
+        for key, value in items:
+            digest = shared_store_digest(key)
+            if digest in locations:
+                continue
+            locations[digest] = (f.tell(), len(value))
+            f.write(value)
+
+        slot_count = 1
+        while slot_count < 2 * len(locations):
+            slot_count *= 2
+        mask = slot_count - 1
+        table = bytearray(SHARED_STORE_SLOT.size * slot_count)
+        used = bytearray(slot_count)
+        for digest, (offset, length) in locations.items():
+            slot = int.from_bytes(digest[:8], "little") & mask
+            while used[slot]:
+                slot = (slot + 1) & mask
+            used[slot] = 1
+            SHARED_STORE_SLOT.pack_into(
+                table, slot * SHARED_STORE_SLOT.size, digest, offset, length
+            )
+
+        table_offset = f.tell()
+        f.write(table)
+        f.seek(0)
+        f.write(SHARED_STORE_HEADER.pack(SHARED_STORE_MAGIC, table_offset, slot_count))
+    os.replace(tmp_path, output_path)
+    return len(locations)
+
+
+def iter_shared_store_entries(store_path):
+    """Yield (key, value) pairs for the shared store from the local store
+
+    Each page gives a packed /api/search/page cache entry (under its title with
+    spaces and with underscores) and the JSON of each parsed citation, encoded
+    exactly as CitationRecord.to_json would.
+    """
+    connection = open_local_store(store_path)
+    try:
+        # Pages ingested with another parser would be served as current
+        rows = connection.execute(
+            "SELECT title, citations, parsed FROM pages WHERE parser_version = ?",
+            (PARSER_VERSION,),
+        )
+        for title, citations, parsed in rows:
+            citations = json_loads(citations)
+            result = {
+                "page_title": title,
+                "citations": citations,
+                "count": len(citations),
+                "status": "success",
+            }
+            _, entry = pack_cache_entry(json_dumps(result))
+            yield get_cache_key(title, "page"), entry
+            yield get_cache_key(title.replace(" ", "_"), "page"), entry
+            for citation, fields in zip(citations, json_loads(parsed)):
+                if fields is None:
+                    continue  # Ran out of its parse budget at ingestion
+                encoded = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+                yield shared_parse_key(citation), encoded.encode()
+    finally:
+        connection.close()
+
+
+class SharedStore:
+    """Read-only view of a shared store file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        self.path = path
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        magic, self._table, slot_count = SHARED_STORE_HEADER.unpack_from(self._mm)
+        if magic != SHARED_STORE_MAGIC:
+            raise ValueError(f"Not a shared store: {path}")
+        self._mask = slot_count - 1
+
+    def close(self):
+        self._mm.close()
+
+    def get(self, key):
+        """Stored bytes for a key, or None"""
+        digest = shared_store_digest(key)
+        slot = int.from_bytes(digest[:8], "little") & self._mask
+        while True:
+            stored, offset, length = SHARED_STORE_SLOT.unpack_from(
+                self._mm, self._table + slot * SHARED_STORE_SLOT.size
+            )
+            if not offset:
+                return None
+            if stored == digest:
+                return self._mm[offset : offset + length]
+            slot = (slot + 1) & self._mask
+
+
+def get_shared_store():
+    """Open (or reopen after a rebuild) the configured shared store"""
+    global _shared_store, _shared_store_checked
+    if not SHARED_STORE_PATH:
+        return None
+    now = time.monotonic()
+    checked_path, checked_at = _shared_store_checked
+    if checked_path == SHARED_STORE_PATH and now - checked_at < (
+        SHARED_STORE_RELOAD_INTERVAL
+    ):
+        return _shared_store
+    with _shared_store_lock:
+        _shared_store_checked = (SHARED_STORE_PATH, now)
+        try:
+            stat = os.stat(SHARED_STORE_PATH)
+            if (
+                _shared_store is None
+                or _shared_store.path != SHARED_STORE_PATH
+                or _shared_store.identity != (stat.st_ino, stat.st_mtime_ns)
+            ):
+                # The old map is left to the garbage collector, since other
+                # threads may still be reading from it
+                _shared_store = SharedStore(SHARED_STORE_PATH)
+        except Exception as e:
+            print(f"Error opening shared citation store: {e}")
+            _shared_store = None
+    return _shared_store
+
+
+def get_shared_entry(key):
+    """Stored bytes for a key from the shared store, or None"""
+    shared_store = get_shared_store()
+    if shared_store is None or key in shared_store_invalidated():
+        return None
+    return shared_store.get(key)
+
+
+def shared_store_invalidated():
+    """Keys the shared store must not answer, per invalidate_page"""
+    global _shared_invalidated
+    generation = get_generation("shared")
+    if generation != _shared_invalidated[0]:
+        try:
+            keys = redis_client.smembers(SHARED_STORE_INVALIDATED_KEY)
+        except Exception as e:
+            print(f"Error getting invalidated shared store keys: {e}")
+            return _shared_invalidated[1]
+        _shared_invalidated = (generation, frozenset(keys))
+    return _shared_invalidated[1]
+
+
+@app.cli.command("build-shared-store")
+@click.option("--store", "store_path", default=None, help="SQLite local store")
+@click.option("--output", default=None, help="Shared store file to write")
+def build_shared_store_command(store_path, output):
+    """Compile the local citation store into the shared memory-mapped store"""
+    store_path = store_path or LOCAL_STORE_PATH or "alexandria_store.db"
+    output = output or SHARED_STORE_PATH or "alexandria_store.map"
+    written = build_shared_store(iter_shared_store_entries(store_path), output)
+    print(f"[SHARED STORE] Wrote {written} entries to {output}")
+
+
+# --- Negative-result filter ---
+# Queries that found no Wikipedia page are remembered in bloom filters, so
+# repeats get their 404 without touching Redis or Wikipedia. Each filter covers
+# one NEGATIVE_CACHE_ROTATE-second generation and lookups check the current and
+# previous one, so a query is forgotten after one to two generations and newly
+# created pages become findable. Workers add to shared Redis bitmaps and merge
+# them into their own filters every NEGATIVE_CACHE_SYNC seconds.
+NEGATIVE_CACHE_CAPACITY = int(os.environ.get("NEGATIVE_CACHE_CAPACITY", 200000))
+NEGATIVE_CACHE_ERROR_RATE = float(os.environ.get("NEGATIVE_CACHE_ERROR_RATE", 0.0001))
+NEGATIVE_CACHE_ROTATE = int(os.environ.get("NEGATIVE_CACHE_ROTATE", 6 * 3600))
+NEGATIVE_CACHE_SYNC = int(os.environ.get("NEGATIVE_CACHE_SYNC", 60))
+
+# Set bits per byte value (int.bit_count needs Python 3.10)
+POPCOUNT = bytes(bin(i).count("1") for i in range(256))
+
+
+class BloomFilter:
+    """Fixed-size bloom filter using Redis bitmap bit order (MSB first)"""
+
+    def __init__(self, capacity, error_rate):
+        size = max(8, int(-capacity * log(error_rate) / log(2) ** 2))
+        self.size = size + (-size % 8)
+        self.hashes = max(1, round(self.size / capacity * log(2)))
+        self.capacity = capacity
+        self.bits = bytearray(self.size // 8)
+        # Set once the filter holds about `capacity` items; adding more would
+        # push the false positive rate past error_rate
+        self.full = False
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def set_positions(self, positions):
+        for position in positions:
+            self.bits[position >> 3] |= 0x80 >> (position & 7)
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(
+            bits[position >> 3] & (0x80 >> (position & 7))
+            for position in self.positions(item)
+        )
+
+    def merge(self, bitmap):
+        """OR a Redis bitmap into the filter (Redis trims trailing zero bytes)"""
+        if len(bitmap) > len(self.bits):
+            return  # Written by a worker configured with another size
+        merged = int.from_bytes(self.bits, "big") | int.from_bytes(
+            bitmap.ljust(len(self.bits), b"\0"), "big"
+        )
+        self.bits = bytearray(merged.to_bytes(len(self.bits), "big"))
+        self.full = self.approximate_count() >= self.capacity
+
+    def approximate_count(self):
+        """Estimated number of items added, from the fraction of bits set"""
+        set_bits = sum(map(POPCOUNT.__getitem__, self.bits))
+        if set_bits >= self.size:
+            return inf
+        return -self.size / self.hashes * log(1 - set_bits / self.size)
+
+
+class NegativeCache:
+    """Rotating, Redis-synced bloom filters of queries with no results"""
+
+    def __init__(self, capacity, error_rate, rotate, sync_interval):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotate = rotate
+        self.sync_interval = sync_interval
+        self._filters = {}
+        self._synced = 0.0
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return int(time.time() // self.rotate)
+
+    def redis_key(self, generation):
+        return f"alexandria:negative:{generation}"
+
+    def filters(self):
+        """Filters of the current and previous generation, newest first"""
+        current = self.generation()
+        with self._lock:
+            for generation in list(self._filters):
+                if generation < current - 1:
+                    del self._filters[generation]
+            return [
+                self._filters.setdefault(
+                    generation, BloomFilter(self.capacity, self.error_rate)
+                )
+                for generation in (current, current - 1)
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._filters = {}
+
+    def sync(self, force=False):
+        """Merge the shared bitmaps in, at most once per sync interval"""
+        now = time.monotonic()
+        if not force and now - self._synced < self.sync_interval:
+            return
+        self._synced = now
+        current = self.generation()
+        try:
+            bitmaps = redis_cache.mget(
+                [self.redis_key(current), self.redis_key(current - 1)]
+            )
+            for bloom, bitmap in zip(self.filters(), bitmaps):
+                if bitmap:
+                    bloom.merge(bitmap)
+        except Exception as e:
+            print(f"Error syncing negative cache: {e}")
+
+    def __contains__(self, query):
+        self.sync()
+        key = canonicalize_query(query)
+        return any(key in bloom for bloom in self.filters())
+
+    def add(self, query):
+        """Remember that a query found nothing, locally and in Redis"""
+        bloom = self.filters()[0]
+        if bloom.full:
+            return
+        positions = bloom.positions(canonicalize_query(query))
+        bloom.set_positions(positions)
+        redis_key = self.redis_key(self.generation())
+        try:
+            pipe = redis_cache.pipeline()
+            for position in positions:
+                pipe.setbit(redis_key, position, 1)
+            pipe.expire(redis_key, 2 * self.rotate + self.sync_interval)
+            pipe.execute()
+        except Exception as e:
+            print(f"Error updating negative cache: {e}")
+
+
+negative_cache = (
+    NegativeCache(
+        NEGATIVE_CACHE_CAPACITY,
+        NEGATIVE_CACHE_ERROR_RATE,
+        NEGATIVE_CACHE_ROTATE,
+        NEGATIVE_CACHE_SYNC,
+    )
+    if NEGATIVE_CACHE_CAPACITY
+    else None
+)
+
+
+def is_known_empty(query):
+    """Whether a query recently found no Wikipedia page (no I/O on a hit)"""
+    return negative_cache is not None and query in negative_cache
+
+
+def remember_empty(query):
+    if negative_cache is not None:
+        negative_cache.add(query)
+
+
+def not_found_result(query):
+    return {"error": f'No Wikipedia page found for "{query}"', "status": "error"}
+
 
+# --- Query titles and the article cache ---
+# The expensive per-article work (fetch, extract, parse) is cached under the
+# canonical title and revision it was done for, so every alias, redirect and
+# search query that lands on the same article reuses it, and an edit simply
+# leads to a new key. Search queries remember the title they resolved to.
+QUERY_TITLE_CACHE_TTL = int(os.environ.get("QUERY_TITLE_CACHE_TTL", 6 * 3600))
+# Entries are pinned to a revision, so they can live long
+ARTICLE_CACHE_TTL = int(os.environ.get("ARTICLE_CACHE_TTL", 7 * 24 * 3600))
+
+
+def get_article_key(title, revid):
+    return f"{get_cache_key(title, 'article')}:{revid}:{get_title_generation(title)}"
+
+
+def get_query_title(query):
+    """Title a search query resolved to before, or None"""
+    try:
+        return redis_client.get(get_cache_key(query, "query"))
+    except Exception as e:
+        print(f"Error getting cached query title: {e}")
+    return None
+
+
+def set_query_title(query, title):
+    try:
+        redis_client.setex(get_cache_key(query, "query"), QUERY_TITLE_CACHE_TTL, title)
+    except Exception as e:
+        print(f"Error caching query title: {e}")
+
+
+def get_article(title, revid=None, last_edited=None, disambiguation=None):
+    """Citations or disambiguation options of an article, cached by revision
+
+    disambiguation is passed when already known, e.g. from the search call.
+
+    Returns:
+        dict: {"page_title", "disambiguation", and "options" or "citations",
+        plus "last_edited" when known}, or None if the page could not be
+        fetched
+    """
+    resolved = resolve_title(title)
+    if resolved:
+        title, latest = resolved
+        revid = revid or latest
+
+    article_key = get_article_key(title, revid) if revid else None
+    if article_key:
+        try:
+            cached = redis_cache.get(article_key)
+            if cached:
+                return json_loads(cached)
+        except Exception as e:
+            print(f"Error getting cached article: {e}")
+
+    if disambiguation:
+        # Options need the full page and no citations are looked for
+        article = extract_article(title, get_wikipedia_content(title), True)
+    elif WIKIPEDIA_CONTENT_SOURCE == "parse":
+        html_content, detected = get_citation_source(title, revid)
+        if detected is None:
+            detected = disambiguation
+        article = extract_article(title, html_content, detected)
+    else:
+        article = stream_article(title)
+    if article is None:
+        return None
+    if last_edited and not article.get("last_edited"):
+        article["last_edited"] = last_edited
+
+    # A partial article is only good for the short-lived response entry
+    if article_key and not article.get("partial"):
+        try:
+            redis_cache.setex(article_key, ARTICLE_CACHE_TTL, json_dumps(article))
+        except Exception as e:
+            print(f"Error caching article: {e}")
+    return article
+
+
+def extract_article(title, html_content, disambiguation=None):
+    """Build an article record from fetched HTML, or None if there is none"""
+    if html_content is None:
+        return None
+    if disambiguation is None:
+        disambiguation = is_disambiguation_page(html_content)
+    article = {"page_title": title, "disambiguation": disambiguation}
+    if disambiguation:
+        article["options"] = extract_disambiguation_options(html_content)
+    else:
+        target = CitationListTarget()
+        article["citations"] = extract_book_citations(html_content, target)
+        if target.partial:
+            article["partial"] = True
+    last_edited = extract_last_edited(html_content)
+    if last_edited:
+        article["last_edited"] = last_edited
+    return article
+
+
+def stream_article(title):
+    """Build an article record, extracting citations while the page downloads"""
+    page = stream_page_citations(title)
+    if page is None:
+        return None
+    if page["disambiguation"]:
+        # Options come from links all over the page, so read it in full
+        return extract_article(title, get_wikipedia_content(title), True)
+    article = {
+        "page_title": title,
+        "disambiguation": False,
+        "citations": page["citations"],
+    }
+    if page["last_edited"]:
+        article["last_edited"] = page["last_edited"]
+    if page["partial"]:
+        article["partial"] = True
+    return article
+
+
+def build_search_result(query):
+    """Run the Wikipedia search pipeline for a query
+
+    Returns:
+        tuple: (result dict, HTTP status code)
+    """
+    best_match = get_query_title(query)
+    revid = last_edited = disambiguation = None
+    if not best_match:
         search_results = search_wikipedia(query)
 
-        # If no search results, check for "did you mean" suggestions
+        # If no search results, check for "did you mean" suggestions, using the
+        # local title index before asking Wikipedia
         if not search_results:
-            suggestions = search_wikipedia_with_suggestions(query)
+            suggestions = suggest_titles(query) or search_wikipedia_with_suggestions(
+                query
+            )
             if suggestions:
                 # Convert suggestions to the same format as disambiguation options
                 suggestion_options = []
@@ -1658,167 +4363,1173 @@ def search_books():
                         }
                     )
 
-                set_cached_result(
-                    cache_key,
-                    {
-                        "query": query,
-                        "page_title": None,
-                        "suggestions": True,
-                        "options": suggestion_options,
-                        "status": "suggestions",
-                    },
-                )
-
-                return jsonify(
-                    {
-                        "query": query,
-                        "page_title": None,
-                        "suggestions": True,
-                        "options": suggestion_options,
-                        "status": "suggestions",
-                    }
-                )
+                result = {
+                    "query": query,
+                    "page_title": None,
+                    "suggestions": True,
+                    "options": suggestion_options,
+                    "status": "suggestions",
+                }
+                return result, 200
+            elif search_results is None:
+                # Not a real "no match", so it must not reach the negative cache
+                result = {
+                    "error": f'Could not search Wikipedia for "{query}"',
+                    "status": "error",
+                }
+                return result, 502
             else:
-                set_cached_result(
-                    cache_key,
-                    {
-                        "error": f'No Wikipedia page found for "{query}"',
-                        "status": "error",
-                    },
-                )
-                return (
-                    jsonify(
-                        {
-                            "error": f'No Wikipedia page found for "{query}"',
-                            "status": "error",
-                        }
-                    ),
-                    404,
-                )
+                return not_found_result(query), 404
 
         # Get the best match (first result)
         best_match = search_results[0]["title"]
-        html_content = get_wikipedia_content(best_match)
+        revid = search_results[0].get("revid")
+        last_edited = search_results[0].get("timestamp")
+        disambiguation = search_results[0].get("disambiguation")
+        set_query_title(query, best_match)
 
-        if not html_content:
-            set_cached_result(
-                cache_key,
-                {
-                    "error": f'Could not fetch content for "{best_match}"',
-                    "status": "error",
-                },
-            )
-            return (
-                jsonify(
-                    {
-                        "error": f'Could not fetch content for "{best_match}"',
-                        "status": "error",
-                    }
-                ),
-                500,
-            )
+    article = get_article(
+        best_match, revid, last_edited=last_edited, disambiguation=disambiguation
+    )
+    if article is None:
+        result = {
+            "error": f'Could not fetch content for "{best_match}"',
+            "status": "error",
+        }
+        return result, 500
 
-        # Check if this is a disambiguation page
-        if is_disambiguation_page(html_content):
-            disambiguation_options = extract_disambiguation_options(html_content)
-            set_cached_result(
-                cache_key,
-                {
-                    "query": query,
-                    "page_title": best_match,
-                    "disambiguation": True,
-                    "options": disambiguation_options,
-                    "status": "disambiguation",
-                },
-            )
-            return jsonify(
-                {
-                    "query": query,
-                    "page_title": best_match,
-                    "disambiguation": True,
-                    "options": disambiguation_options,
-                    "status": "disambiguation",
-                }
-            )
+    if article["disambiguation"]:
+        result = {
+            "query": query,
+            "page_title": article["page_title"],
+            "disambiguation": True,
+            "options": article["options"],
+            "status": "disambiguation",
+        }
+    else:
+        # Regular page - citations
+        result = {
+            "query": query,
+            "page_title": article["page_title"],
+            "citations": article["citations"],
+            "count": len(article["citations"]),
+            "status": "success",
+        }
+    if article.get("last_edited"):
+        result["last_edited"] = article["last_edited"]
+    if article.get("partial"):
+        result["partial"] = True
+    return result, 200
 
-        # Regular page - extract citations
-        citations = extract_book_citations(html_content)
-        set_cached_result(
-            cache_key,
-            {
-                "query": query,
-                "page_title": best_match,
-                "citations": citations,
-                "count": len(citations),
-                "status": "success",
-            },
-        )
-        return jsonify(
-            {
-                "query": query,
-                "page_title": best_match,
-                "citations": citations,
-                "count": len(citations),
-                "status": "success",
-            }
-        )
+
+def build_page_result(page_title, revid=None):
+    """Extract book citations from a specific Wikipedia page
+
+    Returns:
+        tuple: (result dict, HTTP status code)
+    """
+    local_result = get_local_page(page_title)
+    if local_result:
+        return local_result, 200
+
+    article = get_article(page_title, revid)
+    if article is None:
+        result = {
+            "error": f'Could not fetch content for "{page_title}"',
+            "status": "error",
+        }
+        return result, 500
+
+    # Disambiguation pages have no citations of their own
+    citations = article.get("citations", [])
+    result = {
+        "page_title": article["page_title"],
+        "citations": citations,
+        "count": len(citations),
+        "status": "success",
+    }
+    if article.get("last_edited"):
+        result["last_edited"] = article["last_edited"]
+    if article.get("partial"):
+        result["partial"] = True
+    return result, 200
+
+
+@app.route("/api/search", methods=["GET", "POST"])
+@limiter.limit("150 per minute", cost=search_cost, deduct_when=deduct_always)
+def search_books():
+    """Search for books based on a topic using Wikipedia"""
+    try:
+        query = get_request_field("query")
+        if not query:
+            return jsonify({"error": "Query is required", "status": "error"}), 400
+
+        record_usage("search", query)
+        if is_known_empty(query):
+            payload = json_dumps(not_found_result(query))
+            return cached_response((make_etag(payload), payload, 404))
+
+        cache_key = get_cache_key(query)
+        cached_entry = get_cached_entry(cache_key)
+
+        if cached_entry:
+            print(f"Serving cached result for query: {query}")
+            return cached_response(cached_entry)
+
+        # A query naming a page or redirect shares the entry of its target title
+        aliases = ()
+        target = resolve_redirect(query)
+        if target and get_cache_key(target) != cache_key:
+            aliases, cache_key = (cache_key,), get_cache_key(target)
+            cached_entry = get_cached_entry(cache_key)
+            if cached_entry:
+                print(f"Serving cached result for query: {query} -> {target}")
+                alias_cached_entry(aliases[0], cache_key, cached_entry)
+                return cached_response(cached_entry)
+        if deadline_shortened():
+            cached_entry = get_cached_entry(partial_cache_key(cache_key))
+            if cached_entry:
+                return cached_response(cached_entry)
+
+        result, status = build_search_result(query)
+        if aliases and get_cache_key(result.get("page_title") or "") != cache_key:
+            # The search settled on another page, so the result is this query's
+            cache_key, aliases = aliases[0], ()
+        if status == 404 and not deadline_cut_short(status):
+            remember_empty(query)
+        elif result.get("status") == "disambiguation":
+            prefetch_options(result["options"])
+        return cached_response(cache_built_result(cache_key, result, status, aliases))
     except Exception as e:
         print(f"Error in search_books: {e}")
         return jsonify({"error": "Internal server error", "status": "error"}), 500
 
 
-@app.route("/api/search/page", methods=["POST"])
-@limiter.limit("150 per minute")
+@app.route("/api/search/page", methods=["GET", "POST"])
+@limiter.limit("150 per minute", cost=search_cost, deduct_when=deduct_always)
 def search_specific_page():
     """Search for books on a specific Wikipedia page"""
     try:
-        data = request.get_json()
-        page_title = data.get("page_title", "").strip()
+        page_title = get_request_field("page_title")
         if not page_title:
             return jsonify({"error": "Page title is required", "status": "error"}), 400
 
         # Check cache first
+        record_usage("page", page_title)
         cache_key = get_cache_key(page_title, "page")
-        cached_result = get_cached_result(cache_key)
+        cached_entry = get_cached_entry(cache_key)
 
-        if cached_result:
+        if cached_entry:
             print(f"Serving cached result for page: {page_title}")
-            return jsonify(cached_result)
+            return cached_response(cached_entry)
+
+        # Redirects and title variants share the entry of their target page
+        aliases = ()
+        target = resolve_redirect(page_title)
+        if target and get_cache_key(target, "page") != cache_key:
+            aliases, cache_key = (cache_key,), get_cache_key(target, "page")
+            cached_entry = get_cached_entry(cache_key)
+            if cached_entry:
+                print(f"Serving cached result for page: {page_title} -> {target}")
+                alias_cached_entry(aliases[0], cache_key, cached_entry)
+                return cached_response(cached_entry)
+            page_title = target
+        if deadline_shortened():
+            cached_entry = get_cached_entry(partial_cache_key(cache_key))
+            if cached_entry:
+                return cached_response(cached_entry)
+
+        # Built here now, so a queued prefetch of it would be wasted
+        cancel_prefetch(cache_key)
+        for alias in aliases:
+            cancel_prefetch(alias)
+
+        # Cache the result and answer with the same bytes
+        result, status = build_page_result(page_title)
+        return cached_response(cache_built_result(cache_key, result, status, aliases))
+    except Exception as e:
+        print(f"Error in search_specific_page: {e}")
+        return jsonify({"error": "Internal server error", "status": "error"}), 500
+
 
-        html_content = get_wikipedia_content(page_title)
-        if not html_content:
-            set_cached_result(
-                cache_key,
+# --- Bulk search ---
+BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", 500))
+BULK_MAX_CONCURRENCY = int(os.environ.get("BULK_MAX_CONCURRENCY", 4))
+# Minimum spacing between Wikipedia requests made on behalf of bulk jobs
+BULK_MIN_REQUEST_INTERVAL = float(os.environ.get("BULK_MIN_REQUEST_INTERVAL", 0.2))
+
+bulk_pacer = RequestPacer(BULK_MIN_REQUEST_INTERVAL, OUTBOUND_BACKGROUND)
+
+BULK_BUILDERS = {
+    "search": build_search_result,
+    "page": build_page_result,
+}
+
+
+def bulk_line(kind, topic, cached, status, payload):
+    """Encode one NDJSON line of a bulk response around an existing payload"""
+    return (
+        b'{"cached":'
+        + (b"true" if cached else b"false")
+        + b',"result":'
+        + payload
+        + b',"status_code":'
+        + str(status).encode()
+        + b',"topic":'
+        + json_dumps(topic)
+        + b',"type":'
+        + json_dumps(kind)
+        + b"}\n"
+    )
+
+
+def run_bulk_item(
+    kind, topic, cache_key, revid=None, deadline=None, attempts=1, shortened=False
+):
+    """Fetch, cache and encode one bulk item that missed the cache
+
+    Server errors are retried up to attempts times in all, with exponential
+    backoff starting at JOB_RETRY_DELAY, and are not cached. shortened tells
+    whether the client asked for less than the endpoint's budget (see
+    cache_built_result).
+    """
+    if deadline is not None and time.monotonic() >= deadline:
+        # Not started in time; reported, but not cached
+        result = {"error": "Request deadline exceeded", "status": "error"}
+        return bulk_line(kind, topic, False, 504, json_dumps(result))
+    _outbound.pacer = bulk_pacer
+    set_deadline(deadline, shortened)
+    try:
+        for attempt in range(attempts):
+            if attempt:
+                time.sleep(JOB_RETRY_DELAY * 2 ** (attempt - 1))
+            try:
+                if revid:
+                    result, status = BULK_BUILDERS[kind](topic, revid)
+                else:
+                    result, status = BULK_BUILDERS[kind](topic)
+            except Exception as e:
+                print(f"Error in bulk {kind} for {topic}: {e}")
+                result = {"error": "Internal server error", "status": "error"}
+                status = 500
+            if status < 500:
+                break
+        if kind == "search" and status == 404 and not deadline_cut_short(status):
+            remember_empty(topic)
+        if status >= 500:
+            payload = json_dumps(result)
+        else:
+            _, payload, _ = cache_built_result(cache_key, result, status)
+    finally:
+        _outbound.pacer = None
+        set_deadline(None)
+    return bulk_line(kind, topic, False, status, payload)
+
+
+@app.route("/api/search/bulk", methods=["POST"])
+@limiter.limit("150 per minute", cost=bulk_cost)
+def search_bulk():
+    """Search many topics at once, streaming one NDJSON line per topic"""
+    data = request.get_json()
+    fields = (("search", "queries"), ("page", "page_titles"))
+    if not isinstance(data, dict) or any(
+        not isinstance(data.get(field, []), list) for _, field in fields
+    ):
+        return (
+            jsonify(
                 {
-                    "error": f'Could not fetch content for "{page_title}"',
+                    "error": "Queries and page titles must be lists",
                     "status": "error",
-                },
+                }
+            ),
+            400,
+        )
+    items = []
+    seen = set()
+    for kind, field in fields:
+        for topic in data.get(field, []):
+            topic = topic.strip() if isinstance(topic, str) else ""
+            # Variants of one topic share a cache key, so run it once
+            if topic and (kind, canonicalize_query(topic)) not in seen:
+                seen.add((kind, canonicalize_query(topic)))
+                items.append((kind, topic))
+                record_usage(kind, topic)
+
+    if not items:
+        return (
+            jsonify(
+                {"error": "Queries or page titles are required", "status": "error"}
+            ),
+            400,
+        )
+    if len(items) > BULK_MAX_ITEMS:
+        return (
+            jsonify(
+                {
+                    "error": f"At most {BULK_MAX_ITEMS} topics per request",
+                    "status": "error",
+                }
+            ),
+            400,
+        )
+
+    cache_keys = [get_cache_key(topic, kind) for kind, topic in items]
+    cached_entries = get_cached_entries(cache_keys)
+    # The body is generated after the request context is gone
+    deadline = get_deadline()
+    shortened = deadline_shortened()
+
+    def generate():
+        misses = []
+        for (kind, topic), cache_key, cached_entry in zip(
+            items, cache_keys, cached_entries
+        ):
+            if cached_entry:
+                _, payload, status = cached_entry
+                yield bulk_line(kind, topic, True, status, payload)
+            elif kind == "search" and is_known_empty(topic):
+                payload = json_dumps(not_found_result(topic))
+                yield bulk_line(kind, topic, True, 404, payload)
+            else:
+                misses.append((kind, topic, cache_key))
+
+        if not misses:
+            return
+
+        # The parse API source can pin every page miss to a revision up front,
+        # looking up 50 titles per query instead of resolving each page alone
+        revids = {}
+        if WIKIPEDIA_CONTENT_SOURCE == "parse":
+            page_titles = [topic for kind, topic, _ in misses if kind == "page"]
+            if page_titles:
+                _outbound.pacer = bulk_pacer
+                set_deadline(deadline)
+                try:
+                    revids = get_revision_ids(page_titles)
+                finally:
+                    _outbound.pacer = None
+                    set_deadline(None)
+
+        pool = ThreadPoolExecutor(max_workers=BULK_MAX_CONCURRENCY)
+        try:
+            futures = [
+                pool.submit(
+                    run_bulk_item,
+                    kind,
+                    topic,
+                    cache_key,
+                    revids.get(topic) if kind == "page" else None,
+                    deadline,
+                    shortened=shortened,
+                )
+                for kind, topic, cache_key in misses
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # A client that went away leaves the queued misses unfetched
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
+
+
+# --- Background jobs ---
+# Work too slow for one HTTP request (huge articles, long reading lists, large
+# citation batches) is submitted as a job: POST /api/jobs answers with a job id
+# at once, and the job is queued in Redis. Job threads take jobs from the queue;
+# every app process starts JOB_WORKERS of them on its first submit, and
+# `flask --app app job-worker` runs a dedicated worker process. Each item is
+# retried on server errors and gets one NDJSON line in the job's results, in
+# the format of /api/search/bulk (page lines also carry the parsed citations)
+# or of /api/parse/batch; an item that raises gets an error line instead. State
+# and results expire JOB_TTL seconds after the last update. Without Redis, jobs
+# are refused with a 503.
+#
+# A job thread moves the job it takes into its own processing list (BLMOVE)
+# and keeps a heartbeat key alive while its process runs. Every process reaps
+# the processing lists of workers whose heartbeat expired, putting their jobs
+# back on the queue; a job picks up after the lines already written.
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))  # per process, 0 = none
+JOB_MAX_ITEMS = int(os.environ.get("JOB_MAX_ITEMS", 10000))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+JOB_RETRY_DELAY = float(os.environ.get("JOB_RETRY_DELAY", 2.0))  # seconds
+JOB_TTL = int(os.environ.get("JOB_TTL", 24 * 3600))
+# Result lines returned by one GET /api/jobs/<id> at most (?limit=)
+JOB_PAGE_SIZE = int(os.environ.get("JOB_PAGE_SIZE", 500))
+# How often a results stream checks for new lines (seconds)
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 0.5))
+# A results stream ends after this long without a new line; clients resume it
+# with ?offset=
+JOB_STREAM_IDLE_TIMEOUT = float(os.environ.get("JOB_STREAM_IDLE_TIMEOUT", 60))
+# Jobs of a worker not heard from for this long are put back on the queue
+JOB_HEARTBEAT_TTL = int(os.environ.get("JOB_HEARTBEAT_TTL", 60))  # seconds
+JOB_QUEUE_KEY = "alexandria:jobs:queue"
+JOB_WORKERS_KEY = "alexandria:jobs:workers"
+JOB_FINISHED = ("done", "failed")
+
+_job_threads = []
+_job_worker_ids = set()
+_job_heartbeat_thread = None
+_job_lock = threading.Lock()
+
+
+def job_key(job_id):
+    return f"alexandria:job:{job_id}"
+
+
+def job_results_key(job_id):
+    return f"alexandria:job:{job_id}:results"
+
+
+def job_processing_key(worker_id):
+    return f"alexandria:jobs:processing:{worker_id}"
+
+
+def job_heartbeat_key(worker_id):
+    return f"alexandria:jobs:heartbeat:{worker_id}"
+
+
+def job_items(data):
+    """The (kind, item) pairs of a job request, in order"""
+    if not isinstance(data, dict):
+        return []
+    items = []
+    seen = set()
+    fields = (
+        ("page", "page_title"),
+        ("page", "page_titles"),
+        ("search", "queries"),
+        ("parse", "citations"),
+    )
+    for kind, field in fields:
+        values = data.get(field, [])
+        for value in values if isinstance(values, list) else [values]:
+            value = value.strip() if isinstance(value, str) else ""
+            # Citations are parsed as given, topics only once
+            if value and (kind == "parse" or (kind, value) not in seen):
+                seen.add((kind, value))
+                items.append((kind, value))
+    return items
+
+
+def job_cost():
+    """Limiter cost of a job: one unit per RATE_LIMIT_BATCH_UNIT items"""
+    items = job_items(request.get_json(silent=True))
+    return max(1, ceil(len(items) / RATE_LIMIT_BATCH_UNIT))
+
+
+def run_job_item(kind, item):
+    """Run one job item and encode its result line"""
+    if kind == "parse":
+        return (parsed_citation_json(item) + "\n").encode()
+    cache_key = get_cache_key(item, kind)
+    cached_entry = get_cached_entries([cache_key])[0]
+    # A cached server error (e.g. left by /api/search) is run again instead
+    if cached_entry and cached_entry[2] < 500:
+        _, payload, status = cached_entry
+        line = bulk_line(kind, item, True, status, payload)
+    elif kind == "search" and is_known_empty(item):
+        line = bulk_line(kind, item, True, 404, json_dumps(not_found_result(item)))
+    else:
+        line = run_bulk_item(kind, item, cache_key, attempts=JOB_MAX_ATTEMPTS)
+    if kind != "page":
+        return line
+    entry = json.loads(line)
+    if entry["status_code"] != 200:
+        return line
+    citations = entry["result"].get("citations", [])
+    entry["parsed"] = [parse_citation(citation).to_dict() for citation in citations]
+    return json_dumps(entry) + b"\n"
+
+
+def job_error_line(kind, item):
+    """Result line of an item that raised"""
+    result = {"error": "Internal server error", "status": "error"}
+    if kind == "parse":
+        return json_dumps(dict(result, citation=item)) + b"\n"
+    return bulk_line(kind, item, False, 500, json_dumps(result))
+
+
+def push_job_line(job_id, line):
+    """Append a result line and count it done, retrying Redis errors"""
+    for attempt in range(JOB_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(JOB_RETRY_DELAY * 2 ** (attempt - 1))
+        try:
+            # One transaction, so a job picks up after exactly the lines written
+            pipe = redis_client.pipeline()
+            pipe.rpush(job_results_key(job_id), line)
+            pipe.hincrby(job_key(job_id), "done", 1)
+            pipe.expire(job_key(job_id), JOB_TTL)
+            pipe.expire(job_results_key(job_id), JOB_TTL)
+            pipe.execute()
+            return
+        except redis.RedisError as e:
+            print(f"Error writing result of job {job_id}: {e}")
+            error = e
+    raise error
+
+
+def update_job(job_id, **fields):
+    """Set fields of a job and renew the TTL of its state and results"""
+    pipe = redis_client.pipeline()
+    pipe.hset(job_key(job_id), mapping=dict(fields, updated=time.time()))
+    pipe.expire(job_key(job_id), JOB_TTL)
+    pipe.expire(job_results_key(job_id), JOB_TTL)
+    pipe.execute()
+
+
+def run_job(job_id):
+    """Run a queued job, appending one result line per item
+
+    A job requeued from a lost worker is "running" and resumes after the
+    items it has lines for. Redis errors that outlast the retries of
+    push_job_line are raised, leaving the job to be run again.
+    """
+    job = redis_client.hgetall(job_key(job_id))
+    if job.get("status") not in ("queued", "running"):
+        # Expired, or already finished
+        return
+    update_job(job_id, status="running")
+    try:
+        items = json.loads(job["items"])
+    except (KeyError, ValueError) as e:
+        print(f"Error in job {job_id}: {e}")
+        update_job(job_id, status="failed", error=str(e))
+        return
+    for kind, item in items[int(job.get("done", 0)) :]:
+        try:
+            line = run_job_item(kind, item)
+        except Exception as e:
+            print(f"Error in job {job_id} for {kind} {item}: {e}")
+            line = job_error_line(kind, item)
+        push_job_line(job_id, line)
+    update_job(job_id, status="done")
+
+
+def beat_job_workers():
+    """Keep this process's worker heartbeats alive and reap lost workers"""
+    while True:
+        try:
+            pipe = redis_client.pipeline()
+            for worker_id in list(_job_worker_ids):
+                pipe.setex(job_heartbeat_key(worker_id), JOB_HEARTBEAT_TTL, 1)
+            pipe.execute()
+            reap_job_workers()
+        except Exception as e:
+            print(f"Error in job heartbeat: {e}")
+        time.sleep(JOB_HEARTBEAT_TTL / 3)
+
+
+def reap_job_workers():
+    """Put the jobs of workers whose heartbeat expired back on the queue"""
+    for worker_id in redis_client.smembers(JOB_WORKERS_KEY):
+        if redis_client.exists(job_heartbeat_key(worker_id)):
+            continue
+        processing = job_processing_key(worker_id)
+        # To the end jobs are taken from, so they run next
+        while redis_client.lmove(processing, JOB_QUEUE_KEY, "RIGHT", "RIGHT"):
+            pass
+        redis_client.srem(JOB_WORKERS_KEY, worker_id)
+
+
+def register_job_worker(worker_id):
+    """Announce a worker and start this process's heartbeat thread once"""
+    global _job_heartbeat_thread
+    redis_client.setex(job_heartbeat_key(worker_id), JOB_HEARTBEAT_TTL, 1)
+    redis_client.sadd(JOB_WORKERS_KEY, worker_id)
+    with _job_lock:
+        _job_worker_ids.add(worker_id)
+        if _job_heartbeat_thread is None:
+            _job_heartbeat_thread = threading.Thread(
+                target=beat_job_workers, name="job-heartbeat", daemon=True
             )
-            return (
-                jsonify(
-                    {
-                        "error": f'Could not fetch content for "{page_title}"',
-                        "status": "error",
-                    }
-                ),
-                500,
+            _job_heartbeat_thread.start()
+
+
+def job_worker():
+    """Take jobs from the Redis queue and run them, forever"""
+    worker_id = uuid.uuid4().hex
+    processing = job_processing_key(worker_id)
+    registered = False
+    while True:
+        try:
+            if not registered:
+                register_job_worker(worker_id)
+                registered = True
+            # A job left by a Redis outage comes before new ones
+            job_id = redis_client.lindex(processing, -1) or redis_client.blmove(
+                JOB_QUEUE_KEY, processing, 5, "RIGHT", "LEFT"
             )
+            if job_id:
+                run_job(job_id)
+                redis_client.lrem(processing, 1, job_id)
+        except Exception as e:
+            print(f"Error in job worker: {e}")
+            time.sleep(5)
+
+
+def start_job_workers():
+    """Start the job threads of this worker once"""
+    if _job_threads:
+        return
+    with _job_lock:
+        while len(_job_threads) < JOB_WORKERS:
+            thread = threading.Thread(
+                target=job_worker, name=f"job-{len(_job_threads)}", daemon=True
+            )
+            thread.start()
+            _job_threads.append(thread)
+
+
+def job_status(job_id, job):
+    """Public view of a job's state"""
+    status = {
+        "job_id": job_id,
+        "state": job["status"],
+        "progress": {"done": int(job.get("done", 0)), "total": int(job["total"])},
+        "created": float(job["created"]),
+        "updated": float(job["updated"]),
+        "status": "success",
+    }
+    if job.get("error"):
+        status["error"] = job["error"]
+    return status
+
+
+@app.route("/api/jobs", methods=["POST"])
+@limiter.limit("150 per minute", cost=job_cost)
+def submit_job():
+    """Queue a job: page titles, queries and/or citations to work through"""
+    items = job_items(request.get_json(silent=True))
+    if not items:
+        return (
+            jsonify(
+                {
+                    "error": "Page titles, queries or citations are required",
+                    "status": "error",
+                }
+            ),
+            400,
+        )
+    if len(items) > JOB_MAX_ITEMS:
+        return (
+            jsonify(
+                {
+                    "error": f"At most {JOB_MAX_ITEMS} items per job",
+                    "status": "error",
+                }
+            ),
+            400,
+        )
+
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    job = {
+        "status": "queued",
+        "items": json.dumps(items),
+        "total": len(items),
+        "done": 0,
+        "created": now,
+        "updated": now,
+    }
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hset(job_key(job_id), mapping=job)
+        pipe.expire(job_key(job_id), JOB_TTL)
+        pipe.lpush(JOB_QUEUE_KEY, job_id)
+        pipe.execute()
+    except Exception as e:
+        print(f"Error queueing job: {e}")
+        return jsonify({"error": "Job queue unavailable", "status": "error"}), 503
+    start_job_workers()
+    response = jsonify(job_status(job_id, job))
+    response.status_code = 202
+    response.headers["Location"] = f"/api/jobs/{job_id}"
+    return response
 
-        citations = extract_book_citations(html_content)
-        result = {
-            "page_title": page_title,
-            "citations": citations,
-            "count": len(citations),
-            "status": "success",
-        }
 
-        # Cache the result
+@app.route("/api/jobs/<job_id>")
+def get_job(job_id):
+    """State and progress of a job, with a page of its result lines
+
+    Lines start at ?offset= and number at most ?limit= (up to JOB_PAGE_SIZE);
+    next_offset is where the next page starts.
+    """
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = request.args.get("limit", JOB_PAGE_SIZE, type=int)
+    limit = min(max(limit, 1), JOB_PAGE_SIZE)
+    try:
+        job = redis_client.hgetall(job_key(job_id))
+        lines = redis_client.lrange(job_results_key(job_id), offset, offset + limit - 1)
+    except Exception as e:
+        print(f"Error reading job {job_id}: {e}")
+        return jsonify({"error": "Job queue unavailable", "status": "error"}), 503
+    if not job:
+        return jsonify({"error": "Job not found", "status": "error"}), 404
+    status = job_status(job_id, job)
+    status["results"] = [json.loads(line) for line in lines]
+    status["next_offset"] = offset + len(lines)
+    return jsonify(status)
+
+
+@app.route("/api/jobs/<job_id>/results")
+def stream_job_results(job_id):
+    """Stream a job's result lines as NDJSON until the job has finished
+
+    The stream also ends after JOB_STREAM_IDLE_TIMEOUT seconds without a new
+    line; ?offset= resumes it.
+    """
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    try:
+        if not redis_client.exists(job_key(job_id)):
+            return jsonify({"error": "Job not found", "status": "error"}), 404
+    except Exception as e:
+        print(f"Error reading job {job_id}: {e}")
+        return jsonify({"error": "Job queue unavailable", "status": "error"}), 503
+
+    def generate():
+        position = offset
+        last_line = time.monotonic()
+        while True:
+            try:
+                # Read the state first, so lines written before it finished are
+                # sent
+                state = redis_client.hget(job_key(job_id), "status")
+                lines = redis_client.lrange(job_results_key(job_id), position, -1)
+            except Exception as e:
+                print(f"Error reading job {job_id}: {e}")
+                return
+            for line in lines:
+                yield line
+            position += len(lines)
+            if state is None or state in JOB_FINISHED:
+                return
+            if lines:
+                last_line = time.monotonic()
+            elif time.monotonic() - last_line > JOB_STREAM_IDLE_TIMEOUT:
+                return
+            time.sleep(JOB_POLL_INTERVAL)
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
+
+
+@app.cli.command("job-worker")
+@click.option("--threads", type=int, default=None, help="Job threads")
+def job_worker_command(threads):
+    """Run queued jobs in this process until interrupted"""
+    count = threads or JOB_WORKERS or 1
+    print(f"[JOBS] Running {count} job threads")
+    for index in range(count - 1):
+        threading.Thread(target=job_worker, name=f"job-{index}", daemon=True).start()
+    job_worker()
+
+
+# --- Cache prewarming driven by usage ---
+# Each worker counts the queries and page titles it serves in a small
+# count-min sketch that keeps only its top-k. The background task publishes
+# those counts to shared Redis sorted sets. One worker per interval then
+# refreshes the cache entries of the hottest topics before they expire. Run
+# `flask --app app prewarm` after a deploy or a Redis flush to do a round by hand.
+PREWARM_INTERVAL = int(os.environ.get("PREWARM_INTERVAL", 0))  # seconds, 0 = off
+PREWARM_TOP_N = int(os.environ.get("PREWARM_TOP_N", 200))
+# Entries with less than this many seconds to live are refreshed
+PREWARM_REFRESH_WITHIN = int(os.environ.get("PREWARM_REFRESH_WITHIN", 600))
+PREWARM_MAX_CONCURRENCY = int(os.environ.get("PREWARM_MAX_CONCURRENCY", 2))
+PREWARM_MIN_REQUEST_INTERVAL = float(
+    os.environ.get("PREWARM_MIN_REQUEST_INTERVAL", 0.5)
+)
+# Scores are multiplied by this after each round so old favourites fade out
+PREWARM_DECAY = float(os.environ.get("PREWARM_DECAY", 0.5))
+
+prewarm_pacer = RequestPacer(PREWARM_MIN_REQUEST_INTERVAL, OUTBOUND_BACKGROUND)
+
+
+class HeavyHitters:
+    """Count-min sketch that keeps the k most frequent items it has seen"""
+
+    def __init__(self, k=100, width=2048, depth=4, window=None):
+        self.k = k
+        self.width = width
+        self.depth = depth
+        # Counts older than this many seconds are dropped, so the sketch's
+        # error stays bounded even when nothing drains it
+        self.window = window
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self._rows = [array("Q", bytes(8 * self.width)) for _ in range(self.depth)]
+        self._top = {}
+        # Min-heap of (count, key) over _top; entries whose count has since
+        # grown are stale and skipped when they reach the root
+        self._heap = []
+        self._started = time.monotonic()
+
+    def _columns(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=4 * self.depth).digest()
+        return [
+            int.from_bytes(digest[i : i + 4], "little") % self.width
+            for i in range(0, 4 * self.depth, 4)
+        ]
+
+    def add(self, item):
+        """Count one occurrence of item; returns its estimated count"""
+        item = item.strip()
+        key = item.lower()
+        columns = self._columns(key)
+        with self._lock:
+            if self.window and time.monotonic() - self._started > self.window:
+                self.clear()
+            # Conservative update: only raise the counters that hold the minimum
+            estimate = min(row[col] for row, col in zip(self._rows, columns)) + 1
+            for row, col in zip(self._rows, columns):
+                if row[col] < estimate:
+                    row[col] = estimate
+
+            if key in self._top or len(self._top) < self.k:
+                self._top[key] = (estimate, item)
+                heapq.heappush(self._heap, (estimate, key))
+                if len(self._heap) > 2 * self.k:
+                    self._heap = [(count, top) for top, (count, _) in self._top.items()]
+                    heapq.heapify(self._heap)
+            else:
+                heap = self._heap
+                while heap[0][0] != self._top.get(heap[0][1], (None,))[0]:
+                    heapq.heappop(heap)
+                if estimate > heap[0][0]:
+                    _, smallest = heapq.heapreplace(heap, (estimate, key))
+                    del self._top[smallest]
+                    self._top[key] = (estimate, item)
+        return estimate
+
+    def estimate(self, item):
+        """Estimated count of item in the current window (never too low)"""
+        columns = self._columns(item.strip().lower())
+        with self._lock:
+            return min(row[col] for row, col in zip(self._rows, columns))
+
+    def top(self, limit=None):
+        """(item, estimated count) pairs, most frequent first"""
+        with self._lock:
+            ranked = sorted(self._top.values(), reverse=True)
+        return [(item, count) for count, item in ranked[:limit]]
+
+    def drain(self):
+        """Return the current top items and start a new counting window"""
+        with self._lock:
+            ranked = sorted(self._top.values(), reverse=True)
+            self.clear()
+        return [(item, count) for count, item in ranked]
+
+
+# Without the prewarm task draining them, usage counts cover the last hour
+USAGE_WINDOW = int(os.environ.get("USAGE_WINDOW", 3600))
+
+usage_hitters = {kind: HeavyHitters(window=USAGE_WINDOW) for kind in BULK_BUILDERS}
+
+
+def record_usage(kind, topic):
+    """Count a served query ("search") or page title ("page")"""
+    usage_hitters[kind].add(topic)
+
+
+# Cache hits and misses per key over the same window, for cache_ttl
+cache_lookups = {
+    outcome: HeavyHitters(k=1, window=USAGE_WINDOW) for outcome in ("hit", "miss")
+}
+
+
+def record_lookup(cache_key, hit):
+    """Count one cache lookup of a key as a hit or a miss"""
+    cache_lookups["hit" if hit else "miss"].add(cache_key)
+
+
+def hot_topics_key(kind):
+    return f"alexandria:usage:hot:{kind}"
+
+
+def publish_heavy_hitters():
+    """Add this worker's counts since the last call to the shared rankings"""
+    for kind, hitters in usage_hitters.items():
+        top = hitters.drain()
+        if not top:
+            continue
+        key = hot_topics_key(kind)
+        pipe = redis_client.pipeline()
+        for topic, count in top:
+            pipe.zincrby(key, count, topic)
+        # Keep the shared ranking bounded as well
+        pipe.zremrangebyrank(key, 0, -(PREWARM_TOP_N * 2 + 1))
+        pipe.execute()
+
+
+def decay_heavy_hitters():
+    """Scale the shared rankings down so topics that cooled off drop out"""
+    for kind in usage_hitters:
+        key = hot_topics_key(kind)
+        redis_client.zunionstore(key, {key: PREWARM_DECAY})
+
+
+def prewarm_item(kind, topic, cache_key):
+    """Rebuild and cache one topic; failures never replace the cached entry"""
+    _outbound.pacer = prewarm_pacer
+    try:
+        result, status = BULK_BUILDERS[kind](topic)
+    except Exception as e:
+        print(f"Error prewarming {kind} {topic}: {e}")
+        return 500
+    finally:
+        _outbound.pacer = None
+    if status == 200:
         set_cached_result(cache_key, result)
+    return status
 
-        return jsonify(result)
+
+def prewarm_cache(limit=None):
+    """Refresh the hottest topics whose cache entries are missing or expiring
+
+    Returns:
+        int: Number of entries refreshed
+    """
+    limit = limit or PREWARM_TOP_N
+    items = []
+    for kind in usage_hitters:
+        for topic in redis_client.zrevrange(hot_topics_key(kind), 0, limit - 1):
+            cache_key = get_cache_key(topic, kind)
+            if not get_shared_entry(cache_key):
+                items.append((kind, topic, cache_key))
+    if not items:
+        return 0
+
+    pipe = redis_cache.pipeline()
+    for _, _, cache_key in items:
+        pipe.ttl(cache_key)
+    # TTL is -2 for a missing key and -1 for one that never expires
+    stale = [
+        item
+        for item, ttl in zip(items, pipe.execute())
+        if ttl != -1 and ttl < PREWARM_REFRESH_WITHIN
+    ]
+
+    with ThreadPoolExecutor(max_workers=PREWARM_MAX_CONCURRENCY) as pool:
+        statuses = list(pool.map(lambda item: prewarm_item(*item), stale))
+    refreshed = statuses.count(200)
+    print(f"[PREWARM] Refreshed {refreshed} of {len(stale)} expiring entries")
+    return refreshed
+
+
+def prewarm_loop():
+    """Background task: publish usage counts and run a prewarm round"""
+    while True:
+        time.sleep(PREWARM_INTERVAL)
+        try:
+            publish_heavy_hitters()
+            # Only one worker per interval does the refresh
+            if redis_client.set(
+                "alexandria:prewarm:lock",
+                os.getpid(),
+                nx=True,
+                ex=max(1, PREWARM_INTERVAL - 1),
+            ):
+                prewarm_cache()
+                decay_heavy_hitters()
+        except Exception as e:
+            print(f"Error in prewarm task: {e}")
+
+
+_prewarm_thread = None
+_prewarm_thread_lock = threading.Lock()
+
+
+@app.before_request
+def start_prewarm_task():
+    """Start the prewarm task on the first request each worker handles"""
+    global _prewarm_thread
+    if not PREWARM_INTERVAL or _prewarm_thread is not None:
+        return
+    with _prewarm_thread_lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(
+                target=prewarm_loop, name="prewarm", daemon=True
+            )
+            _prewarm_thread.start()
+
+
+@app.cli.command("prewarm")
+@click.option("--limit", type=int, default=None, help="Topics per type to check")
+def prewarm_command(limit):
+    """Refresh cache entries for the most requested queries and pages"""
+    refreshed = prewarm_cache(limit)
+    print(f"[PREWARM] Done, {refreshed} entries refreshed")
+
+
+# --- Disambiguation option prefetch ---
+# A disambiguation answer is usually followed by a click on one of its
+# options. With PREFETCH_OPTIONS set, the first few options are queued for a
+# small pool of background threads that warm their page cache entries. Jobs
+# are dropped rather than waited for: when the bounded queue is full, when the
+# option was requested in the meantime, when they went stale waiting for
+# interactive requests to finish, or when the shared per-minute budget is spent.
+PREFETCH_OPTIONS = int(os.environ.get("PREFETCH_OPTIONS", 0))  # 0 = off
+PREFETCH_MAX_CONCURRENCY = int(os.environ.get("PREFETCH_MAX_CONCURRENCY", 2))
+PREFETCH_QUEUE_SIZE = int(os.environ.get("PREFETCH_QUEUE_SIZE", 50))
+# Pages prefetched per minute across all workers
+PREFETCH_BUDGET = int(os.environ.get("PREFETCH_BUDGET", 60))
+# Jobs not started within this many seconds are dropped
+PREFETCH_MAX_AGE = float(os.environ.get("PREFETCH_MAX_AGE", 30))
+# Prefetch holds off while a worker serves this many interactive requests
+PREFETCH_MAX_INTERACTIVE = int(os.environ.get("PREFETCH_MAX_INTERACTIVE", 2))
+PREFETCH_MIN_REQUEST_INTERVAL = float(
+    os.environ.get("PREFETCH_MIN_REQUEST_INTERVAL", 0.5)
+)
+
+prefetch_pacer = RequestPacer(PREFETCH_MIN_REQUEST_INTERVAL, OUTBOUND_PREFETCH)
+
+_prefetch_queue = queue.Queue(maxsize=PREFETCH_QUEUE_SIZE)
+_prefetch_pending = {}  # page cache key -> queued job
+_prefetch_lock = threading.Lock()
+_prefetch_threads = []
+
+PREFETCH_OUTCOMES = (
+    "queued",
+    "queue_full",
+    "cancelled",
+    "expired",
+    "cached",
+    "over_budget",
+    "fetched",
+    "failed",
+)
+prefetch_stats = dict.fromkeys(PREFETCH_OUTCOMES, 0)
+
+
+def count_prefetch(outcome):
+    with _prefetch_lock:
+        prefetch_stats[outcome] += 1
+
+
+def prefetch_options(options):
+    """Queue the top options of a disambiguation result for prefetching
+
+    Returns:
+        int: Number of options queued
+    """
+    if not PREFETCH_OPTIONS:
+        return 0
+    start_prefetch_workers()
+    queued = 0
+    for option in options[:PREFETCH_OPTIONS]:
+        cache_key = get_cache_key(option["title"], "page")
+        with _prefetch_lock:
+            if cache_key in _prefetch_pending:
+                continue
+            job = {
+                "title": option["title"],
+                "cache_key": cache_key,
+                "queued_at": time.monotonic(),
+                "cancelled": False,
+            }
+            try:
+                _prefetch_queue.put_nowait(job)
+            except queue.Full:
+                prefetch_stats["queue_full"] += 1
+                break
+            _prefetch_pending[cache_key] = job
+            prefetch_stats["queued"] += 1
+        queued += 1
+    return queued
+
+
+def cancel_prefetch(cache_key):
+    """Drop a queued prefetch for a page that is being requested directly"""
+    with _prefetch_lock:
+        job = _prefetch_pending.pop(cache_key, None)
+        if job:
+            job["cancelled"] = True
+            prefetch_stats["cancelled"] += 1
+
+
+def take_prefetch_budget():
+    """Count one prefetch against the shared per-minute budget"""
+    key = f"prefetch:budget:{int(time.time() // 60)}"
+    try:
+        pipe = redis_client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, 120)
+        used, _ = pipe.execute()
     except Exception as e:
-        print(f"Error in search_specific_page: {e}")
-        return jsonify({"error": "Internal server error", "status": "error"}), 500
+        print(f"Error taking prefetch budget: {e}")
+        return False
+    return used <= PREFETCH_BUDGET
+
+
+def run_prefetch_job(job):
+    """Warm the page cache entry of one option
+
+    Returns:
+        str: Outcome, one of PREFETCH_OUTCOMES
+    """
+    # Interactive requests go first; the job waits for them until it is stale
+    while (
+        not job["cancelled"]
+        and search_concurrency.in_flight >= PREFETCH_MAX_INTERACTIVE
+        and time.monotonic() - job["queued_at"] <= PREFETCH_MAX_AGE
+    ):
+        time.sleep(0.05)
+    if job["cancelled"]:
+        return "cancelled"
+    if time.monotonic() - job["queued_at"] > PREFETCH_MAX_AGE:
+        return "expired"
+    if get_cached_entry(job["cache_key"]):
+        return "cached"
+    if not take_prefetch_budget():
+        return "over_budget"
+
+    _outbound.pacer = prefetch_pacer
+    try:
+        result, status = build_page_result(job["title"])
+    except Exception as e:
+        print(f"Error prefetching {job['title']}: {e}")
+        return "failed"
+    finally:
+        _outbound.pacer = None
+    if status != 200:
+        return "failed"
+    set_cached_result(job["cache_key"], result)
+    return "fetched"
+
+
+def prefetch_worker():
+    """Background thread running queued prefetch jobs"""
+    while True:
+        job = _prefetch_queue.get()
+        try:
+            outcome = run_prefetch_job(job)
+        except Exception as e:
+            print(f"Error in prefetch worker: {e}")
+            outcome = "failed"
+        with _prefetch_lock:
+            if _prefetch_pending.get(job["cache_key"]) is job:
+                del _prefetch_pending[job["cache_key"]]
+            # Cancellations were counted when they happened
+            if not job["cancelled"]:
+                prefetch_stats[outcome] += 1
+
+
+def start_prefetch_workers():
+    """Start the prefetch threads of this worker once"""
+    if _prefetch_threads:
+        return
+    with _prefetch_lock:
+        while len(_prefetch_threads) < PREFETCH_MAX_CONCURRENCY:
+            thread = threading.Thread(
+                target=prefetch_worker,
+                name=f"prefetch-{len(_prefetch_threads)}",
+                daemon=True,
+            )
+            thread.start()
+            _prefetch_threads.append(thread)
 
 
 @app.route("/api/parse/type1", methods=["POST"])
@@ -1831,7 +5542,7 @@ def parse_type1():
         if not citation:
             return jsonify({"error": "Citation is required", "status": "error"}), 400
 
-        result = type_1_parser(citation)
+        result = parse_within_budget("type1", citation).to_dict()
         return jsonify(result)
     except Exception as e:
         print(f"Error in parse_type1: {e}")
@@ -1848,7 +5559,7 @@ def parse_type2():
         if not citation:
             return jsonify({"error": "Citation is required", "status": "error"}), 400
 
-        result = type_2_parser(citation)
+        result = parse_within_budget("type2", citation).to_dict()
         return jsonify(result)
     except Exception as e:
         print(f"Error in parse_type2: {e}")
@@ -1865,7 +5576,7 @@ def parse_type3():
         if not citation:
             return jsonify({"error": "Citation is required", "status": "error"}), 400
 
-        result = type_3_parser(citation)
+        result = parse_within_budget("type3", citation).to_dict()
         return jsonify(result)
     except Exception as e:
         print(f"Error in parse_type3: {e}")
@@ -1882,7 +5593,7 @@ def parse_type5():
         if not citation:
             return jsonify({"error": "Citation is required", "status": "error"}), 400
 
-        result = type_5_parser(citation)
+        result = parse_within_budget("type5", citation).to_dict()
         return jsonify(result)
     except Exception as e:
         print(f"Error in parse_type5: {e}")
@@ -1910,37 +5621,242 @@ def ratelimit_handler(e):
     )
 
 
-if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 5001))
-    app.run(debug=True, host="0.0.0.0", port=port)
-
-
 # --- Graceful Degradation Implementation ---
-# This code runs after all routes are defined to wrap them with graceful degradation
-
-
-def wrap_with_graceful_degradation():
-    """Wrap search endpoints with graceful degradation"""
-    if "search_books" in app.view_functions:
-        old_search_books = app.view_functions["search_books"]
+# This code runs after all routes are defined to wrap them with graceful
+# degradation. Each worker runs at most `limit` search requests at once. The
+# limit adapts (AIMD): it creeps up while requests finish within
+# LOAD_SHED_TARGET_LATENCY and is cut by a factor when they take longer. A
+# request over the limit, or one that already waited more than
+# LOAD_SHED_MAX_QUEUE_DELAY in front of the worker (per the proxy's
+# X-Request-Start header), is not run. It gets the cached result if there is
+# one, else the last good result this worker served for it, else a fast 503.
+LOAD_SHED_MAX_LIMIT = int(os.environ.get("LOAD_SHED_MAX_LIMIT", 128))  # 0 = off
+LOAD_SHED_MIN_LIMIT = int(os.environ.get("LOAD_SHED_MIN_LIMIT", 2))
+LOAD_SHED_INITIAL_LIMIT = int(os.environ.get("LOAD_SHED_INITIAL_LIMIT", 16))
+LOAD_SHED_TARGET_LATENCY = float(os.environ.get("LOAD_SHED_TARGET_LATENCY", 2.0))
+# Factor the limit is multiplied by after a slow request
+LOAD_SHED_BACKOFF = float(os.environ.get("LOAD_SHED_BACKOFF", 0.75))
+LOAD_SHED_MAX_QUEUE_DELAY = float(os.environ.get("LOAD_SHED_MAX_QUEUE_DELAY", 1.0))
+LOAD_SHED_RETRY_AFTER = int(os.environ.get("LOAD_SHED_RETRY_AFTER", 2))
+# Last good results kept per worker, to answer shed requests with stale data
+STALE_RESULTS_SIZE = int(os.environ.get("STALE_RESULTS_SIZE", 1000))
+
+# Request field and cache namespace of each wrapped endpoint
+DEGRADED_ENDPOINTS = {
+    "search_books": ("query", "search"),
+    "search_specific_page": ("page_title", "page"),
+}
+
+
+class AdaptiveLimit:
+    """Concurrency limit with additive increase and multiplicative decrease"""
+
+    def __init__(self, initial, minimum, maximum, target_latency, backoff):
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.in_flight = 0
+        self.decreases = 0
+        self._lock = threading.Lock()
+        self._last_decrease = -inf
+
+    def acquire(self):
+        """Take a slot; False if the limit is reached"""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency):
+        """Give back a slot and adapt the limit to the request's latency"""
+        with self._lock:
+            busy = self.in_flight >= self.limit / 2
+            self.in_flight -= 1
+            if latency > self.target_latency:
+                self._decrease()
+            elif busy:
+                # About +1 for every limit's worth of fast requests, and only
+                # while the limit is actually in use
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def congested(self):
+        """Cut the limit because requests queue up in front of the worker"""
+        with self._lock:
+            self._decrease()
+
+    def _decrease(self):
+        # A burst of slow completions counts as one congestion signal
+        now = time.monotonic()
+        if now - self._last_decrease >= self.target_latency:
+            self.limit = max(self.minimum, self.limit * self.backoff)
+            self._last_decrease = now
+            self.decreases += 1
+
+
+search_concurrency = AdaptiveLimit(
+    LOAD_SHED_INITIAL_LIMIT,
+    LOAD_SHED_MIN_LIMIT,
+    LOAD_SHED_MAX_LIMIT,
+    LOAD_SHED_TARGET_LATENCY,
+    LOAD_SHED_BACKOFF,
+)
+
+LOAD_OUTCOMES = (
+    "admitted",
+    "over_limit",
+    "queue_delayed",
+    "served_cached",
+    "served_stale",
+    "rejected",
+)
+load_stats = dict.fromkeys(LOAD_OUTCOMES, 0)
+_load_stats_lock = threading.Lock()
+
+_stale_results = OrderedDict()  # cache key -> (etag, payload)
+_stale_results_lock = threading.Lock()
+
+
+def count_load(outcome):
+    with _load_stats_lock:
+        load_stats[outcome] += 1
+
+
+def remember_stale_result(cache_key, etag, payload):
+    """Keep a good result to fall back on when overloaded"""
+    with _stale_results_lock:
+        _stale_results[cache_key] = (etag, payload)
+        _stale_results.move_to_end(cache_key)
+        while len(_stale_results) > STALE_RESULTS_SIZE:
+            _stale_results.popitem(last=False)
+
+
+def get_stale_result(cache_key):
+    with _stale_results_lock:
+        return _stale_results.get(cache_key)
+
+
+def degraded_cache_key(endpoint):
+    """Cache key of the request's topic, or None if it has none"""
+    field, namespace = DEGRADED_ENDPOINTS[endpoint]
+    try:
+        topic = get_request_field(field)
+    except Exception:
+        return None
+    return get_cache_key(topic, namespace) if topic else None
 
-        def search_books_graceful():
-            # Only return 503 if there's actual high load, not just Redis unavailability
-            # For now, let the original function handle Redis unavailability gracefully
-            return old_search_books()
 
-        app.view_functions["search_books"] = search_books_graceful
+def request_queue_delay():
+    """Seconds the request waited before reaching the worker
 
-    if "search_specific_page" in app.view_functions:
-        old_search_specific_page = app.view_functions["search_specific_page"]
+    Read from the X-Request-Start header set by the proxy ("t=<time>" in
+    seconds, milliseconds or microseconds); 0 when absent.
+    """
+    value = request.headers.get("X-Request-Start", "").replace("t=", "")
+    try:
+        started = float(value)
+    except ValueError:
+        return 0.0
+    while started > 1e11:
+        started /= 1000
+    return max(0.0, time.time() - started)
+
+
+def shed_request(cache_key):
+    """Answer a request without running it: cached, stale or 503"""
+    cached_entry = get_cached_entry(cache_key) if cache_key else None
+    if cached_entry:
+        count_load("served_cached")
+        return cached_response(cached_entry)
+
+    stale = get_stale_result(cache_key) if cache_key else None
+    if stale:
+        count_load("served_stale")
+        etag, payload = stale
+        response = json_response(payload, 200, etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        return response
+
+    count_load("rejected")
+    response = jsonify(
+        {
+            "error": "Server is busy. Please try again shortly.",
+            "status": "error",
+            "retry_after": LOAD_SHED_RETRY_AFTER,
+        }
+    )
+    response.status_code = 503
+    response.headers["Retry-After"] = str(LOAD_SHED_RETRY_AFTER)
+    return response
+
+
+def degrade_under_load(endpoint, view):
+    """Wrap a search view with the adaptive concurrency limit"""
+
+    @functools.wraps(view)
+    def graceful(*args, **kwargs):
+        if not LOAD_SHED_MAX_LIMIT:
+            return view(*args, **kwargs)
+        if request_queue_delay() > LOAD_SHED_MAX_QUEUE_DELAY:
+            # Too late to be useful; shed it and admit fewer from now on
+            search_concurrency.congested()
+            count_load("queue_delayed")
+            return shed_request(degraded_cache_key(endpoint))
+        if not search_concurrency.acquire():
+            count_load("over_limit")
+            return shed_request(degraded_cache_key(endpoint))
+
+        count_load("admitted")
+        started = time.monotonic()
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        finally:
+            search_concurrency.release(time.monotonic() - started)
+
+        etag = response.get_etag()[0]
+        if response.status_code == 200 and etag:
+            cache_key = degraded_cache_key(endpoint)
+            if cache_key:
+                remember_stale_result(cache_key, etag, response.get_data())
+        return response
+
+    return graceful
+
+
+@app.route("/api/load/stats", methods=["GET"])
+def load_stats_view():
+    """Concurrency limit, in-flight requests and shedding counters"""
+    with _load_stats_lock:
+        counters = dict(load_stats)
+    return jsonify(
+        {
+            "limit": int(search_concurrency.limit),
+            "in_flight": search_concurrency.in_flight,
+            "decreases": search_concurrency.decreases,
+            "stale_results": len(_stale_results),
+            **counters,
+            "outbound": dict(outbound_governor.stats),
+            "status": "success",
+        }
+    )
 
-        def search_specific_page_graceful():
-            # Only return 503 if there's actual high load, not just Redis unavailability
-            # For now, let the original function handle Redis unavailability gracefully
-            return old_search_specific_page()
 
-        app.view_functions["search_specific_page"] = search_specific_page_graceful
+def wrap_with_graceful_degradation():
+    """Wrap search endpoints with graceful degradation"""
+    for endpoint in DEGRADED_ENDPOINTS:
+        if endpoint in app.view_functions:
+            app.view_functions[endpoint] = degrade_under_load(
+                endpoint, app.view_functions[endpoint]
+            )
 
 
 # Apply graceful degradation wrapping
 wrap_with_graceful_degradation()
+
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 5001))
+    app.run(debug=True, host="0.0.0.0", port=port)
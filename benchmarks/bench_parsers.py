@@ -0,0 +1,120 @@
+"""Citation parser benchmarks.
+
+Run from the repository root:
+
+    python benchmarks/bench_parsers.py
+
+Reports parse throughput, memory retained per parsed citation (dict results
+versus slotted records) and batch serialization time.
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (  # noqa: E402
+    determine_parser_type,
+    parse_citation,
+    records_to_json,
+    type_1_parser,
+    type_2_parser,
+    type_3_parser,
+    type_4_parser,
+    type_5_parser,
+)
+
+SAMPLE_CITATIONS = [
+    "Butler, Susan (2009). The Dinkum Dictionary: The Origins of Australian Words. "
+    "Text Publishing. p. 266. ISBN 978-1-921799-10-5",
+    "Brosius, Maria (2006), The Persians: An Introduction, London & New York: "
+    "Routledge, ISBN 978-0-415-32089-4",
+    "Barbara Triggs, The Wombat: Common Wombats in Australia, University of New "
+    "South Wales Press, 1996, ISBN 0-86840-263-X.",
+    "Mead, J. G.; Brownell, R. L. Jr. (2005). 'Order Cetacea'. In Wilson, D. E.; "
+    "Reeder, D. M. (eds.). Mammal Species of the World: A Taxonomic and Geographic "
+    "Reference (3rd ed.). Johns Hopkins University Press. ISBN 978-0-8018-8221-0",
+    "Sigurðsson, Haraldur, ed. (2015). The Encyclopedia of Volcanoes (2 ed.). "
+    "Academic Press. ISBN 978-0-12-385938-9",
+]
+
+DICT_PARSERS = {
+    "type1": type_1_parser,
+    "type2": type_2_parser,
+    "type3": type_3_parser,
+    "type4": type_4_parser,
+    "type5": type_5_parser,
+}
+
+BATCH_SIZE = 5000
+
+
+def make_batch(size):
+    """Build a batch of distinct citations so the parse cache cannot help"""
+    batch = []
+    for i in range(size):
+        citation = SAMPLE_CITATIONS[i % len(SAMPLE_CITATIONS)]
+        batch.append(f"{citation} [{i}]")
+    return batch
+
+
+def parse_dicts(batch):
+    return [DICT_PARSERS[determine_parser_type(c)](c) for c in batch]
+
+
+def parse_records(batch):
+    parse_citation.cache_clear()
+    return [parse_citation.__wrapped__(c) for c in batch]
+
+
+def retained_bytes_per_citation(parse, batch):
+    """Memory still allocated per citation after parsing the whole batch"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    results = parse(batch)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del results
+    return retained / len(batch)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    batch = make_batch(BATCH_SIZE)
+
+    dicts, dict_parse_time = timed(parse_dicts, batch)
+    records, record_parse_time = timed(parse_records, batch)
+
+    _, dict_json_time = timed(json.dumps, {"results": dicts}, sort_keys=True)
+    _, record_json_time = timed(records_to_json, records)
+
+    dict_memory = retained_bytes_per_citation(parse_dicts, batch)
+    record_memory = retained_bytes_per_citation(parse_records, batch)
+
+    print(f"Batch size: {BATCH_SIZE} citations")
+    print("")
+    print(f"{'':24}{'dict':>12}{'record':>12}")
+    print(
+        f"{'parse (citations/s)':24}"
+        f"{BATCH_SIZE / dict_parse_time:12.0f}"
+        f"{BATCH_SIZE / record_parse_time:12.0f}"
+    )
+    print(
+        f"{'serialize (ms)':24}"
+        f"{dict_json_time * 1000:12.2f}"
+        f"{record_json_time * 1000:12.2f}"
+    )
+    print(f"{'memory (bytes/citation)':24}{dict_memory:12.0f}{record_memory:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Local load test for load shedding on the search endpoints.
+
+Run from the repository root:
+
+    python benchmarks/load_shed.py
+
+Serves the app in-process on a threaded server and drives /api/search/page
+with more concurrent clients than the simulated upstream can handle. The
+upstream (page build) takes BASE_LATENCY seconds and slows down linearly once
+more than UPSTREAM_CAPACITY builds run at once. Redis is not needed: the
+result cache is left out, so every admitted request is a full build.
+
+Runs once with shedding off and once with it on, and reports status codes,
+stale answers and latency percentiles for each.
+"""
+
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as alexandria  # noqa: E402
+
+CLIENTS = 64
+REQUESTS = 1500
+TOPICS = 50
+BASE_LATENCY = 0.05
+UPSTREAM_CAPACITY = 8
+
+_upstream_lock = threading.Lock()
+_upstream_active = 0
+
+
+def slow_page_result(page_title, revid=None):
+    """Page build whose latency grows once the upstream is saturated"""
+    global _upstream_active
+    with _upstream_lock:
+        _upstream_active += 1
+        active = _upstream_active
+    try:
+        time.sleep(BASE_LATENCY * max(1, active / UPSTREAM_CAPACITY))
+    finally:
+        with _upstream_lock:
+            _upstream_active -= 1
+    return {"page_title": page_title, "citations": [], "status": "success"}, 200
+
+
+def cache_passthrough(cache_key, data, *args, **kwargs):
+    """Serialize like set_cached_result, without storing anything"""
+    payload = alexandria.json_dumps(data)
+    return alexandria.make_etag(payload), payload
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(url, max_limit):
+    """Fire REQUESTS requests from CLIENTS threads; returns a summary row"""
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=CLIENTS))
+
+    def one(i):
+        started = time.perf_counter()
+        response = session.get(url, params={"page_title": f"Topic {i % TOPICS}"})
+        stale = "Warning" in response.headers
+        return response.status_code, stale, time.perf_counter() - started
+
+    with mock.patch("app.LOAD_SHED_MAX_LIMIT", max_limit), mock.patch(
+        "app.search_concurrency",
+        alexandria.AdaptiveLimit(
+            alexandria.LOAD_SHED_INITIAL_LIMIT,
+            alexandria.LOAD_SHED_MIN_LIMIT,
+            max_limit or 1,
+            # Target a little above the unloaded build time
+            BASE_LATENCY * 2,
+            alexandria.LOAD_SHED_BACKOFF,
+        ),
+    ):
+        # Warm the stale results so shed requests have something to serve
+        for i in range(TOPICS):
+            one(i)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+            results = list(pool.map(one, range(REQUESTS)))
+        elapsed = time.perf_counter() - started
+        limit = alexandria.search_concurrency.limit
+
+    latencies = [latency for status, _, latency in results if status == 200]
+    fresh = sum(1 for status, stale, _ in results if status == 200 and not stale)
+    return {
+        "200 fresh": fresh,
+        "200 stale": sum(1 for _, stale, _ in results if stale),
+        "503": sum(1 for status, _, _ in results if status == 503),
+        "throughput/s": REQUESTS / elapsed,
+        "p50 ms": percentile(latencies, 0.5) * 1000,
+        "p99 ms": percentile(latencies, 0.99) * 1000,
+        "final limit": limit if max_limit else None,
+    }
+
+
+def main():
+    alexandria.limiter.enabled = False
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, alexandria.app, threaded=True)
+    url = f"http://127.0.0.1:{server.server_port}/api/search/page"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    out = sys.stdout
+    rows = {}
+    with mock.patch("app.build_page_result", slow_page_result), mock.patch(
+        "app.get_cached_entry", return_value=None
+    ), mock.patch("app.set_cached_result", side_effect=cache_passthrough), mock.patch(
+        "app.resolve_redirect", return_value=None
+    ), mock.patch(
+        "app.record_usage"
+    ), contextlib.redirect_stdout(
+        open(os.devnull, "w")
+    ):
+        rows["off"] = run(url, 0)
+        rows["on"] = run(url, alexandria.LOAD_SHED_MAX_LIMIT)
+    server.shutdown()
+
+    print(
+        f"{CLIENTS} clients, {REQUESTS} requests over {TOPICS} pages, upstream "
+        f"{BASE_LATENCY * 1000:.0f} ms up to {UPSTREAM_CAPACITY} concurrent builds",
+        file=out,
+    )
+    print("", file=out)
+    print(f"{'shedding':16}{'off':>12}{'on':>12}", file=out)
+    for name in rows["off"]:
+        cells = ""
+        for row in (rows["off"], rows["on"]):
+            value = row[name]
+            cells += f"{'-':>12}" if value is None else f"{value:12.0f}"
+        print(f"{name:16}{cells}", file=out)
+
+
+if __name__ == "__main__":
+    main()
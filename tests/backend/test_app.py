@@ -1,5 +1,10 @@
 import unittest
 import json
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import mock
 
 from app import app
 from app import clean_citation
@@ -683,5 +688,2533 @@ class TestSpecificCitations(unittest.TestCase):
         self.assertNotIn("Univ. Press of Kentucky", result["title"])
 
 
+class TestCitationRecords(unittest.TestCase):
+    """Test slotted citation records and batch serialization"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_record_has_no_instance_dict(self):
+        """Test that parsed records use slots rather than a per-instance dict"""
+        from app import parse_citation
+
+        record = parse_citation(
+            "Kant, Immanuel (1964). Groundwork of the Metaphysic of Morals. Harper and Row Publishers, Inc. ISBN 978-0-06-131159-8."
+        )
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertEqual(record["year"], "1964")
+        with self.assertRaises(KeyError):
+            record["publisher"]
+
+    def test_record_json_matches_dict(self):
+        """Test that the record serializer produces the same JSON as the dict"""
+        from app import type_3_record
+
+        record = type_3_record(
+            "Chester, DK; Duncan, AM (2007). 'Geomythology, theodicy, and the continuing relevance of religious worldviews on responses to volcanic eruptions'. In Grattan, J; Torrence, R (eds.). Living under the shadow: The cultural impacts of volcanic eruptions. Walnut Creek: Left Coast. ISBN 9781315425177"
+        )
+        self.assertEqual(json.loads(record.to_json()), record.to_dict())
+        self.assertEqual(
+            record.to_json(),
+            json.dumps(record.to_dict(), sort_keys=True, separators=(",", ":")),
+        )
+
+    def test_parse_batch_matches_individual_parsers(self):
+        """Test that /api/parse/batch returns the same fields as the parsers"""
+        from app import type_1_parser, type_2_parser
+
+        citations = [
+            "Sigurðsson, Haraldur, ed. (2015). The Encyclopedia of Volcanoes (2 ed.). Academic Press. ISBN 978-0-12-385938-9",
+            "Barbara Triggs, The Wombat: Common Wombats in Australia, University of New South Wales Press, 1996, ISBN 0-86840-263-X.",
+        ]
+        response = self.app.post(
+            "/api/parse/batch",
+            data=json.dumps({"citations": citations}),
+            content_type="application/json",
+        )
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            data["results"],
+            [type_1_parser(citations[0]), type_2_parser(citations[1])],
+        )
+
+    def test_cached_records_are_not_shared(self):
+        """Test that changing a returned record leaves the parse cache alone"""
+        from app import parse_citation, records_to_json
+
+        citation = "Brunner, Bernd (2007). Bears. Yale. ISBN 978-0-300-12299-2"
+        record = parse_citation(citation)
+        record["title"] = "Changed"
+        self.assertEqual(parse_citation(citation)["title"], "Bears")
+        self.assertEqual(json.loads(records_to_json([record]))[0]["title"], "Changed")
+
+    def test_parse_batch_rejects_non_strings(self):
+        """Test that unhashable citations get an error entry, not a 500"""
+        citation = "Brunner, Bernd (2007). Bears. Yale. ISBN 978-0-300-12299-2"
+        response = self.app.post(
+            "/api/parse/batch", json={"citations": [["a"], citation, {"b": 1}]}
+        )
+        self.assertEqual(response.status_code, 200)
+        first, parsed, last = json.loads(response.data)["results"]
+        self.assertEqual((first["index"], last["index"]), (0, 2))
+        self.assertEqual(parsed["title"], "Bears")
+        response = self.app.post("/api/parse/batch", json={"citations": {"a": 1}})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestCachedResponses(unittest.TestCase):
+    """Test that cache hits are served from the stored JSON bytes"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_json_dumps_sorts_keys(self):
+        """Test that the JSON backend emits compact, key-sorted bytes"""
+        from app import json_dumps, json_loads
+
+        payload = json_dumps({"status": "success", "count": 2})
+        self.assertEqual(payload, b'{"count":2,"status":"success"}')
+        self.assertEqual(json_loads(payload), {"count": 2, "status": "success"})
+
+    def test_missing_orjson_falls_back_to_json(self):
+        """Test that asking for orjson without it installed uses json instead"""
+        from app import resolve_json_backend
+
+        with mock.patch("app.orjson", None), mock.patch("builtins.print") as out:
+            self.assertEqual(resolve_json_backend("orjson"), "json")
+            self.assertEqual(resolve_json_backend("json"), "json")
+        out.assert_called_once()
+
+    def test_search_cache_hit_returns_stored_bytes(self):
+        """Test that a cached search is returned without re-encoding"""
+        stored = b'{"count":0,"citations":[],"page_title":"Bears","status":"success"}'
+        with mock.patch("app.redis_cache") as redis_cache:
+            redis_cache.get.return_value = stored
+            response = self.app.post(
+                "/api/search",
+                data=json.dumps({"query": "Bears"}),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(response.data, stored)
+
+    def test_search_cache_hit_uses_stored_etag(self):
+        """Test that a cache hit answers with the ETag stored in the entry"""
+        from app import pack_cache_entry
+
+        payload = b'{"count":0,"citations":[],"page_title":"Bears","status":"success"}'
+        etag, entry = pack_cache_entry(payload)
+        with mock.patch("app.redis_cache") as redis_cache:
+            redis_cache.get.return_value = entry
+            response = self.app.post(
+                "/api/search",
+                data=json.dumps({"query": "Bears"}),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, payload)
+        self.assertEqual(response.get_etag(), (etag, False))
+
+    def test_get_search_sets_cache_control(self):
+        """Test that the GET variant of /api/search is cacheable"""
+        from app import pack_cache_entry
+
+        etag, entry = pack_cache_entry(b'{"status":"success"}')
+        with mock.patch("app.redis_cache") as redis_cache:
+            redis_cache.get.return_value = entry
+            response = self.app.get("/api/search?query=Bears")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_etag(), (etag, False))
+        self.assertIn("max-age=", response.headers["Cache-Control"])
+        self.assertIn("stale-while-revalidate=", response.headers["Cache-Control"])
+
+    def test_get_page_if_none_match_returns_304(self):
+        """Test that a matching If-None-Match on /api/search/page returns 304"""
+        from app import pack_cache_entry
+
+        etag, entry = pack_cache_entry(b'{"page_title":"Bear","status":"success"}')
+        with mock.patch("app.redis_cache") as redis_cache:
+            redis_cache.get.return_value = entry
+            response = self.app.get(
+                "/api/search/page?page_title=Bear",
+                headers={"If-None-Match": f'"{etag}"'},
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+        self.assertEqual(response.get_etag(), (etag, False))
+
+    def test_cached_error_keeps_its_status(self):
+        """Test that a cached error is replayed with its status, uncacheable"""
+        from app import pack_cache_entry, unpack_cache_entry
+
+        payload = b'{"error":"Could not fetch content","status":"error"}'
+        etag, entry = pack_cache_entry(payload, 502)
+        self.assertEqual(unpack_cache_entry(entry), (etag, payload, 502))
+        # Entries written before the status was stored are successes
+        legacy = etag.encode() + payload
+        self.assertEqual(unpack_cache_entry(legacy), (etag, payload, 200))
+        with mock.patch("app.redis_cache") as redis_cache:
+            redis_cache.get.return_value = entry
+            response = self.app.get(
+                "/api/search?query=Bears", headers={"If-None-Match": f'"{etag}"'}
+            )
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(response.data, payload)
+        self.assertEqual(response.headers["Cache-Control"], "no-store")
+
+    def test_get_search_requires_query(self):
+        """Test that the GET variant of /api/search validates the query"""
+        response = self.app.get("/api/search")
+        self.assertEqual(response.status_code, 400)
+
+
+class TestBulkSearch(unittest.TestCase):
+    """Test the /api/search/bulk endpoint"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_bulk_streams_cached_and_fetched_topics(self):
+        """Test that cache hits and fetched misses each produce one NDJSON line"""
+        from app import pack_cache_entry
+
+        _, entry = pack_cache_entry(b'{"page_title":"Bear","status":"success"}')
+
+        def fake_search(query):
+            return {"query": query, "status": "success"}, 200
+
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch.dict(
+            "app.BULK_BUILDERS", {"search": fake_search}
+        ):
+            redis_cache.mget.return_value = [entry, None]
+            response = self.app.post(
+                "/api/search/bulk",
+                data=json.dumps({"queries": ["Bears", "Wolves", "Bears"]}),
+                content_type="application/json",
+            )
+            lines = [json.loads(line) for line in response.data.splitlines()]
+            redis_cache.mget.assert_called_once()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertEqual(len(lines), 2)
+        by_topic = {line["topic"]: line for line in lines}
+        self.assertTrue(by_topic["Bears"]["cached"])
+        self.assertEqual(by_topic["Bears"]["result"]["page_title"], "Bear")
+        self.assertFalse(by_topic["Wolves"]["cached"])
+        self.assertEqual(by_topic["Wolves"]["result"]["query"], "Wolves")
+
+    def test_bulk_rejects_non_list_fields(self):
+        """Test that fields other than lists are refused, not iterated"""
+        with mock.patch("app.redis_cache") as redis_cache:
+            for body in (
+                {"queries": "Roman Empire"},
+                {"queries": None},
+                {"page_titles": {"Bear": 1}},
+                ["Bears"],
+            ):
+                response = self.app.post("/api/search/bulk", json=body)
+                self.assertEqual(response.status_code, 400, body)
+        redis_cache.mget.assert_not_called()
+
+    def test_disconnect_cancels_queued_misses(self):
+        """Test that closing the stream does not fetch the remaining misses"""
+        calls = []
+
+        def slow_page(page_title):
+            calls.append(page_title)
+            time.sleep(0.05)
+            return {"page_title": page_title, "status": "success"}, 200
+
+        titles = [f"Page {i}" for i in range(6)]
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch.dict(
+            "app.BULK_BUILDERS", {"page": slow_page}
+        ), mock.patch("app.BULK_MAX_CONCURRENCY", 1), mock.patch(
+            "app.get_revision_ids", return_value={}
+        ):
+            redis_cache.mget.return_value = [None] * len(titles)
+            response = self.app.post(
+                "/api/search/bulk", json={"page_titles": titles}, buffered=False
+            )
+            next(iter(response.response))
+            response.close()
+            time.sleep(0.2)
+        self.assertLess(len(calls), len(titles))
+
+    def test_bulk_dedups_variants_and_keeps_statuses(self):
+        """Test that topic variants run once and cached errors keep their status"""
+        from app import pack_cache_entry
+
+        _, entry = pack_cache_entry(b'{"error":"Not found","status":"error"}', 404)
+
+        def failing_search(query):
+            return {"error": "Wikipedia is down", "status": "error"}, 503
+
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch.dict(
+            "app.BULK_BUILDERS", {"search": failing_search}
+        ), mock.patch("app.set_cached_result") as set_cached_result:
+            redis_cache.mget.return_value = [entry, None]
+            response = self.app.post(
+                "/api/search/bulk",
+                json={"queries": ["Bears", "bears ", "BEARS", "Wolves"]},
+            )
+            lines = [json.loads(line) for line in response.data.splitlines()]
+
+        self.assertEqual(len(redis_cache.mget.call_args.args[0]), 2)
+        by_topic = {line["topic"]: line for line in lines}
+        self.assertEqual(sorted(by_topic), ["Bears", "Wolves"])
+        self.assertTrue(by_topic["Bears"]["cached"])
+        self.assertEqual(by_topic["Bears"]["status_code"], 404)
+        self.assertEqual(by_topic["Wolves"]["status_code"], 503)
+        set_cached_result.assert_not_called()
+
+    def test_bulk_requires_topics(self):
+        """Test that /api/search/bulk rejects an empty request"""
+        response = self.app.post(
+            "/api/search/bulk",
+            data=json.dumps({"queries": []}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+def fake_wikipedia_response(data):
+    """Build a stand-in for a requests response carrying JSON data"""
+    response = mock.Mock()
+    response.json.return_value = data
+    return response
+
+
+class TestParseApiSource(unittest.TestCase):
+    """Test fetching reference sections through the MediaWiki parse API"""
+
+    def test_fetches_only_reference_sections(self):
+        """Test that only top-level reference-type sections are requested"""
+        from app import get_wikipedia_reference_sections
+
+        overview = {
+            "parse": {
+                "revid": 42,
+                "properties": {},
+                "sections": [
+                    {"index": "1", "number": "1", "line": "History"},
+                    {"index": "2", "number": "2", "line": "References"},
+                    {"index": "3", "number": "2.1", "line": "Notes"},
+                    {"index": "4", "number": "3", "line": "Further reading"},
+                    {"index": "T-1", "number": "4", "line": "Sources"},
+                ],
+            }
+        }
+        section_text = {"parse": {"text": "<ul><li>Book</li></ul>"}}
+        with mock.patch("app.wikipedia_get") as wikipedia_get:
+            wikipedia_get.side_effect = [
+                fake_wikipedia_response(overview),
+                fake_wikipedia_response(section_text),
+                fake_wikipedia_response(section_text),
+            ]
+            page = get_wikipedia_reference_sections("Bear")
+
+        self.assertEqual(page["revid"], 42)
+        self.assertFalse(page["disambiguation"])
+        requested = [
+            call.kwargs["params"].get("section") for call in wikipedia_get.mock_calls
+        ]
+        self.assertEqual(requested, [None, "2", "4"])
+        self.assertEqual(wikipedia_get.mock_calls[1].kwargs["params"]["oldid"], 42)
+
+    def test_revision_ids_follow_redirects(self):
+        """Test that batched revision lookups map back to the requested titles"""
+        from app import get_revision_ids
+
+        data = {
+            "query": {
+                "normalized": [{"from": "bear", "to": "Bear"}],
+                "redirects": [{"from": "Bear", "to": "Bears"}],
+                "pages": [
+                    {"title": "Bears", "lastrevid": 7},
+                    {"title": "Wolf", "lastrevid": 9},
+                    {"title": "Nowhere", "missing": True},
+                ],
+            }
+        }
+        with mock.patch("app.wikipedia_get") as wikipedia_get:
+            wikipedia_get.return_value = fake_wikipedia_response(data)
+            revids = get_revision_ids(["bear", "Wolf", "Nowhere"])
+
+        wikipedia_get.assert_called_once()
+        self.assertEqual(revids, {"bear": 7, "Wolf": 9})
+
+
+class TestTitleIndex(unittest.TestCase):
+    """Test the memory-mapped title index used for suggestions"""
+
+    TITLES = [
+        "Bear",
+        "Bears (band)",
+        "Beard",
+        "Guy Fawkes",
+        "Guy Fawkes Night",
+        "World War I",
+        "World War II",
+    ]
+
+    def setUp(self):
+        from app import TitleIndex, build_title_index
+
+        self.app = app.test_client()
+        self.app.testing = True
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "titles.idx")
+        self.assertEqual(build_title_index(self.TITLES, self.path), len(self.TITLES))
+        self.index = TitleIndex(self.path)
+
+    def tearDown(self):
+        self.index.close()
+        self.tmpdir.cleanup()
+
+    def test_complete(self):
+        """Test prefix completion ignoring case and underscores"""
+        self.assertEqual(
+            self.index.complete("guy_fawkes"), ["Guy Fawkes", "Guy Fawkes Night"]
+        )
+        self.assertEqual(self.index.complete("bear", limit=2), ["Bear", "Beard"])
+        self.assertEqual(self.index.complete("zebra"), [])
+
+    def test_correct(self):
+        """Test typo correction including adjacent transpositions"""
+        self.assertEqual(self.index.correct("Wrold War II"), ["World War II"])
+        self.assertEqual(self.index.correct("guy fawks"), ["Guy Fawkes"])
+        self.assertEqual(self.index.correct("Guy Fakwes"), ["Guy Fawkes"])
+        self.assertEqual(self.index.correct("Xylophone"), [])
+
+    def test_offsets_are_little_endian(self):
+        """Test that the header and offsets share one explicit byte order"""
+        import struct
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+        count = len(self.TITLES)
+        header = struct.unpack_from("<Q", data, 8)[0]
+        offsets = struct.unpack_from(f"<{count + 1}Q", data, 16)
+        self.assertEqual(header, count)
+        self.assertEqual(offsets[0], 0)
+        self.assertEqual(offsets[-1], len(data) - 16 - 8 * (count + 1))
+        self.assertEqual(list(offsets), list(self.index._offsets))
+
+    def test_search_suggests_from_index(self):
+        """Test that empty searches use the index instead of Wikipedia"""
+        with mock.patch("app.resolve_redirect", return_value=None), mock.patch(
+            "app.redis_cache"
+        ) as redis_cache, mock.patch("app._title_index", self.index), mock.patch(
+            "app.search_wikipedia", return_value=[]
+        ), mock.patch(
+            "app.search_wikipedia_with_suggestions"
+        ) as search_wikipedia_with_suggestions:
+            redis_cache.get.return_value = None
+            response = self.app.post(
+                "/api/search",
+                data=json.dumps({"query": "Guy Fawks"}),
+                content_type="application/json",
+            )
+        search_wikipedia_with_suggestions.assert_not_called()
+        data = json.loads(response.data)
+        self.assertEqual(data["status"], "suggestions")
+        self.assertEqual(data["options"][0]["title"], "Guy Fawkes")
+
+
+class TestDumpIngestion(unittest.TestCase):
+    """Test offline dump ingestion into the local citation store"""
+
+    PAGE_HTML = (
+        "<html><body><h2>References</h2><ul><li>Brunner, Bernd (2007). Bears: "
+        "A Brief History. Yale University Press. ISBN 978-0-300-12299-2</li>"
+        "</ul></body></html>"
+    )
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.pages = os.path.join(self.tmpdir.name, "pages")
+        os.mkdir(self.pages)
+        with open(os.path.join(self.pages, "Grizzly_bear.html"), "w") as f:
+            f.write(self.PAGE_HTML)
+        self.store = os.path.join(self.tmpdir.name, "store.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_ingest_and_lookup(self):
+        """Test that ingested pages are found by title, ignoring case and _"""
+        from app import get_local_page, ingest_dump
+
+        self.assertEqual(ingest_dump(self.pages, self.store, workers=1), 1)
+        with mock.patch("app.LOCAL_STORE_PATH", self.store):
+            result = get_local_page("grizzly_bear")
+            missing = get_local_page("Polar bear")
+        self.assertEqual(result["page_title"], "Grizzly bear")
+        self.assertEqual(result["count"], 1)
+        self.assertIn("ISBN 978-0-300-12299-2", result["citations"][0])
+        self.assertIsNone(missing)
+
+    def test_store_ignores_other_parser_versions(self):
+        """Test that pages ingested by another parser version are not served"""
+        from app import get_local_page, ingest_dump
+
+        with mock.patch("app.PARSER_VERSION", "0badf00d"):
+            ingest_dump(self.pages, self.store, workers=1)
+        with mock.patch("app.LOCAL_STORE_PATH", self.store):
+            self.assertIsNone(get_local_page("Grizzly bear"))
+
+    def test_store_without_parser_version_is_upgraded(self):
+        """Test that a store from before parser versions is migrated on ingest"""
+        import sqlite3
+
+        from app import get_local_page, ingest_dump
+
+        connection = sqlite3.connect(self.store)
+        connection.execute(
+            "CREATE TABLE pages (title_key TEXT PRIMARY KEY, title TEXT NOT NULL, "
+            "citations TEXT NOT NULL, parsed TEXT NOT NULL, "
+            "ingested_at INTEGER NOT NULL)"
+        )
+        connection.execute(
+            "INSERT INTO pages VALUES ('polar bear', 'Polar bear', '[]', '[]', 0)"
+        )
+        connection.commit()
+        connection.close()
+
+        self.assertEqual(ingest_dump(self.pages, self.store, workers=1), 1)
+        with mock.patch("app.LOCAL_STORE_PATH", self.store):
+            self.assertEqual(get_local_page("Grizzly bear")["count"], 1)
+            # Untagged rows are stale
+            self.assertIsNone(get_local_page("Polar bear"))
+
+    def test_xml_exports_are_refused(self):
+        """Test that wikitext XML exports are rejected instead of ingested empty"""
+        from app import ingest_dump
+
+        dump = os.path.join(self.tmpdir.name, "pages.xml")
+        with open(dump, "w") as f:
+            f.write("<mediawiki><page><title>Bear</title></page></mediawiki>")
+        with self.assertRaises(ValueError):
+            ingest_dump(dump, self.store, workers=1)
+
+    def test_page_search_uses_store_before_network(self):
+        """Test that /api/search/page answers from the store without fetching"""
+        from app import ingest_dump
+
+        ingest_dump(self.pages, self.store, workers=1)
+        with mock.patch("app.resolve_redirect", return_value=None), mock.patch(
+            "app.LOCAL_STORE_PATH", self.store
+        ), mock.patch("app.get_citation_source") as get_citation_source:
+            response = self.app.post(
+                "/api/search/page",
+                data=json.dumps({"page_title": "Grizzly bear"}),
+                content_type="application/json",
+            )
+        get_citation_source.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)["count"], 1)
+
+
+class TestSharedStore(unittest.TestCase):
+    """Test the memory-mapped shared citation store"""
+
+    CITATION = (
+        "Brunner, Bernd (2007). Bears: A Brief History. Yale University Press. "
+        "ISBN 978-0-300-12299-2"
+    )
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "store.map")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_build_and_get(self):
+        """Test that every key round-trips and unknown keys miss"""
+        from app import SharedStore, build_shared_store
+
+        items = [(f"key:{i}", f"value {i}".encode()) for i in range(1000)]
+        self.assertEqual(build_shared_store(items, self.path), 1000)
+        store = SharedStore(self.path)
+        try:
+            for key, value in items:
+                self.assertEqual(store.get(key), value)
+            self.assertIsNone(store.get("key:missing"))
+        finally:
+            store.close()
+
+    def test_page_search_served_before_redis(self):
+        """Test that pages compiled from the local store skip Redis"""
+        from app import (
+            build_shared_store,
+            ingest_dump,
+            iter_shared_store_entries,
+            parse_citation,
+        )
+
+        pages = os.path.join(self.tmpdir.name, "pages")
+        os.mkdir(pages)
+        with open(os.path.join(pages, "Grizzly_bear.html"), "w") as f:
+            f.write(TestDumpIngestion.PAGE_HTML)
+        local_store = os.path.join(self.tmpdir.name, "store.db")
+        ingest_dump(pages, local_store, workers=1)
+        build_shared_store(iter_shared_store_entries(local_store), self.path)
+
+        expected = parse_citation(self.CITATION).to_dict()
+        with mock.patch("app.SHARED_STORE_PATH", self.path), mock.patch(
+            "app.redis_cache"
+        ) as redis_cache, mock.patch("app.parse_citation") as parse:
+            response = self.app.get("/api/search/page?page_title=Grizzly_bear")
+            batch = self.app.post(
+                "/api/parse/batch",
+                data=json.dumps({"citations": [self.CITATION]}),
+                content_type="application/json",
+            )
+        redis_cache.get.assert_not_called()
+        parse.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)["count"], 1)
+        self.assertEqual(json.loads(batch.data)["results"], [expected])
+
+
+class TestPrewarm(unittest.TestCase):
+    """Test heavy-hitter tracking and cache prewarming"""
+
+    def test_heavy_hitters_keep_most_frequent(self):
+        """Test that the top-k survives a long tail of one-off items"""
+        from app import HeavyHitters
+
+        hitters = HeavyHitters(k=3, width=256)
+        for i in range(2000):
+            hitters.add(f"rare {i}")
+            if i % 4 == 0:
+                hitters.add("Bears")
+            if i % 8 == 0:
+                hitters.add("wolves ")
+        top = hitters.top()
+        self.assertEqual([item for item, _ in top[:2]], ["Bears", "wolves"])
+        self.assertGreaterEqual(top[0][1], 500)
+        self.assertEqual(len(hitters.drain()), 3)
+        self.assertEqual(hitters.top(), [])
+
+    def test_heavy_hitters_evict_the_smallest_count(self):
+        """Test that eviction always drops the current minimum of the top-k"""
+        import random
+
+        from app import HeavyHitters
+
+        rng = random.Random(7)
+        hitters = HeavyHitters(k=5, width=4096, depth=4)
+        expected = {}
+        for _ in range(3000):
+            topic = f"topic {int(rng.paretovariate(1.2)) % 50}"
+            estimate = hitters.add(topic)
+            if topic in expected or len(expected) < 5:
+                expected[topic] = estimate
+            else:
+                smallest = min(expected, key=expected.get)
+                if estimate > expected[smallest]:
+                    del expected[smallest]
+                    expected[topic] = estimate
+            self.assertEqual(dict(hitters.top()), expected)
+            self.assertLessEqual(len(hitters._heap), 10)
+
+    def test_prewarm_refreshes_only_expiring_entries(self):
+        """Test that fresh entries are skipped and failures are not cached"""
+        from app import get_cache_key, prewarm_cache
+
+        ttls = {
+            get_cache_key("bears"): 3000,
+            get_cache_key("wolves"): 10,
+            get_cache_key("nowhere"): -2,
+            get_cache_key("Grizzly bear", "page"): -2,
+        }
+
+        def build_search(query):
+            if query == "nowhere":
+                return {"status": "error"}, 404
+            return {"query": query, "status": "success"}, 200
+
+        def build_page(page_title):
+            return {"page_title": page_title, "status": "success"}, 200
+
+        with mock.patch("app.redis_client") as redis_client, mock.patch(
+            "app.redis_cache"
+        ) as redis_cache, mock.patch.dict(
+            "app.BULK_BUILDERS", {"search": build_search, "page": build_page}
+        ):
+            redis_client.get.return_value = None  # generation 0
+            redis_client.zrevrange.side_effect = lambda key, start, end: (
+                ["bears", "wolves", "nowhere"]
+                if key == "alexandria:usage:hot:search"
+                else ["Grizzly bear"]
+            )
+            pipe = redis_cache.pipeline.return_value
+            pipe.execute.side_effect = lambda: [
+                ttls[call.args[0]] for call in pipe.ttl.call_args_list
+            ]
+            refreshed = prewarm_cache()
+
+        self.assertEqual(refreshed, 2)
+        calls = (
+            redis_cache.setex.call_args_list
+            + redis_cache.pipeline.return_value.setex.call_args_list
+        )
+        written = sorted(call.args[0] for call in calls)
+        self.assertEqual(
+            written,
+            sorted([get_cache_key("wolves"), get_cache_key("Grizzly bear", "page")]),
+        )
+
+
+class TestCacheTtl(unittest.TestCase):
+    """Test adaptive cache TTL policies"""
+
+    def setUp(self):
+        from app import HeavyHitters
+
+        self.app = app.test_client()
+        self.app.testing = True
+        self.hitters = mock.patch.dict(
+            "app.cache_lookups", {"hit": HeavyHitters(), "miss": HeavyHitters()}
+        )
+        self.hitters.start()
+
+    def tearDown(self):
+        self.hitters.stop()
+
+    def test_ttl_by_result_type(self):
+        """Test that errors expire sooner than real results"""
+        from app import cache_ttl, get_cache_key
+
+        key = get_cache_key("bears")
+        self.assertEqual(cache_ttl(key, {"status": "success"}), 3600)
+        self.assertEqual(cache_ttl(key, {"status": "disambiguation"}), 21600)
+        self.assertEqual(cache_ttl(key, {"status": "suggestions"}), 1800)
+        self.assertEqual(cache_ttl(key, {"status": "error"}, 404), 600)
+        self.assertEqual(cache_ttl(key, {"status": "error"}, 500), 60)
+
+    def test_ttl_by_revision_age(self):
+        """Test that rarely edited pages stay cached longer"""
+        from app import cache_ttl, get_cache_key
+
+        key = get_cache_key("Grizzly bear", "page")
+        old = {"status": "success", "last_edited": "2001-01-15T00:00:00Z"}
+        fresh = {
+            "status": "success",
+            "last_edited": datetime.now(timezone.utc).isoformat(),
+        }
+        self.assertEqual(cache_ttl(key, old), 8 * 3600)
+        self.assertEqual(cache_ttl(key, fresh), 900)
+
+    def test_ttl_by_hit_rate(self):
+        """Test that keys served many times per refetch stay cached longer"""
+        from app import cache_ttl, get_cache_key, get_cached_entry, pack_cache_entry
+
+        bears, wolves = get_cache_key("bears"), get_cache_key("wolves")
+        entry = pack_cache_entry(b'{"status":"success"}')[1]
+        with mock.patch("app.redis_cache") as redis_cache:
+            redis_cache.get.return_value = None
+            get_cached_entry(bears)
+            get_cached_entry(wolves)
+            redis_cache.get.return_value = entry
+            for _ in range(16):
+                get_cached_entry(bears)
+        self.assertEqual(cache_ttl(bears, {"status": "success"}), 7200)
+        self.assertEqual(cache_ttl(wolves, {"status": "success"}), 3600)
+
+    def test_search_stores_error_with_short_ttl(self):
+        """Test that a not-found search is cached with the error TTL"""
+        with mock.patch("app.resolve_redirect", return_value=None), mock.patch(
+            "app.redis_cache"
+        ) as redis_cache, mock.patch(
+            "app.search_wikipedia", return_value=[]
+        ), mock.patch(
+            "app.search_wikipedia_with_suggestions", return_value=None
+        ):
+            redis_cache.get.return_value = None
+            response = self.app.get("/api/search?query=xqzzv")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(redis_cache.setex.call_args.args[1], 600)
+
+    def test_cache_stats_report_effective_ttl(self):
+        """Test that cache stats include base and effective TTLs"""
+        from app import cache_ttl, get_cache_key
+
+        with mock.patch.dict("app.ttl_stats", clear=True):
+            cache_ttl(get_cache_key("wolves"), {"status": "success"})
+            with mock.patch("app.redis_client") as redis_client:
+                redis_client.keys.return_value = []
+                response = self.app.get("/api/cache/stats")
+        ttl = json.loads(response.data)["ttl"]
+        self.assertEqual(ttl["search"]["success"]["base"], 3600)
+        self.assertEqual(ttl["search"]["success"]["effective_average"], 3600)
+        self.assertEqual(ttl["search"]["success"]["entries"], 1)
+        self.assertIsNone(ttl["page"]["error"]["effective_average"])
+
+
+class TestNegativeCache(unittest.TestCase):
+    """Test the bloom filter front for queries with no results"""
+
+    def setUp(self):
+        from app import NegativeCache
+
+        self.app = app.test_client()
+        self.app.testing = True
+        self.cache = NegativeCache(1000, 0.001, rotate=3600, sync_interval=60)
+        self.patcher = mock.patch("app.negative_cache", self.cache)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_bloom_filter(self):
+        """Test no false negatives, a low false positive rate and merging"""
+        from app import BloomFilter
+
+        bloom = BloomFilter(1000, 0.001)
+        items = [f"query {i}" for i in range(1000)]
+        bloom.set_positions([p for item in items for p in bloom.positions(item)])
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(f"other {i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 50)
+        self.assertAlmostEqual(bloom.approximate_count(), 1000, delta=50)
+
+        # Redis drops trailing zero bytes from bitmaps
+        other = BloomFilter(1000, 0.001)
+        other.merge(bytes(bloom.bits).rstrip(b"\0"))
+        self.assertTrue(all(item in other for item in items))
+
+    def test_empty_search_answered_without_io(self):
+        """Test that a repeated empty search skips Redis and Wikipedia"""
+        with mock.patch("app.resolve_redirect", return_value=None), mock.patch(
+            "app.redis_cache"
+        ) as redis_cache, mock.patch(
+            "app.search_wikipedia", return_value=[]
+        ) as search_wikipedia, mock.patch(
+            "app.search_wikipedia_with_suggestions", return_value=None
+        ):
+            redis_cache.get.return_value = None
+            redis_cache.mget.return_value = [None, None]
+            first = self.app.get("/api/search?query=Xqzzv")
+            second = self.app.get("/api/search?query=xqzzv")
+
+        self.assertEqual(first.status_code, 404)
+        self.assertEqual(second.status_code, 404)
+        self.assertEqual(json.loads(second.data)["status"], "error")
+        search_wikipedia.assert_called_once()
+        redis_cache.get.assert_called_once()
+        # The query's bits were also shared through Redis
+        redis_cache.pipeline.return_value.setbit.assert_called()
+
+    def test_failed_search_not_remembered(self):
+        """Test that a Wikipedia outage is not mistaken for an empty result"""
+        with mock.patch("app.resolve_redirect", return_value=None), mock.patch(
+            "app.redis_cache"
+        ) as redis_cache, mock.patch(
+            "app.search_wikipedia", return_value=None
+        ), mock.patch(
+            "app.search_wikipedia_with_suggestions", return_value=None
+        ):
+            redis_cache.get.return_value = None
+            response = self.app.get("/api/search?query=Bears")
+        self.assertEqual(response.status_code, 502)
+        self.assertNotIn("Bears", self.cache)
+
+    def test_rotation_forgets_old_queries(self):
+        """Test that queries expire after two generations"""
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch(
+            "app.time.time", return_value=36000.0
+        ):
+            redis_cache.mget.return_value = [None, None]
+            self.cache.add("Newly created page")
+            self.assertIn("newly created page", self.cache)
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch(
+            "app.time.time", return_value=36000.0 + 3600
+        ):
+            redis_cache.mget.return_value = [None, None]
+            self.assertIn("newly created page", self.cache)
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch(
+            "app.time.time", return_value=36000.0 + 7200
+        ):
+            redis_cache.mget.return_value = [None, None]
+            self.assertNotIn("newly created page", self.cache)
+
+    def test_full_filter_stops_growing_until_rotation(self):
+        """Test that a saturated generation takes no adds until the next one"""
+        from app import BloomFilter
+
+        saturated = BloomFilter(1000, 0.001)
+        saturated.set_positions(
+            [p for i in range(1200) for p in saturated.positions(f"query {i}")]
+        )
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch(
+            "app.time.time", return_value=36000.0
+        ):
+            redis_cache.mget.return_value = [bytes(saturated.bits), None]
+            self.cache.sync(force=True)
+            self.assertTrue(self.cache.filters()[0].full)
+            self.cache.add("Skipped query")
+            redis_cache.pipeline.assert_not_called()
+            self.assertNotIn("skipped query", self.cache)
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch(
+            "app.time.time", return_value=36000.0 + 3600
+        ):
+            redis_cache.mget.return_value = [None, None]
+            self.assertFalse(self.cache.filters()[0].full)
+            self.cache.add("Skipped query")
+            redis_cache.pipeline.return_value.setbit.assert_called()
+            self.assertIn("skipped query", self.cache)
+
+
+class TestQueryCanonicalization(unittest.TestCase):
+    """Test query canonicalization and redirect resolution"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_variants_share_a_cache_key(self):
+        """Test that spacing, case, underscores and punctuation forms collapse"""
+        from app import canonicalize_query, get_cache_key
+
+        self.assertEqual(canonicalize_query("  World_War   II "), "world war ii")
+        self.assertEqual(canonicalize_query("Ｗｏｒｌｄ War II"), "world war ii")
+        self.assertEqual(
+            canonicalize_query("Bears \u2013 Ursidae\u2019s"), "bears - ursidae's"
+        )
+        self.assertEqual(get_cache_key("World_War_II"), get_cache_key("world war ii"))
+        self.assertNotEqual(get_cache_key("Help"), get_cache_key("Help!"))
+
+    def test_resolve_title_is_cached(self):
+        """Test that targets, revisions and missing pages are cached"""
+        from app import resolve_redirect, resolve_title
+
+        data = {
+            "query": {
+                "redirects": [{"from": "World War 2", "to": "World War II"}],
+                "pages": [{"title": "World War II", "lastrevid": 1234}],
+            }
+        }
+        with mock.patch("app.redis_client") as redis_client, mock.patch(
+            "app.wikipedia_get"
+        ) as wikipedia_get:
+            redis_client.mget.return_value = [None, None]
+            wikipedia_get.return_value = fake_wikipedia_response(data)
+            self.assertEqual(resolve_title("world war 2"), ("World War II", 1234))
+            pipe = redis_client.pipeline.return_value
+            self.assertEqual(
+                [call.args[2] for call in pipe.setex.call_args_list],
+                ["World War II", 1234],
+            )
+
+            redis_client.mget.return_value = ["World War II", "1234"]
+            self.assertEqual(resolve_redirect("WW2"), "World War II")
+            redis_client.mget.return_value = ["", None]
+            self.assertIsNone(resolve_title("Xqzzv"))
+        wikipedia_get.assert_called_once()
+
+    def test_page_alias_served_from_target_entry(self):
+        """Test that a redirect is answered from its target's cache entry"""
+        from app import get_cache_key, pack_cache_entry
+
+        etag, entry = pack_cache_entry(b'{"page_title":"World War II"}')
+        target_key = get_cache_key("World War II", "page")
+        with mock.patch(
+            "app.resolve_redirect", return_value="World War II"
+        ), mock.patch("app.redis_cache") as redis_cache, mock.patch(
+            "app.build_page_result"
+        ) as build_page_result:
+            redis_cache.get.side_effect = lambda key: (
+                entry if key == target_key else None
+            )
+            redis_cache.ttl.return_value = 100
+            response = self.app.get("/api/search/page?page_title=WW2")
+
+        build_page_result.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'{"page_title":"World War II"}')
+        redis_cache.setex.assert_called_once_with(
+            get_cache_key("WW2", "page"), 100, entry
+        )
+
+    def test_search_aliased_only_when_it_lands_on_target(self):
+        """Test that a search settling on another page keeps its own entry"""
+        from app import get_cache_key
+
+        for page_title, keys in (
+            ("World War II", [get_cache_key("World War II"), get_cache_key("WW2")]),
+            ("WW2 (film)", [get_cache_key("WW2")]),
+        ):
+            result = {"page_title": page_title, "citations": [], "status": "success"}
+            with mock.patch(
+                "app.resolve_redirect", return_value="World War II"
+            ), mock.patch("app.is_known_empty", return_value=False), mock.patch(
+                "app.redis_cache"
+            ) as redis_cache, mock.patch(
+                "app.build_search_result", return_value=(result, 200)
+            ):
+                redis_cache.get.return_value = None
+                response = self.app.get("/api/search?query=WW2")
+            self.assertEqual(response.status_code, 200)
+            pipe = redis_cache.pipeline.return_value
+            self.assertEqual([call.args[0] for call in pipe.setex.call_args_list], keys)
+
+
+class TestArticleCache(unittest.TestCase):
+    """Test that article work is shared by canonical title and revision"""
+
+    PAGE_HTML = TestDumpIngestion.PAGE_HTML
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_search_and_page_share_article(self):
+        """Test that a search and a redirected page fetch the article once"""
+        from app import get_cache_key
+
+        store = {}
+        with mock.patch("app.WIKIPEDIA_CONTENT_SOURCE", "parse"), mock.patch(
+            "app.resolve_title", return_value=("Grizzly bear", 42)
+        ), mock.patch("app.redis_client") as redis_client, mock.patch(
+            "app.redis_cache"
+        ) as redis_cache, mock.patch(
+            "app.search_wikipedia", return_value=[{"title": "Grizzly bear"}]
+        ), mock.patch(
+            "app.get_citation_source", return_value=(self.PAGE_HTML, False)
+        ) as get_citation_source:
+            redis_client.get.return_value = None
+            redis_cache.get.side_effect = store.get
+            redis_cache.setex.side_effect = lambda key, ttl, value: store.update(
+                {key: value}
+            )
+            redis_cache.ttl.return_value = 100
+            search = self.app.get("/api/search?query=grizzlies")
+            page = self.app.get("/api/search/page?page_title=Ursus_arctos_horribilis")
+
+        get_citation_source.assert_called_once_with("Grizzly bear", 42)
+        self.assertIn("alexandria:article:", " ".join(store))
+        self.assertEqual(json.loads(search.data)["page_title"], "Grizzly bear")
+        self.assertEqual(json.loads(search.data)["count"], 1)
+        self.assertEqual(json.loads(page.data)["page_title"], "Grizzly bear")
+        self.assertEqual(json.loads(page.data)["count"], 1)
+        self.assertIn(
+            mock.call(get_cache_key("grizzlies", "query"), mock.ANY, "Grizzly bear"),
+            redis_client.setex.call_args_list,
+        )
+
+
+class TestCacheInvalidation(unittest.TestCase):
+    """Test generation-based and per-page cache invalidation"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self.counters = {}
+        self.redis_client = mock.patch("app.redis_client").start()
+        self.redis_client.get.side_effect = self.counters.get
+        self.redis_client.incr.side_effect = (
+            lambda key: self.counters.update({key: self.counters.get(key, 0) + 1})
+            or self.counters[key]
+        )
+        mock.patch.dict("app._generations", clear=True).start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+
+    def test_namespace_bump_changes_keys(self):
+        """Test that bumping a namespace only moves that namespace's keys"""
+        from app import get_cache_key
+
+        search_key = get_cache_key("bears")
+        page_key = get_cache_key("Bear", "page")
+        redirect_key = get_cache_key("Bear", "redirect")
+        response = self.app.post(
+            "/api/cache/invalidate",
+            data=json.dumps({"namespace": "search"}),
+            content_type="application/json",
+        )
+        self.assertEqual(json.loads(response.data)["generation"], 1)
+        self.assertNotEqual(get_cache_key("bears"), search_key)
+        self.assertEqual(get_cache_key("Bear", "page"), page_key)
+        self.assertEqual(get_cache_key("Bear", "redirect"), redirect_key)
+
+    def test_parser_version_in_keys(self):
+        """Test that a parser change moves parse-derived keys only"""
+        from app import get_cache_key
+
+        page_key = get_cache_key("Bear", "page")
+        query_key = get_cache_key("bears", "query")
+        with mock.patch("app.PARSER_VERSION", "0badf00d"):
+            self.assertNotEqual(get_cache_key("Bear", "page"), page_key)
+            self.assertEqual(get_cache_key("bears", "query"), query_key)
+
+    def test_invalidate_page(self):
+        """Test that a page's tagged responses and article entries are dropped"""
+        from app import get_article_key
+
+        article_key = get_article_key("Grizzly bear", 42)
+        with mock.patch(
+            "app.resolve_redirect", return_value="Grizzly bear"
+        ), mock.patch("app.redis_cache") as redis_cache:
+            redis_cache.smembers.return_value = {b"alexandria:search:x"}
+            redis_cache.delete.return_value = 1
+            response = self.app.post(
+                "/api/cache/invalidate",
+                data=json.dumps({"page_title": "Grizzly_bear"}),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        redis_cache.delete.assert_any_call(b"alexandria:search:x")
+        self.assertNotEqual(get_article_key("Grizzly bear", 42), article_key)
+
+    def test_invalidate_page_in_shared_store(self):
+        """Test that an invalidated page is no longer served from the store"""
+        from app import build_shared_store, get_cache_key, get_cached_entry
+
+        members = set()
+        self.redis_client.sadd.side_effect = lambda key, *keys: members.update(keys)
+        self.redis_client.smembers.side_effect = lambda key: set(members)
+        page_key = get_cache_key("Grizzly bear", "page")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "store.map")
+            build_shared_store([(page_key, b'{"page_title":"Grizzly bear"}')], path)
+            with mock.patch("app.SHARED_STORE_PATH", path), mock.patch(
+                "app.resolve_redirect", return_value="Grizzly bear"
+            ), mock.patch("app._shared_invalidated", (0, frozenset())), mock.patch(
+                "app.redis_cache"
+            ) as redis_cache:
+                redis_cache.get.return_value = None
+                redis_cache.smembers.return_value = set()
+                self.assertIsNotNone(get_cached_entry(page_key))
+                response = self.app.post(
+                    "/api/cache/invalidate",
+                    data=json.dumps({"page_title": "Grizzly_bear"}),
+                    content_type="application/json",
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(get_cached_entry(page_key))
+                redis_cache.get.assert_called_once_with(page_key)
+
+    def test_invalidate_requires_target(self):
+        """Test that invalidation needs a page title or a known namespace"""
+        for body in ({}, {"namespace": "everything"}):
+            response = self.app.post(
+                "/api/cache/invalidate",
+                data=json.dumps(body),
+                content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_parse_bump_clears_parse_cache(self):
+        """Test that workers drop their parse cache after a parse bump"""
+        from app import (
+            bump_generation,
+            parse_citation,
+            parse_citation_cached,
+            sync_parse_generation,
+        )
+
+        sync_parse_generation()
+        parse_citation("Brunner, Bernd (2007). Bears. ISBN 978-0-300-12299-2")
+        self.assertGreater(parse_citation_cached.cache_info().currsize, 0)
+        bump_generation("parse")
+        sync_parse_generation()
+        self.assertEqual(parse_citation_cached.cache_info().currsize, 0)
+
+
+class TestStreamingExtraction(unittest.TestCase):
+    """Test that citations are extracted while a page downloads"""
+
+    PAGE_HTML = (
+        '<html><head><script type="application/ld+json">'
+        '{"dateModified":"2024-05-01T10:00:00Z"}</script></head><body>'
+        "<h2>Works</h2><ul><li>Pastoureau, Michel (2011). The Bear: History of a "
+        "Fallen King. Harvard University Press. ISBN 978-0-674-04782-2</li></ul>"
+        "<h2>References</h2><ol><li>Brunner, Bernd (2007). Bears: A Brief "
+        "History. Yale University Press. ISBN 978-0-300-12299-2"
+        "<style>.x{}</style></li></ol>"
+        "<h2>External links</h2><ul><li>Late, Author (2001). Never Read. "
+        "ISBN 978-0-000-00000-0</li></ul></body></html>"
+    )
+
+    def test_ordered_lists_first_and_stops_after_references(self):
+        """Test ordering, style skipping and the stop after References"""
+        from app import extract_book_citations
+
+        citations = extract_book_citations(self.PAGE_HTML)
+        self.assertEqual(len(citations), 2)
+        self.assertTrue(citations[0].startswith("Brunner, Bernd (2007)"))
+        self.assertNotIn(".x{}", citations[0])
+        self.assertTrue(citations[1].startswith("Pastoureau, Michel (2011)"))
+
+    def test_chunking_does_not_change_result(self):
+        """Test that any split of the download gives the same citations"""
+        from app import citations_from_list_items, iter_list_items
+
+        data = self.PAGE_HTML.encode()
+        whole = citations_from_list_items(iter_list_items([data]))
+        for size in (1, 7, 64):
+            chunks = [data[i : i + size] for i in range(0, len(data), size)]
+            self.assertEqual(citations_from_list_items(iter_list_items(chunks)), whole)
+
+    def test_stops_reading_after_references(self):
+        """Test that chunks after the reference sections are never pulled"""
+        from app import iter_list_items
+
+        def chunks():
+            yield self.PAGE_HTML.split("<h2>External links</h2>")[0].encode()
+            yield b"<h2>External links</h2>"
+            raise AssertionError("read past the reference sections")
+
+        self.assertEqual(len(list(iter_list_items(chunks()))), 2)
+
+    def test_text_mentioning_disambiguation_is_extracted(self):
+        """Test that page text about disambiguation never stops extraction"""
+        from app import extract_book_citations
+
+        html = self.PAGE_HTML.replace(
+            "<h2>Works</h2>",
+            "<p>This page refers to bears; see the disambiguation page.</p>"
+            '<div class="dmbox-disambig">Quoted box</div><h2>Works</h2>',
+        )
+        self.assertEqual(len(extract_book_citations(html)), 2)
+
+    def test_stream_page_citations(self):
+        """Test the streamed fetch, including last_edited and closing"""
+        from app import stream_page_citations
+
+        response = mock.MagicMock()
+        response.iter_content.return_value = [self.PAGE_HTML.encode()]
+        with mock.patch("app.wikipedia_get", return_value=response) as get:
+            page = stream_page_citations("Grizzly bear")
+        self.assertTrue(get.call_args.kwargs["stream"])
+        response.close.assert_called_once()
+        self.assertFalse(page["disambiguation"])
+        self.assertEqual(len(page["citations"]), 2)
+        self.assertEqual(page["last_edited"], "2024-05-01T10:00:00Z")
+
+    def test_disambiguation_falls_back_to_full_page(self):
+        """Test that disambiguation pages are read in full for their options"""
+        from app import stream_article
+
+        html = (
+            "<html><body><p>Bear may refer to:</p>"
+            '<div id="mw-content-text"><ul><li><a href="/wiki/Bear_(band)">'
+            "Bear (band)</a></li></ul>"
+            '<a href="/wiki/Category:Disambiguation_pages">x</a></div>'
+            "</body></html>"
+        )
+        response = mock.MagicMock()
+        response.iter_content.return_value = [html.encode()]
+        with mock.patch("app.wikipedia_get", return_value=response), mock.patch(
+            "app.get_wikipedia_content", return_value=html
+        ) as get_wikipedia_content:
+            article = stream_article("Bear (disambiguation)")
+        get_wikipedia_content.assert_called_once_with("Bear (disambiguation)")
+        self.assertTrue(article["disambiguation"])
+        self.assertIn("options", article)
+
+
+class TestDisambiguationDetection(unittest.TestCase):
+    """Test that disambiguation is decided without parsing where possible"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_search_reads_disambiguation_flag(self):
+        """Test that search results carry pageprops in search order"""
+        from app import search_wikipedia
+
+        response = mock.MagicMock()
+        response.json.return_value = {
+            "query": {
+                "pages": [
+                    {"title": "Bear (band)", "index": 2},
+                    {
+                        "title": "Bear (disambiguation)",
+                        "index": 1,
+                        "pageprops": {"disambiguation": ""},
+                        "revisions": [{"revid": 7, "timestamp": "2024-01-01"}],
+                    },
+                ]
+            }
+        }
+        with mock.patch("app.wikipedia_get", return_value=response) as get:
+            results = search_wikipedia("bear")
+        self.assertEqual(get.call_args.kwargs["params"]["ppprop"], "disambiguation")
+        self.assertEqual(
+            results,
+            [
+                {
+                    "title": "Bear (disambiguation)",
+                    "disambiguation": True,
+                    "revid": 7,
+                    "timestamp": "2024-01-01",
+                },
+                {"title": "Bear (band)", "disambiguation": False},
+            ],
+        )
+
+        response.json.return_value = {"batchcomplete": True}
+        with mock.patch("app.wikipedia_get", return_value=response):
+            self.assertEqual(search_wikipedia("qwxz"), [])
+
+    def test_known_disambiguation_skips_citation_source(self):
+        """Test that a flagged search hit goes straight to the options"""
+        from app import build_search_result
+
+        html = (
+            '<div id="mw-content-text"><ul><li><a href="/wiki/Bear_(band)">'
+            "Bear (band)</a></li></ul></div>"
+        )
+        with mock.patch("app.get_query_title", return_value=None), mock.patch(
+            "app.set_query_title"
+        ), mock.patch(
+            "app.search_wikipedia",
+            return_value=[{"title": "Bear (disambiguation)", "disambiguation": True}],
+        ), mock.patch(
+            "app.resolve_title", return_value=None
+        ), mock.patch(
+            "app.get_wikipedia_content", return_value=html
+        ), mock.patch(
+            "app.stream_page_citations"
+        ) as stream, mock.patch(
+            "app.get_citation_source"
+        ) as get_citation_source:
+            result, status = build_search_result("bear")
+        stream.assert_not_called()
+        get_citation_source.assert_not_called()
+        self.assertEqual(status, 200)
+        self.assertEqual(result["status"], "disambiguation")
+        self.assertEqual(result["options"][0]["title"], "Bear (band)")
+
+    def test_prefilter_skips_tree_for_articles(self):
+        """Test that pages without any marker are never parsed"""
+        from app import is_disambiguation_page
+
+        html = (
+            '<html><body><div class="hatnote">For other uses, see '
+            '<a href="/wiki/Bear_(disambiguation)">Bear (disambiguation)</a>.'
+            "</div><p>The grizzly bear is a large bear.</p></body></html>"
+        )
+        with mock.patch("app.BeautifulSoup") as soup:
+            self.assertFalse(is_disambiguation_page(html))
+            self.assertFalse(is_disambiguation_page(html.encode()))
+        soup.assert_not_called()
+        for marker in (
+            '<div class="dmbox dmbox-disambig">',
+            '<img alt="Disambiguation icon">',
+            '<a href="/wiki/Category:Disambiguation_pages">',
+            "<p>This is a disambiguation page.</p>",
+        ):
+            self.assertTrue(is_disambiguation_page(marker), marker)
+
+    def test_prefilter_keeps_split_phrases(self):
+        """Test that indicator phrases split by inline tags still match"""
+        from app import is_disambiguation_page, may_be_disambiguation_page
+
+        html = "<p>This page <b>lists</b> people with the same name.</p>"
+        self.assertTrue(may_be_disambiguation_page(html))
+        self.assertTrue(may_be_disambiguation_page(html.encode()))
+        self.assertTrue(
+            is_disambiguation_page(
+                "<p>This page lists articles associated with the title Bear.</p>"
+            )
+        )
+
+
+class TestOptionPrefetch(unittest.TestCase):
+    """Test background prefetch of disambiguation options"""
+
+    OPTIONS = [
+        {"title": "Bear (band)", "display_text": "Bear (band)", "url": ""},
+        {"title": "Bear (film)", "display_text": "Bear (film)", "url": ""},
+        {"title": "Bear (comics)", "display_text": "Bear (comics)", "url": ""},
+    ]
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        patcher = mock.patch("app.start_prefetch_workers")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.drain)
+
+    def drain(self):
+        import app as app_module
+
+        while not app_module._prefetch_queue.empty():
+            app_module._prefetch_queue.get_nowait()
+        app_module._prefetch_pending.clear()
+
+    def queued_jobs(self):
+        import app as app_module
+
+        return list(app_module._prefetch_queue.queue)
+
+    def test_queues_top_options_once(self):
+        """Test that only the top-k options are queued, without duplicates"""
+        from app import prefetch_options
+
+        with mock.patch("app.PREFETCH_OPTIONS", 2):
+            self.assertEqual(prefetch_options(self.OPTIONS), 2)
+            self.assertEqual(prefetch_options(self.OPTIONS), 0)
+        self.assertEqual(
+            [job["title"] for job in self.queued_jobs()],
+            ["Bear (band)", "Bear (film)"],
+        )
+        self.assertEqual(prefetch_options(self.OPTIONS), 0)  # off by default
+
+    def test_job_warms_page_cache(self):
+        """Test that a job builds and caches the option's page result"""
+        from app import get_cache_key, prefetch_options, run_prefetch_job
+
+        with mock.patch("app.PREFETCH_OPTIONS", 1):
+            prefetch_options(self.OPTIONS)
+        job = self.queued_jobs()[0]
+        result = {"page_title": "Bear (band)", "citations": [], "status": "success"}
+        with mock.patch("app.get_cached_entry", return_value=None), mock.patch(
+            "app.take_prefetch_budget", return_value=True
+        ), mock.patch("app.build_page_result", return_value=(result, 200)), mock.patch(
+            "app.set_cached_result"
+        ) as set_cached_result:
+            self.assertEqual(run_prefetch_job(job), "fetched")
+        set_cached_result.assert_called_once_with(
+            get_cache_key("Bear (band)", "page"), result
+        )
+
+    def test_click_cancels_queued_job(self):
+        """Test that requesting the page directly cancels its prefetch"""
+        from app import prefetch_options, run_prefetch_job
+
+        with mock.patch("app.PREFETCH_OPTIONS", 1):
+            prefetch_options(self.OPTIONS)
+        job = self.queued_jobs()[0]
+        with mock.patch("app.resolve_redirect", return_value=None), mock.patch(
+            "app.build_page_result", return_value=({"status": "success"}, 200)
+        ), mock.patch("app.get_local_page", return_value=None):
+            self.app.get("/api/search/page?page_title=Bear_(band)")
+        self.assertTrue(job["cancelled"])
+        with mock.patch("app.build_page_result") as build_page_result:
+            self.assertEqual(run_prefetch_job(job), "cancelled")
+        build_page_result.assert_not_called()
+
+    def test_budget_and_staleness(self):
+        """Test that jobs stop when stale or when the budget is spent"""
+        from app import PREFETCH_BUDGET, run_prefetch_job, take_prefetch_budget
+
+        job = {
+            "title": "Bear (film)",
+            "cache_key": "k",
+            "queued_at": time.monotonic(),
+            "cancelled": False,
+        }
+        with mock.patch("app.redis_client") as redis_client, mock.patch(
+            "app.get_cached_entry", return_value=None
+        ), mock.patch("app.build_page_result") as build_page_result:
+            redis_client.pipeline.return_value.execute.return_value = [
+                PREFETCH_BUDGET + 1,
+                True,
+            ]
+            self.assertFalse(take_prefetch_budget())
+            self.assertEqual(run_prefetch_job(job), "over_budget")
+            with mock.patch("app.PREFETCH_MAX_AGE", -1):
+                self.assertEqual(run_prefetch_job(job), "expired")
+        build_page_result.assert_not_called()
+
+    def test_search_queues_disambiguation_options(self):
+        """Test that a fresh disambiguation answer queues its options"""
+        result = {
+            "query": "bear",
+            "page_title": "Bear (disambiguation)",
+            "disambiguation": True,
+            "options": self.OPTIONS,
+            "status": "disambiguation",
+        }
+        with mock.patch("app.redis_client"), mock.patch("app.redis_cache"), mock.patch(
+            "app.is_known_empty", return_value=False
+        ), mock.patch("app.get_cached_entry", return_value=None), mock.patch(
+            "app.resolve_redirect", return_value=None
+        ), mock.patch(
+            "app.build_search_result", return_value=(result, 200)
+        ), mock.patch(
+            "app.prefetch_options"
+        ) as prefetch_options:
+            response = self.app.get("/api/search?query=bear")
+        self.assertEqual(response.status_code, 200)
+        prefetch_options.assert_called_once_with(self.OPTIONS)
+
+
+class TestLoadShedding(unittest.TestCase):
+    """Test the adaptive concurrency limit around the search endpoints"""
+
+    def setUp(self):
+        from app import AdaptiveLimit
+
+        self.app = app.test_client()
+        self.app.testing = True
+        # One slot, already taken by a slow request
+        self.limit = AdaptiveLimit(1, 1, 4, 2.0, 0.5)
+        self.limit.acquire()
+        patcher = mock.patch("app.search_concurrency", self.limit)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_limit_adapts(self):
+        """Test additive increase on fast requests and decrease on slow ones"""
+        from app import AdaptiveLimit
+
+        limit = AdaptiveLimit(2, 1, 8, 1.0, 0.5)
+        self.assertTrue(limit.acquire())
+        self.assertTrue(limit.acquire())
+        self.assertFalse(limit.acquire())
+        limit.release(0.1)
+        self.assertEqual(limit.limit, 2.5)
+        limit.release(5.0)
+        self.assertEqual(limit.limit, 1.25)
+        self.assertEqual(limit.in_flight, 0)
+        # Slow completions right after a decrease count once
+        limit.acquire()
+        limit.release(5.0)
+        self.assertEqual(limit.limit, 1.25)
+
+    def test_over_limit_gets_fast_503(self):
+        """Test that a request over the limit is rejected with Retry-After"""
+        with mock.patch("app.get_cached_entry", return_value=None), mock.patch(
+            "app.build_search_result"
+        ) as build_search_result:
+            response = self.app.get("/api/search?query=never+seen")
+        build_search_result.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "2")
+        self.assertEqual(json.loads(response.data)["status"], "error")
+
+    def test_over_limit_serves_cached_then_stale(self):
+        """Test that shed requests get the cached, else the last good result"""
+        from app import get_cache_key, remember_stale_result
+
+        payload = b'{"status":"success"}'
+        with mock.patch("app.get_cached_entry", return_value=("e1", payload, 200)):
+            cached = self.app.get("/api/search/page?page_title=Bear")
+        self.assertEqual(cached.status_code, 200)
+        self.assertNotIn("Warning", cached.headers)
+
+        remember_stale_result(get_cache_key("Bear", "page"), "e0", payload)
+        with mock.patch("app.get_cached_entry", return_value=None):
+            stale = self.app.get("/api/search/page?page_title=Bear")
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale.data, payload)
+        self.assertIn("Stale", stale.headers["Warning"])
+
+    def test_admitted_result_is_kept_for_stale_serving(self):
+        """Test that good results are remembered as they are served"""
+        from app import get_cache_key, get_stale_result
+
+        self.limit.release(0)
+        payload = b'{"page_title":"Wombat","status":"success"}'
+        with mock.patch("app.get_cached_entry", return_value=("e2", payload, 200)):
+            response = self.app.get("/api/search/page?page_title=Wombat")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            get_stale_result(get_cache_key("Wombat", "page")), ("e2", payload)
+        )
+        self.assertEqual(self.limit.in_flight, 0)
+
+    def test_queued_too_long_is_shed(self):
+        """Test that requests that waited in front of the worker are shed"""
+        self.limit.release(0)
+        started = f"t={int((time.time() - 30) * 1000)}"
+        with mock.patch("app.get_cached_entry", return_value=None), mock.patch(
+            "app.build_page_result"
+        ) as build_page_result:
+            response = self.app.get(
+                "/api/search/page?page_title=Koala",
+                headers={"X-Request-Start": started},
+            )
+        build_page_result.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.limit.decreases, 1)
+
+    def test_stats(self):
+        """Test that the limit and shedding counters are reported"""
+        response = self.app.get("/api/load/stats")
+        data = json.loads(response.data)
+        self.assertEqual(data["limit"], 1)
+        self.assertEqual(data["in_flight"], 1)
+        self.assertIn("served_stale", data)
+        self.assertIn("rejected", data)
+
+
+def redis_available():
+    """Whether a Redis server answers on localhost"""
+    import redis
+
+    try:
+        return redis.Redis(socket_connect_timeout=0.2).ping()
+    except redis.RedisError:
+        return False
+
+
+class TestOutboundGovernor(unittest.TestCase):
+    """Test the shared outbound token bucket client"""
+
+    def setUp(self):
+        from app import OutboundGovernor
+
+        patcher = mock.patch("app.redis_client")
+        self.redis_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.script = self.redis_client.register_script.return_value
+        self.governor = OutboundGovernor()
+
+    def test_lease_is_spent_locally(self):
+        """Test that one round trip leases tokens for several requests"""
+        self.script.return_value = [4, 0]
+        for _ in range(4):
+            self.governor.acquire()
+        self.assertEqual(self.script.call_count, 1)
+        self.governor.acquire()
+        self.assertEqual(self.script.call_count, 2)
+        self.assertEqual(self.governor.stats["local"], 3)
+
+    def test_priority_reserve(self):
+        """Test that lower priorities must leave part of the bucket"""
+        from app import OUTBOUND_BACKGROUND, OUTBOUND_PREFETCH, WIKIPEDIA_BURST
+
+        self.script.return_value = [1, 0]
+        self.governor.acquire()
+        self.governor.acquire(OUTBOUND_PREFETCH)
+        self.governor.acquire(OUTBOUND_BACKGROUND)
+        reserves = [call.kwargs["args"][3] for call in self.script.call_args_list]
+        self.assertEqual(reserves, [0, 0.25 * WIKIPEDIA_BURST, 0.5 * WIKIPEDIA_BURST])
+
+    def test_gives_up_past_wait_limit(self):
+        """Test that a class never waits longer than its limit"""
+        from app import OutboundThrottled
+
+        self.script.return_value = [0, 60000]
+        with mock.patch("app.time.sleep") as sleep:
+            with self.assertRaises(OutboundThrottled):
+                self.governor.acquire()
+        sleep.assert_not_called()
+        self.assertEqual(self.governor.stats["throttled"], 1)
+
+    def test_waits_for_refill(self):
+        """Test that a short wait is slept through"""
+        self.script.side_effect = [[0, 100], [2, 0]]
+        with mock.patch("app.time.sleep") as sleep:
+            self.governor.acquire()
+        sleep.assert_called_once_with(0.1)
+
+    def test_backs_off_on_429(self):
+        """Test that a 429 pauses the bucket and drops the local lease"""
+        from app import OUTBOUND_BACKOFF_SCRIPT, WIKIPEDIA_RATE
+
+        self.script.return_value = [4, 0]
+        self.governor.acquire()
+        response = mock.MagicMock(status_code=429, headers={"Retry-After": "7"})
+        self.governor.feedback(response, 0.2)
+        self.redis_client.register_script.assert_any_call(OUTBOUND_BACKOFF_SCRIPT)
+        # Scripts are registered with the governor, not per call
+        self.assertEqual(self.redis_client.register_script.call_count, 2)
+        self.assertEqual(self.script.call_args.kwargs["args"][2:], [7, WIKIPEDIA_RATE])
+        self.governor.acquire()
+        self.assertEqual(self.governor.stats["local"], 0)
+        self.assertEqual(self.governor.stats["rate_limited"], 1)
+
+    def test_slow_response_backs_off_without_pause(self):
+        """Test that a latency spike lowers the rate without pausing"""
+        response = mock.MagicMock(status_code=200)
+        self.governor.feedback(response, 0.1)
+        self.script.assert_not_called()
+        self.governor.feedback(response, 60)
+        self.assertEqual(self.script.call_args.kwargs["args"][0], 0.8)
+        self.assertEqual(self.script.call_args.kwargs["args"][2], 0)
+
+    def test_fails_open_without_redis(self):
+        """Test that requests are let through when Redis is down"""
+        self.script.side_effect = ConnectionError("down")
+        self.governor.acquire()
+
+    @unittest.skipUnless(redis_available(), "needs a Redis server on localhost")
+    def test_scripts_run_on_redis(self):
+        """Test the token bucket scripts against a real Redis"""
+        import redis
+
+        from app import OutboundGovernor, OutboundThrottled
+
+        client = redis.Redis(decode_responses=True)
+        key = f"outbound:test:{os.getpid()}"
+        self.addCleanup(client.delete, key)
+        with mock.patch("app.redis_client", client), mock.patch(
+            "app.OUTBOUND_BUCKET_KEY", key
+        ), mock.patch("app.WIKIPEDIA_BURST", 8), mock.patch(
+            "app.WIKIPEDIA_LEASE_SIZE", 4
+        ):
+            governor = OutboundGovernor()
+            for _ in range(8):
+                governor.acquire()
+            self.assertEqual(governor.stats["leased"], 2)
+            self.assertLess(float(client.hget(key, "tokens")), 1)
+
+            governor.backoff(0.5, 10)
+            self.assertEqual(float(client.hget(key, "factor")), 0.5)
+            self.assertLess(float(client.hget(key, "tokens")), 0)
+            with self.assertRaises(OutboundThrottled):
+                governor.acquire()
+
+    def test_pacer_sets_priority(self):
+        """Test that bulk work goes through the governor as background"""
+        from app import OUTBOUND_BACKGROUND, _outbound, bulk_pacer, wikipedia_get
+
+        _outbound.pacer = bulk_pacer
+        try:
+            with mock.patch("app.outbound_governor") as governor, mock.patch(
+                "app.requests.get"
+            ), mock.patch.object(bulk_pacer, "wait"):
+                wikipedia_get("https://en.wikipedia.org/w/api.php")
+        finally:
+            _outbound.pacer = None
+        governor.acquire.assert_called_once_with(OUTBOUND_BACKGROUND)
+        governor.feedback.assert_called_once()
+
+
+class TestCostWeightedLimits(unittest.TestCase):
+    """Test limiter costs and the leased Redis limiter storage"""
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_storage_scheme(self):
+        """Test that redis+lease:// selects the leased storage"""
+        from limits.storage import storage_from_string
+
+        from app import LeasedRedisStorage
+
+        storage = storage_from_string("redis+lease://localhost:6379")
+        self.assertIsInstance(storage, LeasedRedisStorage)
+
+    def test_lease_serves_hits_locally(self):
+        """Test that one Redis increment covers a block of hits"""
+        from limits.storage import RedisStorage
+
+        from app import RATE_LIMIT_LEASE_SIZE, LeasedRedisStorage
+
+        storage = LeasedRedisStorage("redis+lease://localhost:6379")
+        counter = {"value": 0}
+
+        def incr(self, key, expiry, amount=1):
+            counter["value"] += amount
+            return counter["value"]
+
+        with mock.patch.object(RedisStorage, "incr", incr), mock.patch.object(
+            RedisStorage, "get"
+        ) as get, mock.patch.object(
+            LeasedRedisStorage, "get_expiry", lambda self, key: time.time() + 60
+        ):
+            counts = [storage.incr("k", 60) for _ in range(RATE_LIMIT_LEASE_SIZE)]
+            self.assertEqual(counter["value"], RATE_LIMIT_LEASE_SIZE)
+            self.assertEqual(counts, list(range(1, RATE_LIMIT_LEASE_SIZE + 1)))
+            self.assertEqual(storage.get("k"), RATE_LIMIT_LEASE_SIZE)
+            get.assert_not_called()
+            # A cost larger than the block takes exactly that much
+            self.assertEqual(storage.incr("k", 60, amount=50), counter["value"])
+            self.assertEqual(counter["value"], RATE_LIMIT_LEASE_SIZE + 50)
+
+    def test_lease_ends_with_its_window(self):
+        """Test that a block taken just before a window resets is dropped"""
+        from limits.storage import RedisStorage
+
+        from app import RATE_LIMIT_LEASE_SIZE, LeasedRedisStorage
+
+        storage = LeasedRedisStorage("redis+lease://localhost:6379")
+        counter = {"value": 0}
+
+        def incr(self, key, expiry, amount=1):
+            counter["value"] += amount
+            return counter["value"]
+
+        with mock.patch.object(RedisStorage, "incr", incr), mock.patch.object(
+            RedisStorage, "get", return_value=0
+        ), mock.patch.object(
+            LeasedRedisStorage, "get_expiry", lambda self, key: time.time() + 0.05
+        ):
+            self.assertEqual(storage.incr("k", 60), 1)
+            time.sleep(0.1)
+            # The new window's counter, not the old window's leased count
+            self.assertEqual(storage.get("k"), 0)
+            storage.incr("k", 60)
+        self.assertEqual(counter["value"], 2 * RATE_LIMIT_LEASE_SIZE)
+
+    def test_costs(self):
+        """Test batch and cache-miss costs"""
+        from flask import g
+
+        from app import batch_cost, bulk_cost, search_cost
+
+        body = {"citations": ["x"] * 25}
+        with app.test_request_context(json=body):
+            self.assertEqual(batch_cost("citations")(), 3)
+        with app.test_request_context(json={"citations": "x" * 100}):
+            self.assertEqual(batch_cost("citations")(), 1)
+        with app.test_request_context(json={"queries": ["a"], "page_titles": []}):
+            self.assertEqual(bulk_cost(), 1)
+        with app.test_request_context(json={"queries": "abc", "page_titles": 5}):
+            self.assertEqual(bulk_cost(), 1)
+        with app.test_request_context():
+            self.assertEqual(search_cost(), 1)
+            g.wikipedia_requests = 2
+            self.assertGreater(search_cost(), 1)
+
+    def test_large_batch_uses_up_quota(self):
+        """Test that a big batch is charged by its size"""
+        from app import RATE_LIMIT_BATCH_UNIT
+
+        environ = {"REMOTE_ADDR": "10.9.8.7"}
+        citation = "Brunner, Bernd (2007). Bears. Yale. ISBN 978-0-300-12299-2"
+        big = {"citations": [citation] * (150 * RATE_LIMIT_BATCH_UNIT)}
+        with mock.patch("app.get_shared_entry", return_value=None):
+            first = self.app.post("/api/parse/batch", json=big, environ_base=environ)
+            second = self.app.post(
+                "/api/parse/batch", json={"citations": [citation]}, environ_base=environ
+            )
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 429)
+
+
+class TestRequestDeadlines(unittest.TestCase):
+    """Test that the request deadline reaches every stage"""
+
+    PAGE_HTML = TestStreamingExtraction.PAGE_HTML
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self.addCleanup(self.clear_deadline)
+
+    def clear_deadline(self):
+        from app import set_deadline
+
+        set_deadline(None)
+
+    def test_header_shortens_batch_parse(self):
+        """Test that an exhausted budget returns a partial batch"""
+        citation = "Brunner, Bernd (2007). Bears. Yale. ISBN 978-0-300-12299-2"
+        response = self.app.post(
+            "/api/parse/batch",
+            json={"citations": [citation] * 3},
+            headers={"X-Request-Deadline": "0"},
+        )
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(data["partial"])
+        self.assertEqual(data["results"], [])
+
+        response = self.app.post("/api/parse/batch", json={"citations": [citation]})
+        data = json.loads(response.data)
+        self.assertNotIn("partial", data)
+        self.assertEqual(len(data["results"]), 1)
+
+    def test_outbound_timeout_follows_deadline(self):
+        """Test that Wikipedia requests time out by the deadline"""
+        from app import DeadlineExceeded, set_deadline, wikipedia_get
+
+        set_deadline(time.monotonic() + 3)
+        with mock.patch("app.outbound_governor"), mock.patch("app.requests.get") as get:
+            wikipedia_get("https://en.wikipedia.org/w/api.php")
+            self.assertLessEqual(get.call_args.kwargs["timeout"], 3)
+            set_deadline(time.monotonic() - 1)
+            with self.assertRaises(DeadlineExceeded):
+                wikipedia_get("https://en.wikipedia.org/w/api.php")
+        self.assertEqual(get.call_count, 1)
+
+    def test_streaming_stops_at_deadline(self):
+        """Test that extraction keeps what it has when time runs out"""
+        from app import CitationListTarget, iter_list_items, set_deadline
+
+        first, rest = self.PAGE_HTML.split("<h2>References</h2>")
+
+        def chunks():
+            yield first.encode()
+            set_deadline(time.monotonic() - 1)
+            yield ("<h2>References</h2>" + rest).encode()
+
+        target = CitationListTarget()
+        items = list(iter_list_items(chunks(), target))
+        self.assertTrue(target.partial)
+        self.assertEqual(len(items), 1)
+        self.assertIn("Pastoureau", items[0][1])
+
+    def test_partial_article_is_short_lived(self):
+        """Test that partial results skip the article cache and get a short TTL"""
+        from app import CACHE_TTL_POLICIES, build_page_result, cache_ttl
+
+        article = {
+            "page_title": "Bear",
+            "disambiguation": False,
+            "citations": ["c"],
+            "partial": True,
+        }
+        with mock.patch("app.get_local_page", return_value=None), mock.patch(
+            "app.resolve_title", return_value=("Bear", 5)
+        ), mock.patch("app.redis_cache") as redis_cache, mock.patch(
+            "app.redis_client"
+        ) as redis_client, mock.patch(
+            "app.stream_article", return_value=article
+        ):
+            redis_cache.get.return_value = None
+            redis_client.get.return_value = None
+            result, status = build_page_result("Bear")
+        redis_cache.setex.assert_not_called()
+        self.assertEqual(status, 200)
+        self.assertTrue(result["partial"])
+        self.assertEqual(
+            cache_ttl("alexandria:page:x", result),
+            CACHE_TTL_POLICIES["page"]["partial"],
+        )
+
+    def test_bulk_items_past_deadline(self):
+        """Test that bulk items not started in time are reported, not cached"""
+        from app import run_bulk_item
+
+        with mock.patch("app.set_cached_result") as set_cached_result:
+            line = run_bulk_item("page", "Bear", "k", deadline=time.monotonic() - 1)
+        set_cached_result.assert_not_called()
+        self.assertEqual(json.loads(line)["status_code"], 504)
+
+    def test_short_budget_failures_not_cached(self):
+        """Test that a client's short budget cannot poison shared entries"""
+        result = {"error": "No Wikipedia page found", "status": "error"}
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch(
+            "app.resolve_redirect", return_value=None
+        ), mock.patch(
+            "app.build_search_result", return_value=(result, 404)
+        ), mock.patch(
+            "app.remember_empty"
+        ) as remember_empty:
+            redis_cache.get.return_value = None
+            response = self.app.get(
+                "/api/search?query=Bears", headers={"X-Request-Deadline": "0.5"}
+            )
+        self.assertEqual(response.status_code, 404)
+        remember_empty.assert_not_called()
+        redis_cache.setex.assert_not_called()
+        redis_cache.pipeline.assert_not_called()
+
+    def test_partial_results_kept_apart(self):
+        """Test that partial results are cached where full budgets never look"""
+        from app import get_cache_key
+
+        result = {"page_title": "Bear", "citations": [], "partial": True}
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch(
+            "app.resolve_redirect", return_value=None
+        ), mock.patch("app.build_page_result", return_value=(result, 200)):
+            redis_cache.get.return_value = None
+            self.app.get("/api/search/page?page_title=Bear")
+            full_budget_reads = [c.args[0] for c in redis_cache.get.call_args_list]
+            redis_cache.get.reset_mock()
+            self.app.get(
+                "/api/search/page?page_title=Bear",
+                headers={"X-Request-Deadline": "1"},
+            )
+            short_budget_reads = [c.args[0] for c in redis_cache.get.call_args_list]
+
+        partial_key = get_cache_key("Bear", "page") + ":partial"
+        written = redis_cache.pipeline.return_value.setex.call_args.args[0]
+        self.assertEqual(written, partial_key)
+        self.assertNotIn(partial_key, full_budget_reads)
+        self.assertIn(partial_key, short_budget_reads)
+
+
+class TestParserWorstCase(unittest.TestCase):
+    """Fuzz and worst-case timing tests for the citation parsers"""
+
+    # Inputs that made the original patterns backtrack super-linearly
+    ADVERSARIAL = {
+        "open_parens": lambda n: "(" * n,
+        "open_date": lambda n: "(" + "1 a " * (n // 4),
+        "periods": lambda n: "Smith (2001). " + "A. " * (n // 3),
+        "dots": lambda n: "Smith (2001). T" + "." * n + "x",
+        "brackets": lambda n: "Smith (2001). T " + "[" * n,
+        "spaces": lambda n: "Smith (2001). T" + " " * n + "x (PDF)",
+        "by": lambda n: "1999 " + "by a " * (n // 5) + "()",
+        "in": lambda n: 'A (2001). "x" ' + "in a " * (n // 5) + "(x)",
+        "editor": lambda n: "A (2001). " + "x" * n + " (ed.",
+        "editor_parens": lambda n: "A (2001). " + "a (" * (n // 3) + "(ed.)",
+        "author_year": lambda n: "1999 a" + " " * n + "(x",
+    }
+    # Worst-case parse time allowed per input character (linear bound)
+    SECONDS_PER_CHAR = 2e-5
+
+    def test_worst_case_time_per_input_length(self):
+        """Test that every parser stays linear on adversarial input"""
+        from app import clean_raw_citation, determine_parser_type, PARSERS
+
+        for length in (2000, 20000):
+            for name, make in self.ADVERSARIAL.items():
+                citation = make(length)
+                limit = self.SECONDS_PER_CHAR * len(citation)
+                for parser_type, (parser, _) in PARSERS.items():
+                    start = time.perf_counter()
+                    parser(citation)
+                    elapsed = time.perf_counter() - start
+                    self.assertLess(elapsed, limit, f"{parser_type} on {name}")
+                for helper in (clean_raw_citation, determine_parser_type):
+                    start = time.perf_counter()
+                    helper(citation)
+                    elapsed = time.perf_counter() - start
+                    self.assertLess(elapsed, limit, f"{helper.__name__} on {name}")
+
+    def test_fuzzed_matches_agree_with_reference_patterns(self):
+        """Test that the linear helpers match what the original regexes found"""
+        import random
+        import re
+
+        from app import (
+            DATE_IN_PARENS_RE,
+            find_by_clause,
+            find_editor,
+            find_in_editors,
+            find_parenthetical,
+            strip_bracketed,
+        )
+
+        pieces = list("aby in()[].,'\n ") + ["(ed.)", "(eds.),", "1999", "12 May"]
+        rng = random.Random(48)
+        for _ in range(5000):
+            text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+            date = re.search(
+                r"\([^)]*(?:\d{4}|\d{1,2}\s+[A-Za-z]+(?:\s+\d{4})?)[^)]*\)", text
+            )
+            self.assertEqual(
+                find_parenthetical(text, DATE_IN_PARENS_RE),
+                date.span() if date else None,
+                text,
+            )
+            by = re.search(r"by\s+([^\(]+?)\s*\([^\)]+\)", text, re.IGNORECASE)
+            found = find_by_clause(text)
+            self.assertEqual(
+                (found.start(), found.group(1)) if found else None,
+                (by.start(), by.group(1)) if by else None,
+                text,
+            )
+            editors = re.search(r"in\s+([^\(]+\(eds?\.\))[,\.]", text, re.I)
+            found = find_in_editors(text)
+            self.assertEqual(
+                found.span() if found else None,
+                editors.span() if editors else None,
+                text,
+            )
+            editor = re.search(r"([^\(]+)\s*\(ed\.\)", text, re.IGNORECASE)
+            found = find_editor(text)
+            self.assertEqual(
+                found.group(1) if found else None,
+                editor.group(1) if editor else None,
+                text,
+            )
+            self.assertEqual(
+                strip_bracketed(text), re.sub(r"\s*\[.*?\]", "", text), text
+            )
+
+    def test_long_citation_falls_back(self):
+        """Test that citations over the length limit get the cheap parse"""
+        from app import parse_within_budget
+
+        citation = "Smith, J. (2001). " + "Title " * 50 + "ISBN 978-0-300-12299-2"
+        with mock.patch("app.PARSE_MAX_CITATION_LENGTH", 100):
+            record = parse_within_budget("type1", citation)
+        self.assertIsNone(record["title"])
+        self.assertEqual(record["year"], "2001")
+        self.assertEqual(record["isbn"], "978-0-300-12299-2")
+        self.assertEqual(record["remaining_text"], citation)
+
+    def test_parse_over_budget_falls_back(self):
+        """Test that a parse that runs out of time gets the cheap parse"""
+        from app import parse_stats, parse_within_budget, type_1_record
+
+        citation = "Smith (2001). " + "A. " * 100 + "ISBN 978-0-300-12299-2"
+        before = parse_stats["fallback_budget"]
+        with mock.patch("app.PARSE_CITATION_BUDGET", 1e-9):
+            record = parse_within_budget("type1", citation)
+        self.assertIsNone(record["authors"])
+        self.assertEqual(record["isbn"], "978-0-300-12299-2")
+        self.assertEqual(parse_stats["fallback_budget"], before + 1)
+        # The budget does not leak into parses outside parse_within_budget
+        self.assertEqual(type_1_record(citation)["authors"], "Smith")
+
+    def test_budget_fallback_is_not_remembered(self):
+        """Test that budget fallbacks skip the parse cache and ingestion"""
+        from app import parse_citation, parse_citation_cached, process_dump_page
+
+        citation = "Smith (2001). " + "B. " * 100 + "ISBN 978-0-300-12299-3"
+        page = "<h2>References</h2><ol><li>" + citation + "</li></ol>"
+        with mock.patch("app.PARSE_CITATION_BUDGET", 1e-9):
+            self.assertIsNone(parse_citation(citation)["authors"])
+            _, citations, parsed = process_dump_page(("Smith", page))
+        self.assertEqual(parsed, [None] * len(citations))
+        self.assertEqual(len(citations), 1)
+        # A later parse with time to spare gets the full record
+        self.assertEqual(parse_citation(citation)["authors"], "Smith")
+        parse_citation_cached.cache_clear()
+
+
+class TestStreamingParseBatch(unittest.TestCase):
+    """Test NDJSON streaming through /api/parse/batch"""
+
+    CITATIONS = [
+        "Brunner, Bernd (2007). Bears. Yale. ISBN 978-0-300-12299-2",
+        "Barbara Triggs, The Wombat, University of New South Wales Press, 1996",
+    ]
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        patcher = mock.patch("app.get_shared_entry", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_lines(self, body, **kwargs):
+        return self.app.post(
+            "/api/parse/batch",
+            data=body,
+            content_type="application/x-ndjson",
+            **kwargs,
+        )
+
+    def test_lines_match_batch_results(self):
+        """Test that each citation line gets its parsed result line"""
+        from app import parse_citation
+
+        body = "\n".join(json.dumps(c) for c in self.CITATIONS) + "\n\n[1]\n"
+        response = self.post_lines(body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in response.data.splitlines()]
+        self.assertEqual(
+            lines[:2], [parse_citation(c).to_dict() for c in self.CITATIONS]
+        )
+        self.assertEqual(lines[2]["line"], 4)
+        self.assertEqual(lines[2]["status"], "error")
+
+    def test_results_are_written_before_input_is_read(self):
+        """Test that the first result is out while most input is unread"""
+        import io
+
+        body = ("\n".join(json.dumps(c) for c in self.CITATIONS * 1000) + "\n").encode()
+        stream = io.BytesIO(body)
+        response = self.app.post(
+            "/api/parse/batch",
+            input_stream=stream,
+            content_type="application/x-ndjson",
+            content_length=len(body),
+            buffered=False,
+        )
+        first = next(iter(response.response))
+        self.assertIn(b"Bears", first)
+        self.assertLess(stream.tell(), len(body) // 10)
+        response.close()
+
+    def test_overlong_line_is_skipped(self):
+        """Test that a line over the limit gets an error and is not kept"""
+        body = json.dumps("x" * 100) + "\n" + json.dumps(self.CITATIONS[0]) + "\n"
+        with mock.patch("app.PARSE_STREAM_MAX_LINE", 80):
+            response = self.post_lines(body)
+        first, second = [json.loads(line) for line in response.data.splitlines()]
+        self.assertEqual(first["line"], 1)
+        self.assertEqual(second["title"], "Bears")
+
+    def test_stream_ends_partial_at_deadline(self):
+        """Test that a stream out of time ends with a partial marker"""
+        body = "\n".join(json.dumps(c) for c in self.CITATIONS)
+        response = self.post_lines(body, headers={"X-Request-Deadline": "0"})
+        self.assertEqual(response.data, b'{"partial":true}\n')
+
+    def test_stream_outlives_request_budget(self):
+        """Test that a stream taking longer than the endpoint budget completes"""
+
+        def slow_parse(citation):
+            time.sleep(0.02)
+            return json.dumps({"citation": citation})
+
+        body = "\n".join(json.dumps(c) for c in self.CITATIONS)
+        with mock.patch.dict(
+            "app.REQUEST_DEADLINES", {"parse_batch": 0.01}
+        ), mock.patch("app.parsed_citation_json", side_effect=slow_parse):
+            lines = [json.loads(line) for line in self.post_lines(body).iter_encoded()]
+        self.assertEqual([line["citation"] for line in lines], self.CITATIONS)
+
+    def test_stream_is_charged_as_it_is_read(self):
+        """Test that a stream without a length is charged per unit of lines"""
+        import io
+
+        from app import RATE_LIMIT_BATCH_UNIT
+
+        environ = {"REMOTE_ADDR": "10.9.8.6"}
+        body = (json.dumps(self.CITATIONS[0]) + "\n").encode() * 3000
+        with mock.patch("app.parsed_citation_json", return_value="{}"):
+            response = self.app.post(
+                "/api/parse/batch",
+                input_stream=io.BytesIO(body),
+                content_type="application/x-ndjson",
+                environ_base=environ,
+            )
+            lines = response.data.splitlines()
+            after = self.post_lines(b'"x"\n', environ_base=environ)
+        self.assertEqual(len(lines), 150 * RATE_LIMIT_BATCH_UNIT + 1)
+        error = json.loads(lines[-1])
+        self.assertEqual(error["error"], "Rate limit exceeded")
+        self.assertTrue(error["partial"])
+        self.assertEqual(after.status_code, 429)
+
+
+class FakeJobRedis:
+    """In-memory stand-in for the Redis commands the job queue uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    @staticmethod
+    def _str(value):
+        return value.decode() if isinstance(value, bytes) else str(value)
+
+    def pipeline(self):
+        return FakeJobPipeline(self)
+
+    def hset(self, key, mapping):
+        self.data.setdefault(key, {}).update(
+            {field: self._str(value) for field, value in mapping.items()}
+        )
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hincrby(self, key, field, amount):
+        job = self.data.setdefault(key, {})
+        job[field] = str(int(job.get(field, 0)) + amount)
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def rpush(self, key, value):
+        self.data.setdefault(key, []).append(self._str(value))
+
+    def lpush(self, key, value):
+        self.data.setdefault(key, []).insert(0, self._str(value))
+
+    def lrange(self, key, start, end):
+        values = self.data.get(key, [])
+        return values[start:] if end == -1 else values[start : end + 1]
+
+    def brpop(self, key, timeout=0):
+        values = self.data.get(key)
+        return (key, values.pop()) if values else None
+
+    def lmove(self, source, destination, src="LEFT", dest="RIGHT"):
+        values = self.data.get(source)
+        if not values:
+            return None
+        value = values.pop(0 if src == "LEFT" else -1)
+        target = self.data.setdefault(destination, [])
+        target.insert(0 if dest == "LEFT" else len(target), value)
+        return value
+
+    def blmove(self, source, destination, timeout, src="LEFT", dest="RIGHT"):
+        return self.lmove(source, destination, src, dest)
+
+    def lindex(self, key, index):
+        values = self.data.get(key, [])
+        return values[index] if -len(values) <= index < len(values) else None
+
+    def lrem(self, key, count, value):
+        values = self.data.get(key, [])
+        if value in values:
+            values.remove(value)
+
+    def setex(self, key, seconds, value):
+        self.data[key] = self._str(value)
+        self.ttls[key] = seconds
+
+    def sadd(self, key, *values):
+        self.data.setdefault(key, set()).update(values)
+
+    def smembers(self, key):
+        return set(self.data.get(key, ()))
+
+    def srem(self, key, *values):
+        self.data.get(key, set()).difference_update(values)
+
+
+class FakeJobPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((getattr(self.redis, name), args, kwargs))
+
+        return call
+
+    def execute(self):
+        return [method(*args, **kwargs) for method, args, kwargs in self.calls]
+
+
+class TestJobs(unittest.TestCase):
+    """Test the asynchronous job API"""
+
+    CITATION = "Brunner, Bernd (2007). Bears. Yale. ISBN 978-0-300-12299-2"
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+        self.redis = FakeJobRedis()
+        for patcher in (
+            mock.patch("app.redis_client", self.redis),
+            mock.patch("app.start_job_workers"),
+            mock.patch("app.get_shared_entry", return_value=None),
+            mock.patch("app.JOB_RETRY_DELAY", 0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, body):
+        return self.app.post("/api/jobs", json=body)
+
+    def test_submit_queues_job(self):
+        """Test that a submitted job is stored, queued and answered with its id"""
+        from app import JOB_QUEUE_KEY, JOB_TTL, job_key
+
+        response = self.submit({"page_title": "Bear", "citations": [self.CITATION]})
+        self.assertEqual(response.status_code, 202)
+        job = json.loads(response.data)
+        self.assertEqual(response.headers["Location"], f"/api/jobs/{job['job_id']}")
+        self.assertEqual(job["state"], "queued")
+        self.assertEqual(job["progress"], {"done": 0, "total": 2})
+        self.assertEqual(self.redis.data[JOB_QUEUE_KEY], [job["job_id"]])
+        self.assertEqual(self.redis.ttls[job_key(job["job_id"])], JOB_TTL)
+
+    def test_submit_requires_items(self):
+        """Test that a job without work is rejected"""
+        self.assertEqual(self.submit({"queries": []}).status_code, 400)
+
+    def test_worker_runs_items_with_retries(self):
+        """Test that items are retried on server errors and results stored"""
+        from app import JOB_QUEUE_KEY, run_job
+
+        attempts = []
+
+        def build_page(title):
+            attempts.append(title)
+            if len(attempts) == 1:
+                return {"error": "Could not fetch", "status": "error"}, 500
+            return {"page_title": title, "citations": [self.CITATION]}, 200
+
+        job_id = json.loads(
+            self.submit({"page_title": "Bear", "citations": [self.CITATION]}).data
+        )["job_id"]
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch.dict(
+            "app.BULK_BUILDERS", {"page": build_page}
+        ):
+            redis_cache.mget.return_value = [None]
+            self.assertEqual(self.redis.brpop(JOB_QUEUE_KEY), (JOB_QUEUE_KEY, job_id))
+            run_job(job_id)
+        self.assertEqual(len(attempts), 2)
+
+        job = json.loads(self.app.get(f"/api/jobs/{job_id}").data)
+        self.assertEqual(job["state"], "done")
+        self.assertEqual(job["progress"], {"done": 2, "total": 2})
+        page, parsed = job["results"]
+        self.assertEqual(page["status_code"], 200)
+        self.assertEqual(page["parsed"][0]["title"], "Bears")
+        self.assertEqual(parsed["isbn"], "978-0-300-12299-2")
+
+        later = json.loads(self.app.get(f"/api/jobs/{job_id}?offset=1").data)
+        self.assertEqual(later["results"], [parsed])
+        self.assertEqual(later["next_offset"], 2)
+
+        stream = self.app.get(f"/api/jobs/{job_id}/results")
+        self.assertEqual(stream.mimetype, "application/x-ndjson")
+        self.assertEqual(
+            [json.loads(line) for line in stream.data.splitlines()], [page, parsed]
+        )
+
+    def test_cached_server_error_is_retried(self):
+        """Test that a cached 5xx entry is run again, not reported as cached"""
+        from app import pack_cache_entry, run_job_item
+
+        _, entry = pack_cache_entry(
+            b'{"error":"Could not search","status":"error"}', 502
+        )
+        with mock.patch("app.redis_cache") as redis_cache, mock.patch.dict(
+            "app.BULK_BUILDERS",
+            {"search": lambda query: ({"query": query, "status": "success"}, 200)},
+        ):
+            redis_cache.mget.return_value = [entry]
+            line = json.loads(run_job_item("search", "Bears"))
+        self.assertFalse(line["cached"])
+        self.assertEqual(line["status_code"], 200)
+        self.assertEqual(line["result"]["query"], "Bears")
+
+    def test_failed_item_gets_error_line(self):
+        """Test that an item that raises gets an error line, not a failed job"""
+        from app import run_job
+
+        job_id = json.loads(
+            self.submit({"queries": ["Bears"], "citations": [self.CITATION]}).data
+        )["job_id"]
+        with mock.patch(
+            "app.run_job_item", side_effect=[RuntimeError("boom"), b'{"ok":1}\n']
+        ):
+            run_job(job_id)
+        job = json.loads(self.app.get(f"/api/jobs/{job_id}").data)
+        self.assertEqual(job["state"], "done")
+        failed, parsed = job["results"]
+        self.assertEqual((failed["topic"], failed["status_code"]), ("Bears", 500))
+        self.assertEqual(parsed, {"ok": 1})
+
+    def test_result_write_retried_on_redis_error(self):
+        """Test that a transient Redis error while writing a line is retried"""
+        import redis
+
+        from app import run_job
+
+        job_id = json.loads(self.submit({"citations": [self.CITATION]}).data)["job_id"]
+        rpush = self.redis.rpush
+        calls = []
+
+        def flaky_rpush(key, value):
+            calls.append(value)
+            if len(calls) == 1:
+                raise redis.ConnectionError()
+            rpush(key, value)
+
+        with mock.patch.object(self.redis, "rpush", flaky_rpush):
+            run_job(job_id)
+        self.assertEqual(len(calls), 2)
+        job = json.loads(self.app.get(f"/api/jobs/{job_id}").data)
+        self.assertEqual(job["state"], "done")
+        self.assertEqual(job["progress"]["done"], 1)
+        self.assertEqual(len(job["results"]), 1)
+
+    def test_lost_worker_jobs_are_requeued_and_resumed(self):
+        """Test that the reaper requeues a dead worker's job, which resumes"""
+        from app import (
+            JOB_QUEUE_KEY,
+            JOB_WORKERS_KEY,
+            job_processing_key,
+            job_worker,
+            push_job_line,
+            reap_job_workers,
+            register_job_worker,
+            update_job,
+        )
+
+        job_id = json.loads(
+            self.submit({"citations": [self.CITATION, self.CITATION]}).data
+        )["job_id"]
+        # A worker took the job, wrote one line and died
+        with mock.patch("app.threading.Thread"):
+            register_job_worker("dead")
+        self.redis.lmove(JOB_QUEUE_KEY, job_processing_key("dead"), "RIGHT", "LEFT")
+        update_job(job_id, status="running")
+        push_job_line(job_id, b'{"n":1}\n')
+
+        reap_job_workers()
+        self.assertIn("dead", self.redis.smembers(JOB_WORKERS_KEY))
+        del self.redis.data["alexandria:jobs:heartbeat:dead"]
+        reap_job_workers()
+        self.assertEqual(self.redis.data[JOB_QUEUE_KEY], [job_id])
+        self.assertNotIn("dead", self.redis.smembers(JOB_WORKERS_KEY))
+
+        # Another worker picks it up after the line already written
+        blmove = self.redis.blmove
+
+        def blmove_until_empty(*args):
+            if self.redis.data[JOB_QUEUE_KEY]:
+                return blmove(*args)
+            raise KeyboardInterrupt  # Stops the worker
+
+        with mock.patch(
+            "app.run_job_item", return_value=b'{"n":2}\n'
+        ) as run_job_item, mock.patch("app.threading.Thread"), mock.patch.object(
+            self.redis, "blmove", blmove_until_empty
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                job_worker()
+        run_job_item.assert_called_once()
+        # Finished jobs leave the worker's processing list
+        processing = [
+            jobs
+            for key, jobs in self.redis.data.items()
+            if key.startswith("alexandria:jobs:processing:")
+        ]
+        self.assertEqual([job for jobs in processing for job in jobs], [])
+        job = json.loads(self.app.get(f"/api/jobs/{job_id}").data)
+        self.assertEqual(job["state"], "done")
+        self.assertEqual(job["results"], [{"n": 1}, {"n": 2}])
+
+    def test_results_stream_ends_when_idle(self):
+        """Test that a results stream of a stalled job ends after the timeout"""
+        job_id = json.loads(self.submit({"citations": [self.CITATION]}).data)["job_id"]
+        with mock.patch("app.JOB_STREAM_IDLE_TIMEOUT", 0), mock.patch(
+            "app.JOB_POLL_INTERVAL", 0
+        ):
+            stream = self.app.get(f"/api/jobs/{job_id}/results")
+        self.assertEqual(stream.status_code, 200)
+        self.assertEqual(stream.data, b"")
+
+    def test_results_are_paged(self):
+        """Test that GET /api/jobs/<id> returns at most limit lines per page"""
+        from app import job_results_key
+
+        job_id = json.loads(self.submit({"citations": [self.CITATION]}).data)["job_id"]
+        for n in range(5):
+            self.redis.rpush(job_results_key(job_id), json.dumps({"n": n}))
+        with mock.patch("app.JOB_PAGE_SIZE", 3):
+            first = json.loads(self.app.get(f"/api/jobs/{job_id}?limit=2").data)
+            second = json.loads(self.app.get(f"/api/jobs/{job_id}?offset=2").data)
+        self.assertEqual(first["results"], [{"n": 0}, {"n": 1}])
+        self.assertEqual(first["next_offset"], 2)
+        self.assertEqual(second["results"], [{"n": 2}, {"n": 3}, {"n": 4}])
+        self.assertEqual(second["next_offset"], 5)
+
+    def test_unknown_job(self):
+        """Test that unknown or expired jobs are 404s"""
+        self.assertEqual(self.app.get("/api/jobs/nope").status_code, 404)
+        self.assertEqual(self.app.get("/api/jobs/nope/results").status_code, 404)
+
+    def test_submit_without_redis(self):
+        """Test that jobs are refused when the queue is unreachable"""
+        import redis
+
+        broken = mock.Mock()
+        broken.pipeline.return_value.execute.side_effect = redis.ConnectionError()
+        with mock.patch("app.redis_client", broken):
+            response = self.submit({"queries": ["Bears"]})
+        self.assertEqual(response.status_code, 503)
+
+
 if __name__ == "__main__":
     unittest.main()